@@ -0,0 +1,209 @@
+import re
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Mapping, Optional
+from fastapi import HTTPException
+from app.config import ADMISSION_SETTINGS, SETTINGS, AdmissionSettings
+from app.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT, ADMISSION_REJECTIONS
+from app.tracing import tracer
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse rate-limit reset values such as ``"20ms"``, ``"1.5s"`` or ``"6m0s"`` into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    if headers.get("retry-after-ms"):
+        return parse_duration(headers["retry-after-ms"] + "ms")
+    return parse_duration(headers.get("retry-after"))
+
+
+class TokenBucket:
+    """
+    Refills ``per_minute`` tokens a minute, up to one minute's worth.
+
+    A rate of 0 means the limit is unknown and nothing is throttled. The
+    level may go negative when a request turns out to cost more than was
+    reserved for it; later requests then wait for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available."""
+        now = time.monotonic()
+        self._refill(now)
+        paused = max(0.0, self.paused_until - now)
+        if not self.per_minute or self.level >= min(amount, self.per_minute):
+            return paused
+        return max(paused, (min(amount, self.per_minute) - self.level) * 60 / self.per_minute)
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        if self.per_minute:
+            self.level -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]):
+        """Adopt the provider's view of the limit, which also counts other processes' calls."""
+        self._refill(time.monotonic())
+        if limit:
+            if not self.per_minute:
+                # Nothing was tracked while the limit was unknown, start full and let remaining lower it
+                self.level = limit
+            self.per_minute = limit
+        if remaining is not None and self.per_minute:
+            self.level = min(self.level, remaining)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class Admission:
+    """A granted slot; report the provider's response so the buckets follow its limits."""
+
+    def __init__(self, controller: "AdmissionController", reserved_tokens: int):
+        self.controller = controller
+        self.reserved_tokens = reserved_tokens
+
+    def update(self, headers: Mapping[str, str], used_tokens: Optional[int] = None):
+        self.controller.update_from_headers(headers)
+        if used_tokens is not None:
+            # Settle the estimate against what the call really cost
+            self.controller.tokens.take(used_tokens - self.reserved_tokens)
+            self.reserved_tokens = used_tokens
+
+    def throttled(self, headers: Mapping[str, str]) -> HTTPException:
+        """Pause the provider after a 429 and build the error for the client."""
+        retry_after = retry_after_seconds(headers) or self.controller.settings.default_retry_after
+        self.controller.requests.pause(retry_after)
+        self.controller.update_from_headers(headers)
+        ADMISSION_REJECTIONS.labels(provider=self.controller.provider, reason="upstream_429").inc()
+        return self.controller.too_many_requests(retry_after, "AI provider rate limit reached")
+
+
+class AdmissionController:
+    """
+    Admission control for one AI provider.
+
+    A call needs a concurrency slot, one request from the RPM bucket and its
+    estimated tokens from the TPM bucket. Both buckets are retuned from the
+    provider's ``x-ratelimit-*`` response headers. At most ``max_queue`` calls
+    wait for admission, each for up to ``queue_timeout`` seconds; beyond that
+    the caller gets a 429 with ``Retry-After`` rather than a timeout.
+    """
+
+    def __init__(self, provider: str, settings: AdmissionSettings = ADMISSION_SETTINGS):
+        self.provider = provider
+        self.settings = settings
+        default_concurrency = SETTINGS.OPENAI_MAX_CONCURRENCY if provider == "openai" else settings.default_concurrency
+        self.max_concurrency = settings.max_concurrency.get(provider, default_concurrency)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.requests = TokenBucket(settings.rpm.get(provider, 0))
+        self.tokens = TokenBucket(settings.tpm.get(provider, 0))
+        self.waiting = 0
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        def number(name: str) -> Optional[float]:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+
+    def too_many_requests(self, retry_after: float, detail: str) -> HTTPException:
+        return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, round(retry_after)))})
+
+    def _reject(self, reason: str, retry_after: float) -> HTTPException:
+        ADMISSION_REJECTIONS.labels(provider=self.provider, reason=reason).inc()
+        return self.too_many_requests(retry_after, f"Too many requests for {self.provider}, retry later")
+
+    def _estimated_wait(self) -> float:
+        return max(self.requests.delay(1), self.settings.queue_timeout * self.waiting / max(1, self.settings.max_queue))
+
+    @asynccontextmanager
+    async def admit(self, estimated_tokens: int) -> AsyncIterator[Admission]:
+        """
+        Raises:
+            HTTPException: 429 with Retry-After when the queue is full or the
+                deadline passes before the call could be admitted
+        """
+        if not self.settings.enabled:
+            yield Admission(self, estimated_tokens)
+            return
+        if self.waiting >= self.settings.max_queue:
+            raise self._reject("queue_full", self._estimated_wait())
+
+        started = time.monotonic()
+        deadline = started + self.settings.queue_timeout
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).set(self.waiting)
+        acquired = False
+        try:
+            with tracer.start_as_current_span("admission_wait") as span:
+                span.set_attribute("admission.provider", self.provider)
+                span.set_attribute("admission.queue_depth", self.waiting)
+                try:
+                    await asyncio.wait_for(self.semaphore.acquire(), timeout=self.settings.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise self._reject("deadline", self._estimated_wait())
+                acquired = True
+                while True:
+                    delay = max(self.requests.delay(1), self.tokens.delay(estimated_tokens))
+                    if delay <= 0:
+                        break
+                    if time.monotonic() + delay > deadline:
+                        raise self._reject("deadline", delay)
+                    await asyncio.sleep(delay)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                span.set_attribute("admission.wait", time.monotonic() - started)
+        except BaseException:
+            if acquired:
+                self.semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).set(self.waiting)
+            ADMISSION_WAIT.labels(provider=self.provider).observe(time.monotonic() - started)
+
+        try:
+            yield Admission(self, estimated_tokens)
+        finally:
+            self.semaphore.release()
+
+
+_controllers: dict[str, AdmissionController] = {}
+
+
+def get_admission_controller(provider: str) -> AdmissionController:
+    """One controller per provider and process, shared by every request."""
+    controller = _controllers.get(provider)
+    if controller is None:
+        controller = _controllers[provider] = AdmissionController(provider)
+    return controller
@@ -0,0 +1,89 @@
+import logging
+from typing import Optional
+from app.archive_spool import ArchiveReceipt
+from app.base_service import sniff_container_format, sniff_image_format
+from app.config import ARCHIVE_SETTINGS, ArchiveSettings
+from app.extraction_cache import LRUCache, RedisCache
+from app.metrics import ARCHIVE_INDEX_LOOKUPS
+from app.request_buffer import RequestBuffer
+from app.schemas import InboundDocumentType, User
+
+logger = logging.getLogger(__name__)
+
+# Archived file extension and content type by sniffed format
+ARCHIVE_FORMATS = {
+    "jpeg": ("jpg", InboundDocumentType.IMAGE),
+    "png": ("png", InboundDocumentType.PNG),
+    "gif": ("gif", InboundDocumentType.GIF),
+    "webp": ("webp", InboundDocumentType.WEBP),
+    "tiff": ("tiff", InboundDocumentType.TIFF),
+    "heic": ("heic", InboundDocumentType.HEIC),
+    "pdf": ("pdf", InboundDocumentType.PDF),
+    "zip": ("zip", InboundDocumentType.ZIP),
+}
+UNKNOWN_FORMAT = ("bin", InboundDocumentType.BINARY)
+
+
+def archive_format(image: RequestBuffer) -> tuple[str, InboundDocumentType]:
+    """Returns the file extension and content type the document is archived with."""
+    head = image.data[:16]
+    return ARCHIVE_FORMATS.get(sniff_image_format(head) or sniff_container_format(head), UNKNOWN_FORMAT)
+
+
+def archive_file_name(image: RequestBuffer) -> str:
+    """Content-addressed name: the same bytes always archive under the same name."""
+    extension, _ = archive_format(image)
+    return f"{image.digest}.{extension}"
+
+
+class ArchiveIndex:
+    """
+    Receipts of documents already archived, keyed by tenant, user and image hash.
+
+    Like the extraction cache, lookups go to an in-process LRU first and then
+    to Redis when ``ARCHIVE_INDEX_REDIS_URL`` is set; a Redis hit is promoted
+    into the LRU. Receipts are only recorded once the upload succeeded or the
+    document is safely in the spool, so a failed upload is retried by the next
+    duplicate.
+    """
+
+    def __init__(self, settings: ArchiveSettings = ARCHIVE_SETTINGS):
+        self.enabled = settings.dedup_enabled
+        # Receipts are small, the entry cap bounds the memory
+        self.memory = LRUCache(settings.index_max_entries, settings.index_max_entries * 1024, settings.index_ttl_seconds)
+        self.redis = None
+        if settings.dedup_enabled and settings.index_redis_url:
+            self.redis = RedisCache(settings.index_redis_url, settings.index_redis_prefix, settings.index_ttl_seconds)
+
+    @staticmethod
+    def make_key(image: RequestBuffer, user: User, tenant: Optional[str]) -> str:
+        # Scoped to the uploader, a receipt never hands out another tenant's URL
+        return f"{tenant or ''}:{user.mobile_no or ''}:{image.digest}"
+
+    async def get(self, key: str) -> Optional[ArchiveReceipt]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is None and self.redis is not None:
+            value = await self.redis.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        ARCHIVE_INDEX_LOOKUPS.labels(outcome="miss" if value is None else "hit").inc()
+        if value is None:
+            return None
+        try:
+            return ArchiveReceipt.model_validate_json(value)
+        except ValueError as e:
+            logger.warning("Ignoring unreadable archive index entry %s: %s", key, e)
+            return None
+
+    async def set(self, key: str, receipt: ArchiveReceipt):
+        if not self.enabled or (receipt.url is None and receipt.archive_id is None):
+            return
+        value = receipt.model_dump_json().encode("utf-8")
+        self.memory.set(key, value)
+        if self.redis is not None:
+            await self.redis.set(key, value)
+
+
+archive_index = ArchiveIndex()
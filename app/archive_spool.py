@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import uuid
+import base64
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Union
+from pydantic import BaseModel
+from app.config import ARCHIVE_SETTINGS, FILE_UPLOAD_SETTINGS, ArchiveSettings, FileUploadTransport
+from app.schemas import User, ProductBytes, ImageBytes, InboundDocumentType
+from app.s3_file_service import S3Service, UploadFileSource
+from app.metrics import ARCHIVE_SPOOL_DEPTH, ARCHIVE_UPLOAD_LAG, ARCHIVE_UPLOAD_FAILURES, ARCHIVE_DEAD_LETTERS
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PRODUCT_CODE = "documents"
+
+
+class SpoolEntry(BaseModel):
+    archive_id: str
+    file_name: str
+    image_type: InboundDocumentType
+    user: User
+    tenant: Optional[str] = None
+    created_at: float
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    last_error: Optional[str] = None
+
+
+class ArchiveReceipt(BaseModel):
+    archive_id: Optional[str] = None
+    url: Optional[str] = None
+
+
+class ArchiveSpool:
+    """
+    Durable on-disk queue of documents waiting to be archived to S3.
+
+    Each entry is an ``<id>.bin`` file with the bytes and an ``<id>.json``
+    file with its metadata. Files are fsynced and renamed into place, and the
+    metadata is written last, so an entry is only visible once complete. An
+    uploader claims an entry by renaming its metadata to ``<id>.claimed``, which
+    lets several processes drain the same spool directory without double uploads.
+    An entry whose upload failed ``max_attempts`` times is moved, bytes and
+    metadata, to the dead-letter directory and no longer retried.
+    """
+
+    def __init__(self, settings: ArchiveSettings = ARCHIVE_SETTINGS):
+        self.settings = settings
+        self.directory = Path(settings.spool_dir)
+        self.dead_letter_directory = Path(settings.dead_letter_dir) if settings.dead_letter_dir else self.directory / "dead"
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def future_url(self, entry: SpoolEntry) -> Optional[str]:
+        if not self.settings.url_template:
+            return None
+        return self.settings.url_template.format(
+            archive_id=entry.archive_id,
+            file_name=entry.file_name,
+            tenant=entry.tenant or "",
+            mobile=entry.user.mobile_no or ""
+        )
+
+    async def submit(self, image_bytes: Union[bytes, memoryview], file_name: str, image_type: InboundDocumentType, user: User, tenant: Optional[str]) -> ArchiveReceipt:
+        """Persist a document for background upload and return its archive id and future URL."""
+        with tracer.start_as_current_span("archive_spool_submit") as span:
+            entry = SpoolEntry(
+                archive_id=uuid.uuid4().hex,
+                file_name=file_name,
+                image_type=image_type,
+                user=user,
+                tenant=tenant,
+                created_at=time.time()
+            )
+            span.set_attribute("archive.id", entry.archive_id)
+            await asyncio.to_thread(self._write_entry, entry, image_bytes)
+            return ArchiveReceipt(archive_id=entry.archive_id, url=self.future_url(entry))
+
+    def _write_entry(self, entry: SpoolEntry, image_bytes: Union[bytes, memoryview]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(self.directory / f"{entry.archive_id}.bin", image_bytes)
+        self._write_atomic(self.directory / f"{entry.archive_id}.json", entry.model_dump_json().encode("utf-8"))
+
+    @staticmethod
+    def _write_atomic(path: Path, data: Union[bytes, memoryview]):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def depth(self) -> int:
+        if not self.directory.exists():
+            return 0
+        return sum(1 for _ in self.directory.glob("*.json")) + sum(1 for _ in self.directory.glob("*.claimed"))
+
+    def _claim_due(self, limit: int) -> list[SpoolEntry]:
+        """Claim up to ``limit`` entries whose retry time has come, oldest first."""
+        if not self.directory.exists():
+            return []
+        now = time.time()
+        self._release_stale_claims(now)
+        claimed: list[SpoolEntry] = []
+        for meta_path in sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime if p.exists() else 0):
+            if len(claimed) >= limit:
+                break
+            try:
+                entry = SpoolEntry.model_validate_json(meta_path.read_bytes())
+            except (FileNotFoundError, ValueError):
+                continue
+            if entry.next_attempt_at > now:
+                continue
+            claim_path = meta_path.with_suffix(".claimed")
+            try:
+                os.replace(meta_path, claim_path)
+                # A rename keeps the old mtime, stamp the claim time for stale-claim detection
+                os.utime(claim_path)
+            except FileNotFoundError:
+                # Another uploader claimed it first
+                continue
+            claimed.append(entry)
+        return claimed
+
+    def _release_stale_claims(self, now: float):
+        for claim_path in self.directory.glob("*.claimed"):
+            try:
+                if now - claim_path.stat().st_mtime > self.settings.lease_timeout:
+                    os.replace(claim_path, claim_path.with_suffix(".json"))
+            except FileNotFoundError:
+                continue
+
+    def _finish(self, entry: SpoolEntry):
+        for suffix in (".claimed", ".bin"):
+            try:
+                (self.directory / f"{entry.archive_id}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+    def _reschedule(self, entry: SpoolEntry, error: str):
+        entry.attempts += 1
+        entry.last_error = error
+        if entry.attempts >= self.settings.max_attempts:
+            self._dead_letter(entry)
+            return
+        delay = min(self.settings.retry_max, self.settings.retry_base * (2 ** (entry.attempts - 1)))
+        entry.next_attempt_at = time.time() + delay
+        claim_path = self.directory / f"{entry.archive_id}.claimed"
+        self._write_atomic(claim_path, entry.model_dump_json().encode("utf-8"))
+        os.replace(claim_path, claim_path.with_suffix(".json"))
+
+    def _dead_letter(self, entry: SpoolEntry):
+        logger.error("Giving up on archive %s after %d failed uploads: %s", entry.archive_id, entry.attempts, entry.last_error)
+        self.dead_letter_directory.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(self.directory / f"{entry.archive_id}.bin", self.dead_letter_directory / f"{entry.archive_id}.bin")
+        except FileNotFoundError:
+            pass
+        self._write_atomic(self.dead_letter_directory / f"{entry.archive_id}.json", entry.model_dump_json().encode("utf-8"))
+        (self.directory / f"{entry.archive_id}.claimed").unlink(missing_ok=True)
+        ARCHIVE_DEAD_LETTERS.inc()
+
+    async def _upload_json(self, entries: list[SpoolEntry]):
+        first = entries[0]
+        images = []
+        for entry in entries:
+            image_bytes = await asyncio.to_thread((self.directory / f"{entry.archive_id}.bin").read_bytes)
+            images.append(ImageBytes(
+                image_name=entry.file_name,
+                image_type=entry.image_type,
+                image_bytes=base64.b64encode(image_bytes).decode("utf-8")
+            ))
+        docs = [ProductBytes(product_code=ARCHIVE_PRODUCT_CODE, images=images)]
+        await S3Service().upload_to_s3_file_bytes(first.user, docs, first.tenant)
+
+    async def _upload_group(self, entries: list[SpoolEntry]):
+        """Upload entries that share a user and tenant in a single request."""
+        first = entries[0]
+        try:
+            if FILE_UPLOAD_SETTINGS.transport == FileUploadTransport.BINARY:
+                # Stream straight from the spool files
+                sources = [
+                    UploadFileSource(
+                        file_name=entry.file_name,
+                        content_type=entry.image_type.value,
+                        path=str(self.directory / f"{entry.archive_id}.bin")
+                    )
+                    for entry in entries
+                ]
+                await S3Service().upload_files_binary(first.user, ARCHIVE_PRODUCT_CODE, sources, first.tenant)
+            else:
+                await self._upload_json(entries)
+        except Exception as e:
+            error = str(getattr(e, "detail", e))
+            logger.warning("Archive upload of %d document(s) failed: %s", len(entries), error)
+            ARCHIVE_UPLOAD_FAILURES.inc(len(entries))
+            for entry in entries:
+                await asyncio.to_thread(self._reschedule, entry, error)
+            return
+
+        now = time.time()
+        for entry in entries:
+            await asyncio.to_thread(self._finish, entry)
+            ARCHIVE_UPLOAD_LAG.observe(now - entry.created_at)
+
+    async def drain_once(self) -> int:
+        """Upload one batch of due entries, returns the number of entries attempted."""
+        entries = await asyncio.to_thread(self._claim_due, self.settings.batch_size)
+        if not entries:
+            return 0
+        groups: dict[str, list[SpoolEntry]] = {}
+        for entry in entries:
+            key = json.dumps([entry.user.model_dump(), entry.tenant])
+            groups.setdefault(key, []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.settings.upload_concurrency)
+
+        async def upload(group: list[SpoolEntry]):
+            async with semaphore:
+                await self._upload_group(group)
+
+        with tracer.start_as_current_span("archive_spool_drain") as span:
+            span.set_attribute("archive.batch_size", len(entries))
+            await asyncio.gather(*(upload(group) for group in groups.values()))
+        return len(entries)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                uploaded = await self.drain_once()
+                ARCHIVE_SPOOL_DEPTH.set(await asyncio.to_thread(self.depth))
+            except Exception as e:
+                logger.exception("Archive spool drain failed: %s", e)
+                uploaded = 0
+            if uploaded:
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.settings.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the background uploader; entries left over from a previous run are picked up."""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+
+archive_spool = ArchiveSpool()
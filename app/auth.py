@@ -1,11 +1,69 @@
 from fastapi import Header, Request, HTTPException
 from http import HTTPStatus
-from app.config import SETTINGS
+from app.config import SETTINGS, AUTH_SETTINGS, AuthSettings
 from app.schemas import GenericResponse, Trace, ErrorCode
 from app.tracing import tracer
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import time
 import jwt
 from fastapi import Depends
 
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens that passed verification, keyed by their digest.
+
+    An entry expires at the token's own ``exp`` or after ``token_cache_ttl``
+    seconds, whichever comes first, so an expired token is never accepted.
+    """
+
+    def __init__(self, settings: AuthSettings = AUTH_SETTINGS):
+        self.settings = settings
+        self._entries: OrderedDict[str, float] = OrderedDict()
+
+    def get(self, digest: str) -> bool:
+        expires_at = self._entries.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._entries[digest]
+            return False
+        self._entries.move_to_end(digest)
+        return True
+
+    def set(self, digest: str, exp: Optional[float]):
+        if self.settings.token_cache_size <= 0:
+            return
+        expires_at = time.time() + self.settings.token_cache_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        self._entries[digest] = expires_at
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.settings.token_cache_size:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+def credentials_exception() -> HTTPException:
+    error_response = GenericResponse.get_error_response(
+        error_code=ErrorCode.ERROR_CODE_AUTH_ERROR,
+        customer_message='Invalid Token',
+        debug_info={}
+    )
+    return HTTPException(
+        status_code=HTTPStatus.UNAUTHORIZED,
+        detail=error_response.dict(),  # Convert to dictionary for JSON serialization
+    )
+
+
 async def get_trace(
     x_request_id: str = Header(),
     x_device_id: str = Header()
@@ -17,43 +75,33 @@ async def get_trace(
     )
 
 async def get_current_user(
-    request: Request, 
-    x_request_id: str | None = Header(default=None), 
+    request: Request,
+    x_request_id: str | None = Header(default=None),
     x_device_id: str | None = Header(default=None),
     authorization: str = Header(),
     trace: Trace = Depends(get_trace)
 ):
-    # body = await request.body()
-    # body_str = body.decode('utf-8')
-    headers = request.headers
+    token = authorization[len("Bearer "):] if authorization and authorization.startswith("Bearer ") else None
+    digest = token_digest(token) if token else ""
     attributes: dict[str, str] = {
-        # 'body': body_str,
-        'token': str(authorization), 
-        'request_id': headers.get('x-request-id', ''), 
+        # Enough to correlate requests by token without exposing it
+        'token.fingerprint': digest[:12],
+        'request_id': request.headers.get('x-request-id', ''),
         'device_id': x_device_id or '',
     }
 
     with tracer.start_as_current_span("get_request_param", attributes=attributes) as span:
-        error_response = GenericResponse.get_error_response(
-            error_code=ErrorCode.ERROR_CODE_AUTH_ERROR,
-            customer_message='Invalid Token',
-            debug_info={}
-        )
-        credentials_exception = HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED,
-            detail=error_response.dict(),  # Convert to dictionary for JSON serialization
-        )
-        if not authorization:
-            raise credentials_exception
+        if not token:
+            raise credentials_exception()
+        if verified_tokens.get(digest):
+            span.set_attribute("auth.cache_hit", True)
+            return trace
         try:
-            token = authorization.split("Bearer ")[1]
             payload = jwt.decode(token, SETTINGS.JWT_SECRET_KEY, algorithms=[SETTINGS.JWT_ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
-            elif username != SETTINGS.SERVICE_ID:
-                raise credentials_exception
-            
         except Exception:
-            raise credentials_exception
-        return trace
\ No newline at end of file
+            raise credentials_exception()
+        if payload.get("sub") != SETTINGS.SERVICE_ID:
+            raise credentials_exception()
+        verified_tokens.set(digest, payload.get("exp"))
+        span.set_attribute("auth.cache_hit", False)
+        return trace
@@ -0,0 +1,347 @@
+"""
+Bulk re-extraction of documents, e.g. after a prompt or model change.
+
+    python -m app.backfill manifest.txt --output results.jsonl --provider openai --concurrency 16 --rpm 600
+    python -m app.backfill manifest.txt --output results/ --format parquet
+
+The manifest lists one document per line: a local path, an http(s) URL, an
+archive key as ``archive:<key>`` (an object in FILE_UPLOAD_BUCKET), or a JSON
+object with ``source`` and an optional ``id``. Documents go through the same
+preprocessing, local OCR, cache and provider services as the API, provider
+admission control included, but are not archived again.
+
+Each document's record is written as soon as it completes, and the output is
+the checkpoint: rerunning with the same output skips every id already in it,
+so a killed run resumes where it stopped. Failed documents are retried on a
+rerun only with --retry-errors.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+import httpx
+from fastapi import HTTPException
+from app.admission import TokenBucket, retry_after_seconds
+from app.config import FILE_UPLOAD_SETTINGS, PREPROCESSING_SETTINGS, ImagePreset, TracingLevel
+from app.document import preprocess_and_extract
+from app.request_buffer import RequestBuffer
+from app.schemas import AIProvider, DocumentInfo
+from app.service_factory import ServiceFactory
+from app.s3_file_service import get_boto_session
+from app.tracing import tracer
+from app.url_fetcher import url_fetcher
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "archive:"
+
+
+@dataclass
+class ManifestEntry:
+    id: str
+    source: str
+
+
+def read_manifest(path: str) -> Iterator[ManifestEntry]:
+    """Entries of the manifest; blank lines and lines starting with # are skipped."""
+    with open(path, encoding="utf-8") as manifest:
+        for number, line in enumerate(manifest, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                    source = item["source"]
+                except (ValueError, KeyError):
+                    raise SystemExit(f"{path}:{number}: expected a JSON object with a source")
+                yield ManifestEntry(id=str(item.get("id") or source), source=source)
+            else:
+                yield ManifestEntry(id=line, source=line)
+
+
+async def load_source(source: str) -> bytes:
+    """
+    Raises:
+        HTTPException: For URLs that cannot be fetched, see UrlFetcher.fetch
+        OSError: For missing local files
+    """
+    if source.startswith(ARCHIVE_PREFIX):
+        async with get_boto_session().client("s3", endpoint_url=FILE_UPLOAD_SETTINGS.endpoint_url or None) as s3:
+            response = await s3.get_object(Bucket=FILE_UPLOAD_SETTINGS.bucket, Key=source[len(ARCHIVE_PREFIX):])
+            async with response["Body"] as body:
+                return await body.read()
+    if source.startswith(("http://", "https://")):
+        return await url_fetcher.fetch(source)
+    return await asyncio.to_thread(Path(source).read_bytes)
+
+
+def is_retryable(e: Exception) -> bool:
+    # Rate limits and provider or network failures may pass later, bad documents will not
+    if isinstance(e, HTTPException):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, httpx.HTTPError)
+
+
+class JsonlOutput:
+    """Appends one JSON record per line, flushed as it is written."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def completed(self) -> dict[str, str]:
+        """Status of every id already in the output, the last record of an id wins."""
+        statuses: dict[str, str] = {}
+        if not os.path.exists(self.path):
+            return statuses
+        with open(self.path, encoding="utf-8") as output:
+            for line in output:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line of a run that was killed mid-write
+                    continue
+                statuses[record["id"]] = record["status"]
+        return statuses
+
+    def open(self):
+        ends_cleanly = True
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as output:
+                output.seek(-1, os.SEEK_END)
+                ends_cleanly = output.read(1) == b"\n"
+        self._file = open(self.path, "a", encoding="utf-8")
+        if not ends_cleanly:
+            self._file.write("\n")
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+class ParquetOutput:
+    """
+    Writes records as numbered part files in a directory, ``rows_per_file`` at
+    a time and on close. Parts are renamed into place once complete, records
+    still buffered when the process is killed are extracted again on resume.
+    ``result`` and ``usage`` are stored as JSON strings.
+    """
+
+    # Column types by pyarrow type factory, fixed so that every part has the same schema
+    COLUMNS = {
+        "id": "string", "source": "string", "status": "string", "status_code": "int32", "error": "string",
+        "provider": "string", "model": "string", "prompt_version": "string", "duration": "float64",
+        "completed_at": "string", "result": "string", "usage": "string",
+    }
+
+    def __init__(self, directory: str, rows_per_file: int):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow, which is in requirements.txt: pip install -r requirements.txt")
+        self.directory = Path(directory)
+        self.rows_per_file = rows_per_file
+        self._rows: list[dict] = []
+        self._next_part = 0
+
+    def _parts(self) -> list[Path]:
+        return sorted(self.directory.glob("part-*.parquet")) if self.directory.exists() else []
+
+    def completed(self) -> dict[str, str]:
+        import pyarrow.parquet as pq
+
+        statuses: dict[str, str] = {}
+        for part in self._parts():
+            table = pq.read_table(part, columns=["id", "status"])
+            statuses.update(zip(table.column("id").to_pylist(), table.column("status").to_pylist()))
+        return statuses
+
+    def open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        parts = self._parts()
+        self._next_part = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+
+    def write(self, record: dict):
+        row = dict(record)
+        for column in ("result", "usage"):
+            row[column] = json.dumps(row[column], default=str) if row.get(column) is not None else None
+        self._rows.append({column: row.get(column) for column in self.COLUMNS})
+        if len(self._rows) >= self.rows_per_file:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = self.directory / f"part-{self._next_part:05d}.parquet"
+        tmp_path = path.with_name(path.name + ".tmp")
+        schema = pa.schema([(column, getattr(pa, kind)()) for column, kind in self.COLUMNS.items()])
+        pq.write_table(pa.Table.from_pylist(self._rows, schema=schema), tmp_path)
+        os.replace(tmp_path, path)
+        self._next_part += 1
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+class Progress:
+    """Counts finished documents and logs throughput and ETA every ``interval`` seconds."""
+
+    def __init__(self, total: int, skipped: int, interval: float):
+        self.total = total
+        self.skipped = skipped
+        self.interval = interval
+        self.ok = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._reported = self.started
+
+    def done(self, ok: bool):
+        if ok:
+            self.ok += 1
+        else:
+            self.failed += 1
+        if time.monotonic() - self._reported >= self.interval:
+            self.report()
+
+    def report(self):
+        self._reported = time.monotonic()
+        finished = self.ok + self.failed
+        elapsed = self._reported - self.started
+        rate = finished / elapsed if elapsed else 0.0
+        remaining = self.total - self.skipped - finished
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining / rate)) if rate else "unknown"
+        logger.info(
+            "%d/%d done (%d ok, %d failed, %d skipped), %.2f docs/s, ETA %s",
+            self.skipped + finished, self.total, self.ok, self.failed, self.skipped, rate, eta
+        )
+
+
+class Backfill:
+    """Extracts manifest entries with bounded concurrency and an optional start rate."""
+
+    def __init__(self, provider: AIProvider, preset: ImagePreset, output, progress: Progress, rpm: float, retries: int):
+        self.provider = provider
+        self.preset = preset
+        self.service = ServiceFactory.get_service(provider)
+        self.output = output
+        self.progress = progress
+        # Paces starts on top of the provider's own admission control, 0 for no limit
+        self.starts = TokenBucket(rpm)
+        self.retries = retries
+
+    async def _extract(self, entry: ManifestEntry) -> tuple[dict, Optional[dict]]:
+        image = RequestBuffer(await load_source(entry.source))
+        if not len(image):
+            raise HTTPException(status_code=400, detail="Empty file content")
+        result, _, _ = await preprocess_and_extract(self.service, self.provider, image, self.preset)
+        result = dict(result)
+        usage = result.pop("usage", None)
+        result.pop("routing", None)
+        result.pop("pages", None)
+        return DocumentInfo(**result).model_dump(), usage
+
+    async def _attempt(self, entry: ManifestEntry) -> tuple[dict, Optional[dict]]:
+        for attempt in range(self.retries + 1):
+            while (delay := self.starts.delay(1)) > 0:
+                await asyncio.sleep(delay)
+            self.starts.take(1)
+            try:
+                return await self._extract(entry)
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                headers = getattr(e, "headers", None) or {}
+                delay = retry_after_seconds({k.lower(): v for k, v in headers.items()}) or min(60.0, 2.0 ** attempt)
+                logger.warning("Retrying %s in %.1fs: %s", entry.id, delay, getattr(e, "detail", e))
+                await asyncio.sleep(delay)
+
+    async def process(self, entry: ManifestEntry):
+        started = time.monotonic()
+        record = {
+            "id": entry.id,
+            "source": entry.source,
+            "provider": self.provider.value,
+            "model": self.service.model,
+            "prompt_version": self.service.prompt_version,
+        }
+        with tracer.start_as_current_span("backfill_document", level=TracingLevel.MINIMAL) as span:
+            span.set_attribute("backfill.id", entry.id)
+            try:
+                result, usage = await self._attempt(entry)
+            except Exception as e:
+                span.record_exception(e)
+                span.set_attribute("error", True)
+                record.update(
+                    status="error",
+                    status_code=e.status_code if isinstance(e, HTTPException) else None,
+                    error=str(e.detail if isinstance(e, HTTPException) else e)
+                )
+            else:
+                record.update(status="ok", result=result, usage=usage)
+        record["duration"] = round(time.monotonic() - started, 3)
+        record["completed_at"] = datetime.now(timezone.utc).isoformat()
+        self.output.write(record)
+        self.progress.done(record["status"] == "ok")
+
+    async def run(self, entries: list[ManifestEntry], concurrency: int):
+        pending = iter(entries)
+
+        async def worker():
+            for entry in pending:
+                await self.process(entry)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def main(args):
+    entries = list({entry.id: entry for entry in read_manifest(args.manifest)}.values())
+    output = ParquetOutput(args.output, args.rows_per_file) if args.format == "parquet" else JsonlOutput(args.output)
+    completed = output.completed()
+    finished = {"ok"} if args.retry_errors else {"ok", "error"}
+    todo = [entry for entry in entries if completed.get(entry.id) not in finished]
+    logger.info("%d documents in the manifest, %d already in %s", len(entries), len(entries) - len(todo), args.output)
+
+    progress = Progress(len(entries), len(entries) - len(todo), args.progress_interval)
+    backfill = Backfill(AIProvider(args.provider), ImagePreset(args.preset), output, progress, args.rpm, args.retries)
+    output.open()
+    try:
+        await backfill.run(todo, args.concurrency)
+    finally:
+        # Also on Ctrl-C, so everything finished so far is kept for the next run
+        output.close()
+        await url_fetcher.close()
+        progress.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest")
+    parser.add_argument("--output", required=True, help="JSONL file, or directory of part files for parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--rows-per-file", type=int, default=10_000, help="Records per parquet part file")
+    parser.add_argument("--provider", choices=[p.value for p in AIProvider], default=AIProvider.OPENAI.value)
+    parser.add_argument("--preset", choices=[p.value for p in ImagePreset], default=PREPROCESSING_SETTINGS.default_preset.value)
+    parser.add_argument("--concurrency", type=int, default=8, help="Documents in flight")
+    parser.add_argument("--rpm", type=float, default=0, help="Documents started per minute, 0 for no limit")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of rate-limited and failed provider calls")
+    parser.add_argument("--retry-errors", action="store_true", help="Extract documents that failed in an earlier run again")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
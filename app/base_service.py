@@ -1,37 +1,164 @@
 from enum import Enum
-from typing import Union
+from typing import AsyncIterator, Optional, Union
 from abc import abstractmethod
-import imghdr
 import base64
 import json
 import httpx
+from app.config import SETTINGS
+from app.prompts import Prompt, get_prompt
+from app.schemas import TokenUsage
+from app.request_buffer import ImageInput, image_data
+
+# Formats the vision providers accept as-is; anything else has to be transcoded first
+SUPPORTED_IMAGE_FORMATS = ('jpeg', 'png', 'gif', 'webp')
+
+# ISO-BMFF brands used by HEIC/HEIF images
+HEIF_BRANDS = (b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1')
+
+
+def sniff_image_format(img_bytes: bytes) -> Optional[str]:
+    """Identify an image from its magic bytes, returns None when it is not a known image."""
+    if img_bytes.startswith(b'\xff\xd8'):
+        return 'jpeg'
+    if img_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if img_bytes.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if len(img_bytes) >= 12 and img_bytes.startswith(b'RIFF') and img_bytes[8:12] == b'WEBP':
+        return 'webp'
+    if img_bytes.startswith((b'II*\x00', b'MM\x00*')):
+        return 'tiff'
+    if len(img_bytes) >= 12 and img_bytes[4:8] == b'ftyp' and img_bytes[8:12] in HEIF_BRANDS:
+        return 'heic'
+    return None
+
+
+def sniff_container_format(data: bytes) -> Optional[str]:
+    """Identify multi-page documents that are split into images before extraction."""
+    if data.startswith(b'%PDF-'):
+        return 'pdf'
+    if data.startswith(b'PK\x03\x04'):
+        return 'zip'
+    return None
+
 
 # Create a parent class with a factory method and abstract method
 class AIServiceBase():
+    # Identify the model and prompt revision so cached results are never reused across changes
+    model: str = ""
+    prompt: Prompt = get_prompt(SETTINGS.PROMPT_VARIANT)
+
+    @property
+    def prompt_version(self) -> str:
+        return self.prompt.cache_key
 
     @abstractmethod
-    async def extract_document_info(self, image_bytes: bytes) -> dict:
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
         """
         Extract information from the provided image bytes.
         Concrete implementations should override this method.
         """
         pass
 
-    def detect_image_format(self, img_bytes: bytes) -> str:
-        # First try imghdr detection
-        format = imghdr.what(None, img_bytes)
-        if format in ['jpeg', 'png', 'gif', 'webp']:
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        """
+        Stream the raw model output as text deltas.
+        Providers without token streaming yield the complete result at once.
+        """
+        result = await self.extract_document_info(image_bytes)
+        result.pop('file_type', None)
+        yield json.dumps(result)
+
+    def parse_extraction(self, content: str, prompt: Optional[Prompt] = None) -> dict:
+        """Parse the model output into a dict with every field of the prompt present."""
+        prompt = prompt or self.prompt
+        try:
+            # First try direct JSON parsing
+            extracted_data = json.loads(content)
+        except json.JSONDecodeError:
+            # If direct parsing fails, try to find JSON-like structure
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
+            if start_idx >= 0 and end_idx > start_idx:
+                json_str = content[start_idx:end_idx]
+                extracted_data = json.loads(json_str)
+            else:
+                # If no JSON structure found, return empty template
+                extracted_data = prompt.template
+
+        # Validate the extracted data has all required fields
+        for key in prompt.fields:
+            if key not in extracted_data:
+                extracted_data[key] = ""
+        return extracted_data
+
+    def parse_packed_extraction(self, content: str, count: int, prompt: Prompt) -> list[Optional[dict]]:
+        """
+        Map the JSON array answering a packed request back to its ``count`` images.
+
+        Objects are matched by their ``image`` number when every one carries a
+        distinct valid number, otherwise by position when there is exactly one
+        per image. Images that cannot be matched are None, all of them when
+        the content is not a JSON array.
+        """
+        try:
+            items = json.loads(content)
+        except json.JSONDecodeError:
+            start_idx = content.find('[')
+            end_idx = content.rfind(']') + 1
+            try:
+                items = json.loads(content[start_idx:end_idx]) if 0 <= start_idx < end_idx else None
+            except json.JSONDecodeError:
+                items = None
+        if isinstance(items, dict):
+            # JSON mode answers with an object, the array is then its only list value
+            items = next((value for value in items.values() if isinstance(value, list)), None)
+        if not isinstance(items, list):
+            return [None] * count
+        items = [item for item in items if isinstance(item, dict)]
+
+        numbers = [item.get("image") for item in items]
+        results: list[Optional[dict]] = [None] * count
+        if all(isinstance(n, int) and 1 <= n <= count for n in numbers) and len(set(numbers)) == len(numbers):
+            for number, item in zip(numbers, items):
+                results[number - 1] = item
+        elif len(items) == count:
+            results = list(items)
+        else:
+            return results
+
+        for result in results:
+            if result is None:
+                continue
+            result.pop("image", None)
+            for key in prompt.fields:
+                if key not in result:
+                    result[key] = ""
+        return results
+
+    @staticmethod
+    def split_usage(usage: dict, count: int) -> list[dict]:
+        """Share the usage of one request between ``count`` documents, remainders go to the first ones."""
+        shares = [{} for _ in range(count)]
+        for key, total in usage.items():
+            for index, share in enumerate(shares):
+                share[key] = total // count + (1 if index < total % count else 0)
+        return shares
+
+    @staticmethod
+    def token_usage(usage: Optional[dict]) -> dict:
+        """Normalise a provider ``usage`` object into TokenUsage fields."""
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details") or {}
+        return TokenUsage(
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            cached_prompt_tokens=details.get("cached_tokens") or 0,
+            completion_tokens=usage.get("completion_tokens") or 0
+        ).model_dump()
+
+    def detect_image_format(self, img_bytes: ImageInput) -> str:
+        format = sniff_image_format(image_data(img_bytes))
+        if format in SUPPORTED_IMAGE_FORMATS:
             return format
-        
-        # Manual format detection as fallback
-        if len(img_bytes) >= 2:
-            if img_bytes.startswith(b'\xff\xd8'):
-                return 'jpeg'
-            if img_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
-                return 'png'
-            if img_bytes.startswith((b'GIF87a', b'GIF89a')):
-                return 'gif'
-            if len(img_bytes) >= 12 and img_bytes.startswith(b'RIFF') and img_bytes[8:12] == b'WEBP':
-                return 'webp'
-        
+
         raise ValueError("Unsupported image format")
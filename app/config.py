@@ -1,13 +1,20 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from enum import Enum
-from pydantic import validator
+from pydantic import BaseModel, validator
 
 class FileUploadServer(str, Enum):
     LOCAL = "local"
     S3 = "s3"
 
 
+class FileUploadTransport(str, Enum):
+    # Base64 images inside a JSON body, as understood by the upload service's v2 route
+    JSON = "json"
+    # Raw bytes: streamed multipart to the upload service, or straight to S3 for the s3 server
+    BINARY = "binary"
+
+
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Document Information Extractor"
@@ -16,6 +23,24 @@ class Settings(BaseSettings):
     OPENAI_KEY: str = ""
     GROK_KEY: str = ""
 
+    # OpenAI client, shared by every request in the process
+    OPENAI_BASE_URL: str | None = None
+    OPENAI_MAX_CONCURRENCY: int = 32
+    OPENAI_TIMEOUT: float = 60.0
+    OPENAI_MAX_RETRIES: int = 2
+
+    # Grok API, overridable to point at a local stub
+    GROK_BASE_URL: str = "https://api.x.ai/v1"
+    GROK_MAX_CONCURRENCY: int = 32
+
+    # Extraction prompt variant from app.prompts, "full" or "compact"
+    PROMPT_VARIANT: str = "full"
+
+    # Batch extraction limits
+    BATCH_MAX_ITEMS: int = 50
+    BATCH_MAX_CONCURRENCY: int = 8
+    BATCH_DEFAULT_CONCURRENCY: int = 4
+
     JWT_SECRET_KEY: str = ""
     JWT_ALGORITHM: str = ""
     SERVICE_ID: str = ""
@@ -32,6 +57,13 @@ class FileUploadSettings(BaseSettings):
     bucket: str = ""
     access_key: str = ""
     key_id: str = ""
+    transport: FileUploadTransport = FileUploadTransport.JSON
+    multipart_path: str = "/s3/upload/oaas/files/multipart"
+    region: str = "ap-south-1"
+    # S3-compatible endpoint such as MinIO, empty for AWS
+    endpoint_url: str = ""
+    # Base of the URLs returned for objects uploaded directly, defaults to the bucket's AWS URL
+    public_base_url: str = ""
     
     @validator('access_key', 'key_id')
     def validate_s3_credentials(cls, value, values):
@@ -43,6 +75,329 @@ class FileUploadSettings(BaseSettings):
         env_prefix = 'FILE_UPLOAD_'
 
 
+class CacheSettings(BaseSettings):
+    enabled: bool = True
+    ttl_seconds: int = 24 * 60 * 60
+    # Results failing validate_document may come out right on a retry: kept this long, 0 does not cache them
+    invalid_ttl_seconds: int = 0
+    max_entries: int = 10_000
+    max_bytes: int = 64 * 1024 * 1024
+    redis_url: str = ""
+    redis_prefix: str = "ocr:extract:"
+
+    class Config:
+        env_prefix = 'CACHE_'
+
+
+class ImagePreset(str, Enum):
+    NONE = "none"
+    FAST = "fast"
+    BALANCED = "balanced"
+    QUALITY = "quality"
+
+
+class ImageOutputFormat(str, Enum):
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+
+class PreprocessingSettings(BaseSettings):
+    # Callers opt in to resizing per request, images are sent as uploaded unless they ask
+    default_preset: ImagePreset = ImagePreset.NONE
+    output_format: ImageOutputFormat = ImageOutputFormat.JPEG
+    max_workers: int = 2
+
+    # Long edge cap in pixels and encoder quality for each preset
+    fast_long_edge: int = 1024
+    fast_quality: int = 70
+    balanced_long_edge: int = 1600
+    balanced_quality: int = 85
+    quality_long_edge: int = 2048
+    quality_quality: int = 92
+
+    class Config:
+        env_prefix = 'PREPROCESS_'
+
+
+class JobQueueBackend(str, Enum):
+    SQLITE = "sqlite"
+    REDIS = "redis"
+
+
+class JobSettings(BaseSettings):
+    backend: JobQueueBackend = JobQueueBackend.SQLITE
+    # ":memory:" keeps the queue inside the API process, only usable with in-process workers
+    sqlite_path: str = "jobs.db"
+    redis_url: str = "redis://localhost:6379/0"
+    redis_prefix: str = "ocr:jobs:"
+
+    concurrency: int = 4
+    visibility_timeout: int = 300
+    max_attempts: int = 3
+    retry_backoff: float = 5.0
+    poll_interval: float = 0.5
+    result_ttl: int = 7 * 24 * 60 * 60
+    webhook_timeout: float = 10.0
+    # Webhooks are refused for hosts that resolve to private, loopback or link-local addresses unless set
+    webhook_allow_private_networks: bool = False
+
+    # Run workers inside the API process instead of a separate `python -m app.job_worker`
+    inprocess_workers: bool = False
+
+    class Config:
+        env_prefix = 'JOBS_'
+
+
+class ArchiveSettings(BaseSettings):
+    # Off by default: a spooled response only has an archive id, and a URL only once url_template
+    # is set. When disabled, uploads to S3 happen inline with the request as before
+    spool_enabled: bool = False
+    spool_dir: str = "archive_spool"
+    # Format of the URL returned before the upload happened, e.g.
+    # "https://cdn.example.com/{tenant}/{file_name}". Empty returns only the archive id.
+    url_template: str = ""
+
+    batch_size: int = 10
+    upload_concurrency: int = 4
+    poll_interval: float = 1.0
+    retry_base: float = 1.0
+    retry_max: float = 300.0
+    # Failed uploads before an entry is moved to the dead-letter directory, <spool_dir>/dead by default
+    max_attempts: int = 20
+    dead_letter_dir: str = ""
+    # Claimed entries older than this are assumed abandoned by a dead uploader
+    lease_timeout: float = 600.0
+
+    # Files are named by the hash of their bytes; a document already archived for the
+    # same tenant and user returns its earlier receipt instead of being uploaded again
+    dedup_enabled: bool = True
+    index_ttl_seconds: int = 30 * 24 * 60 * 60
+    index_max_entries: int = 100_000
+    # Shares the index between workers and keeps it across restarts
+    index_redis_url: str = ""
+    index_redis_prefix: str = "ocr:archive:"
+
+    class Config:
+        env_prefix = 'ARCHIVE_'
+
+
+class FetchSettings(BaseSettings):
+    max_bytes: int = 20 * 1024 * 1024
+    total_timeout: float = 20.0
+    connect_timeout: float = 5.0
+    max_connections: int = 64
+    # Concurrent downloads of one batch, ahead of its extraction slots
+    prefetch_concurrency: int = 8
+    # Redirects are followed by hand, each hop's URL is checked like the first
+    max_redirects: int = 5
+    # Hosts resolving to loopback, private, link-local or reserved addresses are refused unless set
+    allow_private_networks: bool = False
+
+    # Recently fetched URLs are served from memory while fresh and revalidated with
+    # If-None-Match / If-Modified-Since afterwards
+    cache_ttl: int = 300
+    cache_max_entries: int = 256
+    cache_max_bytes: int = 128 * 1024 * 1024
+
+    class Config:
+        env_prefix = 'FETCH_'
+
+
+class RouterSettings(BaseSettings):
+    # Providers the auto mode may route to, in order of preference when there is no data yet
+    providers: list[str] = ["openai", "grok"]
+    ewma_alpha: float = 0.2
+    # Latency assumed for a provider before its first completed call
+    default_latency: float = 5.0
+
+    hedge_enabled: bool = True
+    # Send a duplicate to the next provider when the first has not answered in this many seconds
+    hedge_after: float = 6.0
+
+    breaker_failure_threshold: int = 5
+    breaker_error_rate: float = 0.5
+    breaker_open_seconds: float = 30.0
+
+    class Config:
+        env_prefix = 'ROUTER_'
+
+
+class LocalOcrSettings(BaseSettings):
+    # Try on-box Tesseract before the AI provider; PAN and Aadhaar cards that read
+    # cleanly and pass validation never reach the LLM
+    enabled: bool = False
+    tesseract_cmd: str = "tesseract"
+    languages: str = "eng"
+    # Concurrent tesseract processes, each one keeps a CPU core busy
+    max_workers: int = 2
+    timeout: float = 10.0
+    # Mean Tesseract word confidence (0-100) every required field must reach
+    min_confidence: float = 80.0
+
+    class Config:
+        env_prefix = 'LOCAL_OCR_'
+
+
+class CascadeStage(BaseModel):
+    model: str
+    # "low" sends a single 512px tile, "high" the full tiled image
+    detail: str = "high"
+    max_tokens: int = 1000
+
+
+class CascadeSettings(BaseSettings):
+    # OpenAI extractions run the stages in order and stop at the first result that validates
+    enabled: bool = False
+    # JSON list in CASCADE_STAGES, e.g. [{"model": "gpt-4o-mini", "detail": "low", "max_tokens": 300}, ...]
+    stages: list[CascadeStage] = [
+        CascadeStage(model="gpt-4o-mini", detail="low", max_tokens=300),
+        CascadeStage(model="gpt-4o-mini", detail="high", max_tokens=1000),
+        CascadeStage(model="gpt-4o", detail="high", max_tokens=1000),
+    ]
+    # Escalations only ask for the fields that failed validation, instead of the whole document
+    retry_failed_fields_only: bool = True
+
+    class Config:
+        env_prefix = 'CASCADE_'
+
+
+class IngestionSettings(BaseSettings):
+    # PDF pages and ZIP members beyond this are ignored
+    max_pages: int = 20
+    # Pages rendered and extracted at the same time for one document
+    page_concurrency: int = 3
+    render_dpi: int = 200
+    # Larger ZIP members are skipped instead of being decompressed
+    max_member_bytes: int = 20 * 1024 * 1024
+    # Stop extracting further pages once the merged result validates
+    stop_early: bool = True
+
+    class Config:
+        env_prefix = 'INGEST_'
+
+
+class BufferSettings(BaseSettings):
+    # Memory all documents being processed may hold at once, 0 disables the budget
+    max_inflight_bytes: int = 1024 * 1024 * 1024
+    # Peak memory of a request as a multiple of its document size
+    amplification: float = 3.0
+    # How long a request waits for room in the budget before a 503
+    wait_timeout: float = 10.0
+    # Reserved for an upload the server did not report a size for, until it has been read
+    max_upload_bytes: int = 20 * 1024 * 1024
+
+    class Config:
+        env_prefix = 'BUFFER_'
+
+
+class AdmissionSettings(BaseSettings):
+    enabled: bool = True
+    # Per provider, as JSON: ADMISSION_MAX_CONCURRENCY='{"openai": 32, "grok": 16}'.
+    # OpenAI defaults to API_OPENAI_MAX_CONCURRENCY, other providers to default_concurrency
+    max_concurrency: dict[str, int] = {}
+    default_concurrency: int = 16
+    # Requests and tokens per minute; 0 or missing means unknown until the provider's
+    # x-ratelimit-* headers report it
+    rpm: dict[str, int] = {}
+    tpm: dict[str, int] = {}
+    # Prompt tokens reserved per call before its real usage is known, on top of max_tokens
+    estimated_prompt_tokens: int = 1200
+
+    # Calls allowed to wait for admission per provider, and how long each may wait
+    max_queue: int = 200
+    queue_timeout: float = 20.0
+    # Used when a provider 429 carries no Retry-After
+    default_retry_after: float = 5.0
+
+    class Config:
+        env_prefix = 'ADMISSION_'
+
+
+class AuthSettings(BaseSettings):
+    # Verified bearer tokens remembered per process, keyed by their SHA-256
+    token_cache_size: int = 1024
+    # A cached token is re-verified after this many seconds, or at its exp if sooner
+    token_cache_ttl: int = 3600
+
+    class Config:
+        env_prefix = 'AUTH_'
+
+
+class ReplayLatency(str, Enum):
+    # A latency drawn from every recorded call of the source provider
+    SAMPLED = "sampled"
+    # The latency recorded for the replayed entry itself
+    RECORDED = "recorded"
+    NONE = "none"
+
+
+class ReplayMiss(str, Enum):
+    # Serve a recorded result chosen by the image hash, so unseen images still cost a call
+    ANY = "any"
+    ERROR = "error"
+
+
+class ReplaySettings(BaseSettings):
+    # JSONL corpus written in record mode and served by the replay provider
+    corpus_path: str = "replay_corpus.jsonl"
+    # Wrap the openai and grok providers to append every live call to the corpus
+    record: bool = False
+    # Only replay entries recorded from this provider, empty for all
+    source_provider: str = ""
+    latency: ReplayLatency = ReplayLatency.SAMPLED
+    # Multiplies replayed latencies, e.g. 0.5 to model a faster provider
+    latency_scale: float = 1.0
+    miss: ReplayMiss = ReplayMiss.ANY
+    # Mixed into every per-image random choice, change it for a different but repeatable run
+    seed: int = 0
+
+    class Config:
+        env_prefix = 'REPLAY_'
+
+
+class TracingExporter(str, Enum):
+    # OTLP over HTTP, configured with the standard OTEL_EXPORTER_OTLP_* variables
+    OTLP = "otlp"
+    CONSOLE = "console"
+    NONE = "none"
+
+
+class TracingLevel(str, Enum):
+    # Request and provider call spans only
+    MINIMAL = "minimal"
+    # Every span, without events
+    STANDARD = "standard"
+    # Every span and event
+    VERBOSE = "verbose"
+
+
+class TracingSettings(BaseSettings):
+    enabled: bool = True
+    exporter: TracingExporter = TracingExporter.OTLP
+    # Share of new traces exported; a trace continuing a sampled parent is always kept
+    sample_ratio: float = 1.0
+    # Also export every trace whose request was slow or failed, whatever the ratio
+    tail_keep: bool = False
+    tail_slow_seconds: float = 10.0
+    # Unfinished traces held for the tail decision, the oldest is dropped beyond this
+    tail_max_traces: int = 1000
+    level: TracingLevel = TracingLevel.VERBOSE
+
+    class Config:
+        env_prefix = 'TRACING_'
+
+
+class PackingSettings(BaseSettings):
+    # Concurrent OpenAI extractions are sent together, several images per request
+    enabled: bool = False
+    max_images: int = 4
+    # How long the first image of a request waits for others to join it
+    window_seconds: float = 0.05
+
+    class Config:
+        env_prefix = 'PACKING_'
+
+
 @lru_cache()
 def get_settings():
     return Settings()
@@ -51,5 +406,80 @@ def get_settings():
 def get_file_upload_settings():
     return FileUploadSettings()
 
+@lru_cache()
+def get_cache_settings():
+    return CacheSettings()
+
+@lru_cache()
+def get_preprocessing_settings():
+    return PreprocessingSettings()
+
+@lru_cache()
+def get_job_settings():
+    return JobSettings()
+
+@lru_cache()
+def get_archive_settings():
+    return ArchiveSettings()
+
+@lru_cache()
+def get_fetch_settings():
+    return FetchSettings()
+
+@lru_cache()
+def get_router_settings():
+    return RouterSettings()
+
+@lru_cache()
+def get_local_ocr_settings():
+    return LocalOcrSettings()
+
+@lru_cache()
+def get_cascade_settings():
+    return CascadeSettings()
+
+@lru_cache()
+def get_ingestion_settings():
+    return IngestionSettings()
+
+@lru_cache()
+def get_buffer_settings():
+    return BufferSettings()
+
+@lru_cache()
+def get_admission_settings():
+    return AdmissionSettings()
+
+@lru_cache()
+def get_auth_settings():
+    return AuthSettings()
+
+@lru_cache()
+def get_replay_settings():
+    return ReplaySettings()
+
+@lru_cache()
+def get_tracing_settings():
+    return TracingSettings()
+
+@lru_cache()
+def get_packing_settings():
+    return PackingSettings()
+
 SETTINGS = get_settings()
-FILE_UPLOAD_SETTINGS = get_file_upload_settings()
\ No newline at end of file
+FILE_UPLOAD_SETTINGS = get_file_upload_settings()
+CACHE_SETTINGS = get_cache_settings()
+PREPROCESSING_SETTINGS = get_preprocessing_settings()
+JOB_SETTINGS = get_job_settings()
+ARCHIVE_SETTINGS = get_archive_settings()
+FETCH_SETTINGS = get_fetch_settings()
+ROUTER_SETTINGS = get_router_settings()
+LOCAL_OCR_SETTINGS = get_local_ocr_settings()
+CASCADE_SETTINGS = get_cascade_settings()
+INGESTION_SETTINGS = get_ingestion_settings()
+BUFFER_SETTINGS = get_buffer_settings()
+ADMISSION_SETTINGS = get_admission_settings()
+AUTH_SETTINGS = get_auth_settings()
+REPLAY_SETTINGS = get_replay_settings()
+TRACING_SETTINGS = get_tracing_settings()
+PACKING_SETTINGS = get_packing_settings()
\ No newline at end of file
@@ -1,29 +1,270 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Form, Depends
-from app.schemas import DocumentResponse, DocumentInfo, AIProvider
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Form, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.schemas import DocumentResponse, DocumentInfo, AIProvider, BatchItemResponse
 from app.service_factory import ServiceFactory
 import time
 import httpx
 from typing import Optional, Union
 from app.openai_service import OpenAIService
 from app.grok_service import GrokService
-from app.config import FILE_UPLOAD_SETTINGS
-from io import BytesIO
+from app.config import FILE_UPLOAD_SETTINGS, SETTINGS
 import asyncio
 from app.tracing import tracer
 from app.schemas import Trace
 from app.auth import get_current_user
-from app.s3_file_service import S3Service
-from app.schemas import User, ProductBytes, ImageBytes, InboundDocumentType
-import base64
+from app.s3_file_service import S3Service, UploadFileSource
+from app.extraction_cache import cached_extract, stream_extract
+from app.json_stream import IncrementalObjectParser
+from app.single_flight import SingleFlight
+from app.url_fetcher import url_fetcher
+from app.image_preprocessing import preprocess_image
+from app.local_ocr import local_ocr
+from app.document_ingestion import open_paged_document, extract_paged_document
+from app.request_buffer import RequestBuffer, ImageInput, DeferredUpload, as_request_buffer, read_upload, inflight_budget
+from app.metrics import EXTRACTION_STAGE_DURATION, track_request
+from app.config import PREPROCESSING_SETTINGS, ARCHIVE_SETTINGS, LOCAL_OCR_SETTINGS, ImagePreset, FileUploadTransport, TracingLevel
+from app.archive_spool import archive_spool, ArchiveReceipt
+from app.archive_index import archive_index, archive_file_name, archive_format, ArchiveIndex
+from app.metrics import ARCHIVE_BYTES_SKIPPED
+from app.schemas import User, ProductBytes, ImageBytes, PreprocessingInfo
+from dataclasses import dataclass
+from contextlib import AsyncExitStack, aclosing
+import json
 
 router = APIRouter()
 DEFAULT_DOC_TYPE = "documents"
+single_flight = SingleFlight()
+# Concurrent archives of the same document upload once, whatever provider or preset they asked for;
+# an upload nobody waits for any more is cancelled
+archive_flight = SingleFlight(cancel_abandoned=True)
+
+
+@dataclass
+class ExtractionOutcome:
+    url: Optional[str]
+    result: dict
+    cache_tier: Optional[str]
+    preprocessing: PreprocessingInfo
+    archive_id: Optional[str] = None
+
+
+async def preprocess_and_extract(
+    service: Union[OpenAIService, GrokService],
+    provider: AIProvider,
+    image: RequestBuffer,
+    preset: ImagePreset
+) -> tuple[dict, Optional[str], PreprocessingInfo]:
+    """
+    Extract one document without archiving it; PDFs and ZIPs are split into pages.
+
+    Returns:
+        tuple: The extraction result, the cache tier that served it and the preprocessing applied
+    """
+    document = open_paged_document(image.data)
+    if document is None:
+        return await _extract_image(service, provider, image, preset)
+    try:
+        return await extract_paged_document(
+            document,
+            lambda page_bytes: _extract_image(service, provider, page_bytes, preset)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _extract_image(
+    service: Union[OpenAIService, GrokService],
+    provider: AIProvider,
+    image: ImageInput,
+    preset: ImagePreset
+) -> tuple[dict, Optional[str], PreprocessingInfo]:
+    image = as_request_buffer(image)
+    try:
+        processed_bytes, preprocessing = await preprocess_image(image.data, preset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Untouched images keep their buffer, and with it the digest and encodings already made
+    processed = image if processed_bytes is image.data else RequestBuffer(processed_bytes)
+    if LOCAL_OCR_SETTINGS.enabled:
+        # Cards that Tesseract reads cleanly and that validate never reach the provider
+        result = await local_ocr.extract_document_info(processed)
+        if result is not None:
+            return result, None, preprocessing
+    result, cache_tier = await cached_extract(service, provider.value, processed)
+    return result, cache_tier, preprocessing
+
+
+async def _extract_and_archive(
+    service: Union[OpenAIService, GrokService],
+    provider: AIProvider,
+    image: RequestBuffer,
+    preset: ImagePreset,
+    file_name: str,
+    user: User,
+    tenant: str
+) -> ExtractionOutcome:
+    """
+    Archive the original image while preprocessing it and extracting its information.
+    """
+    archive_task = _archive(image, file_name, user, tenant)
+    extract_task = preprocess_and_extract(service, provider, image, preset)
+    receipt, (result, cache_tier, preprocessing) = await asyncio.gather(archive_task, extract_task)
+    return ExtractionOutcome(
+        url=receipt.url,
+        result=result,
+        cache_tier=cache_tier,
+        preprocessing=preprocessing,
+        archive_id=receipt.archive_id
+    )
+
+
+async def _archive(image: RequestBuffer, file_name: str, user: User, tenant: str) -> ArchiveReceipt:
+    """
+    Archive the image once per tenant and user: a document already in the
+    archive index returns its earlier receipt without being uploaded again.
+    """
+    key = ArchiveIndex.make_key(image, user, tenant)
+    receipt = await archive_index.get(key)
+    if receipt is not None:
+        ARCHIVE_BYTES_SKIPPED.inc(len(image))
+        return receipt
+
+    async def archive_and_index() -> ArchiveReceipt:
+        receipt = await _upload_archive(image, file_name, user, tenant)
+        await archive_index.set(key, receipt)
+        return receipt
+
+    receipt, _ = await archive_flight.do(key, archive_and_index)
+    return receipt
+
+
+async def _upload_archive(image: RequestBuffer, file_name: str, user: User, tenant: str) -> ArchiveReceipt:
+    """
+    Hand the image to the archive spool, or upload it to S3 inline when spooling is disabled.
+    """
+    _, content_type = archive_format(image)
+    if ARCHIVE_SETTINGS.spool_enabled:
+        return await archive_spool.submit(image.view, file_name, content_type, user, tenant)
+
+    s3_service = S3Service()
+    if FILE_UPLOAD_SETTINGS.transport == FileUploadTransport.BINARY:
+        source = UploadFileSource(file_name=file_name, content_type=content_type.value, data=image.data)
+        urls = await s3_service.upload_files_binary(user, DEFAULT_DOC_TYPE, [source], tenant)
+        return ArchiveReceipt(archive_id=None, url=urls[0])
+
+    docs: list[ProductBytes] = [
+        ProductBytes(
+            product_code=DEFAULT_DOC_TYPE,
+            images=[
+                ImageBytes(
+                    image_name=file_name,
+                    image_type=content_type,
+                    image_bytes=image.b64
+                )
+            ]
+        )
+    ]
+    s3_response = await s3_service.upload_to_s3_file_bytes(user, docs, tenant)
+    url = s3_response.get('s3_urls', {}).get(DEFAULT_DOC_TYPE, [None])[0]
+    return ArchiveReceipt(archive_id=None, url=url)
+
+
+async def download_file(file_url: str, span) -> bytes:
+    try:
+        return await url_fetcher.fetch(file_url)
+    except HTTPException:
+        span.add_event("Failed to retrieve file from URL")
+        raise
+
+
+async def process_document(
+    image_bytes: ImageInput,
+    provider: AIProvider,
+    preset: ImagePreset,
+    mobile: str,
+    tenant: str,
+    start_time: float,
+    span
+) -> DocumentResponse:
+    """
+    Run the extraction pipeline for one document whose bytes are already in memory.
+
+    Raises:
+        HTTPException: If the content is empty, unsupported or the extraction fails
+    """
+    image = as_request_buffer(image_bytes)
+    # Ensure image_bytes is not empty
+    if not len(image):
+        span.add_event("Empty file content", {"error": True})
+        raise HTTPException(status_code=400, detail="Empty file content")
+
+    # Get the appropriate service based on the provider
+    service: Union[OpenAIService, GrokService] = ServiceFactory.get_service(provider)
+    span.add_event("Service selected", {"provider": provider})
+
+    file_name = archive_file_name(image)
+    span.set_attribute("s3.file_name", file_name)
+
+    user = User(
+        mobile_no=mobile,
+        company_name=""
+    )
+    # Duplicate submissions of the same bytes share one extraction and upload
+    flight_key = (image.digest, provider.value, preset.value, tenant, mobile)
+    span.add_event("Scheduled S3 upload and document extraction tasks")
+
+    try:
+        outcome, shared = await single_flight.do(
+            flight_key,
+            lambda: _extract_and_archive(service, provider, image, preset, file_name, user, tenant)
+        )
+        url, result, cache_tier = outcome.url, dict(outcome.result), outcome.cache_tier
+        routing = result.pop("routing", None)
+        usage = result.pop("usage", None)
+        pages = result.pop("pages", None)
+        span.set_attribute("cache.hit", cache_tier is not None)
+        span.set_attribute("image.bytes_saved", outcome.preprocessing.bytes_saved)
+        span.set_attribute("single_flight.shared", shared)
+        span.add_event("Completed asynchronous tasks", {"s3_url": url or ""})
+    except Exception as e:
+        span.record_exception(e)
+        span.set_attribute("error", True)
+        raise e
+
+    try:
+        with EXTRACTION_STAGE_DURATION.labels(stage="validation").time():
+            doc_info = DocumentInfo(**result)
+        span.add_event("Converted extraction result to DocumentInfo model")
+    except Exception as e:
+        span.record_exception(e)
+        span.set_attribute("error", True)
+        raise HTTPException(status_code=500, detail="Invalid document information format")
+
+    time_taken = time.time() - start_time
+    span.set_attribute("time_taken", round(time_taken, 2))
+    span.add_event("Completed processing", {"duration": round(time_taken, 2)})
+
+    return DocumentResponse(
+        success=True,
+        data=doc_info,
+        time_taken=round(time_taken, 2),
+        url=url,
+        cache_hit=cache_tier is not None,
+        cache_tier=cache_tier,
+        preprocessing=outcome.preprocessing,
+        archive_id=outcome.archive_id,
+        routing=routing,
+        usage=usage,
+        pages=pages
+    )
+
 
 @router.post("/extract", response_model=DocumentResponse)
 async def extract_document_info(
     file: Optional[UploadFile] = None,
     file_url: Optional[str] = Form(None),
     provider: AIProvider = Form(AIProvider.OPENAI),
+    preset: ImagePreset = Form(PREPROCESSING_SETTINGS.default_preset),
     mobile: str = Form(None),
     tenant: str = Form(None),
     trace: Trace = Depends(get_current_user)
@@ -31,100 +272,274 @@ async def extract_document_info(
     start_time = time.time()
 
     # Start the tracing span for this operation
-    with tracer.start_as_current_span("extract_document_info") as span:
+    with tracer.start_as_current_span("extract_document_info", level=TracingLevel.MINIMAL) as span, track_request("extract"):
         span.set_attribute("component", "document_extraction")
         span.add_event("Start processing request")
 
-        image_bytes = None
+        image: Optional[RequestBuffer] = None
         try:
             # Check if an uploaded file is provided
             if file:
                 span.add_event("Uploaded file provided")
-                image_bytes = await file.read()
-                span.set_attribute("file.size", len(image_bytes))
+                # None when the server does not know it, the budget then reserves the most an upload may take
+                size = file.size
             # Otherwise, check if a file URL is provided
             elif file_url:
                 span.add_event("File URL provided")
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(file_url)
-                    span.set_attribute("http.status_code", response.status_code)
-                    if response.status_code != 200:
-                        span.add_event("Failed to retrieve file from URL")
-                        raise HTTPException(status_code=400, detail="Unable to retrieve file from URL")
-                    image_bytes = response.content
-                    span.set_attribute("file.size", len(image_bytes))
+                image = RequestBuffer(await download_file(file_url, span))
+                size = len(image)
             else:
                 span.add_event("No file or URL provided")
                 raise HTTPException(status_code=400, detail="No file or file URL provided")
+
+            # Uploads are spooled by the server until here, only load them once there is room
+            async with inflight_budget.reserve(size) as reservation:
+                if image is None:
+                    image = await read_upload(file)
+                    await reservation.shrink(len(image))
+                span.set_attribute("file.size", len(image))
+                return await process_document(image, provider, preset, mobile, tenant, start_time, span)
         except Exception as e:
             span.record_exception(e)
             span.set_attribute("error", True)
             raise e
 
-        # Ensure image_bytes is not empty
-        if not image_bytes:
-            span.add_event("Empty file content", {"error": True})
-            raise HTTPException(status_code=400, detail="Empty file content")
-
-        # Get the appropriate service based on the provider
-        service: Union[OpenAIService, GrokService] = ServiceFactory.get_service(provider)
-        span.add_event("Service selected", {"provider": provider})
-
-        # Initialize the S3 file service for saving the image
-        s3_service = S3Service()
-        file_name = f"doc_{int(time.time())}.png"
-        span.set_attribute("s3.file_name", file_name)
-
-        # Wrap file bytes in a BytesIO if file object is not available
-        if file is None:
-            file_obj = BytesIO(image_bytes)
-            file = UploadFile(filename=file_name, file=file_obj)
-            span.add_event("Wrapped file bytes into BytesIO object")
-
-        docs: list[ProductBytes] = [
-            ProductBytes(
-                product_code=DEFAULT_DOC_TYPE,
-                images=[
-                    ImageBytes(
-                        image_name=file_name,
-                        image_type=InboundDocumentType.PNG,
-                        image_bytes=base64.b64encode(image_bytes).decode("utf-8")
-                    )
-                ]
-            )
-        ]
-        user = User(
-            mobile_no=mobile,
-            company_name=""
-        )
-        save_task = s3_service.upload_to_s3_file_bytes(user, docs, tenant)
-        extract_task = service.extract_document_info(image_bytes)
-        span.add_event("Scheduled S3 upload and document extraction tasks")
 
-        try:
-            s3_response, result = await asyncio.gather(save_task, extract_task)
-            url = s3_response.get('s3_urls', {}).get(DEFAULT_DOC_TYPE, [None])[0]
-            span.add_event("Completed asynchronous tasks", {"s3_url": url})
-        except Exception as e:
-            span.record_exception(e)
-            span.set_attribute("error", True)
-            raise e
+@router.post("/extract/batch", response_class=StreamingResponse)
+async def extract_documents_batch(
+    files: list[UploadFile] = File(default=[]),
+    file_urls: list[str] = Form(default=[]),
+    provider: AIProvider = Form(AIProvider.OPENAI),
+    preset: ImagePreset = Form(PREPROCESSING_SETTINGS.default_preset),
+    concurrency: int = Form(SETTINGS.BATCH_DEFAULT_CONCURRENCY),
+    mobile: str = Form(None),
+    tenant: str = Form(None),
+    trace: Trace = Depends(get_current_user)
+):
+    """
+    Extract many documents in one request and stream each result as an NDJSON line.
+
+    Items run concurrently under a per-request cap and are written out in
+    completion order; every line carries the item's index and source so the
+    client can match it to its input. A failing item yields a line with
+    success false and does not affect the others.
+    """
+    with tracer.start_as_current_span("extract_documents_batch", level=TracingLevel.MINIMAL) as span:
+        item_count = len(files) + len(file_urls)
+        span.set_attribute("batch.size", item_count)
+        if item_count == 0:
+            raise HTTPException(status_code=400, detail="No files or file URLs provided")
+        if item_count > SETTINGS.BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {SETTINGS.BATCH_MAX_ITEMS} documents per batch")
 
+        # Uploads are only read once their item has a slot and room in the budget, after this handler returned
+        sources: list[tuple[str, Optional[DeferredUpload], Optional[str]]] = []
+        for upload in files:
+            deferred = DeferredUpload(upload)
+            sources.append((deferred.filename, deferred, None))
+        for url in file_urls:
+            sources.append((url, None, url))
+
+    concurrency = max(1, min(concurrency, SETTINGS.BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, source: str, upload: Optional[DeferredUpload], file_url: Optional[str]) -> BatchItemResponse:
+        start_time = time.time()
+        with tracer.start_as_current_span("extract_documents_batch_item", level=TracingLevel.MINIMAL) as item_span:
+            item_span.set_attribute("batch.index", index)
+            try:
+                with track_request("batch"):
+                    async with AsyncExitStack() as stack:
+                        if file_url is not None:
+                            # Downloads run ahead of the extraction slots, under their own cap and with room
+                            # reserved in the budget for as long as the document is held
+                            image = await stack.enter_async_context(url_fetcher.prefetch(file_url, inflight_budget))
+                        async with semaphore:
+                            if upload is not None:
+                                reservation = await stack.enter_async_context(inflight_budget.reserve(upload.size))
+                                image = await upload.read()
+                                await reservation.shrink(len(image))
+                            response = await process_document(image, provider, preset, mobile, tenant, start_time, item_span)
+            except Exception as e:
+                item_span.record_exception(e)
+                item_span.set_attribute("error", True)
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                response = DocumentResponse(success=False, error=str(error), time_taken=round(time.time() - start_time, 2))
+            finally:
+                if upload is not None:
+                    upload.close()
+        return BatchItemResponse(index=index, source=source, **response.model_dump())
+
+    async def stream_results():
+        tasks = [asyncio.create_task(run_item(index, *source)) for index, source in enumerate(sources)]
         try:
-            doc_info = DocumentInfo(**result)
-            span.add_event("Converted extraction result to DocumentInfo model")
-        except Exception as e:
-            span.record_exception(e)
-            span.set_attribute("error", True)
-            raise HTTPException(status_code=500, detail="Invalid document information format")
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield item.model_dump_json() + "\n"
+        finally:
+            # The client went away or the stream failed, stop the remaining work
+            for task in tasks:
+                task.cancel()
+            for _, upload, _ in sources:
+                if upload is not None:
+                    upload.close()
 
-        time_taken = time.time() - start_time
-        span.set_attribute("time_taken", round(time_taken, 2))
-        span.add_event("Completed processing", {"duration": round(time_taken, 2)})
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
-        return DocumentResponse(
-            success=True,
-            data=doc_info,
-            time_taken=round(time_taken, 2),
-            url=url
-        )
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/extract/stream", response_class=StreamingResponse)
+async def extract_document_info_stream(
+    request: Request,
+    file: Optional[UploadFile] = None,
+    file_url: Optional[str] = Form(None),
+    provider: AIProvider = Form(AIProvider.OPENAI),
+    preset: ImagePreset = Form(PREPROCESSING_SETTINGS.default_preset),
+    mobile: str = Form(None),
+    tenant: str = Form(None),
+    trace: Trace = Depends(get_current_user)
+):
+    """
+    Extract a document and stream the result as server-sent events.
+
+    A ``field`` event ({"field": ..., "value": ...}) is sent as soon as each
+    field is complete in the model's token stream. The final ``result`` event
+    carries the validated DocumentResponse plus timing; failures end the
+    stream with an ``error`` event. The result never waits for the archive:
+    when the upload has not finished by then, an ``archive`` event follows
+    with its url and archive_id, or with an error. Concurrent streams of the
+    same document share one provider stream, and its result is cached like
+    any other extraction. Disconnecting ends the events and cancels the
+    archive upload, and the provider stream once no other request follows it.
+    """
+    start_time = time.time()
+    with tracer.start_as_current_span("extract_document_info_stream", level=TracingLevel.MINIMAL) as span:
+        upload: Optional[DeferredUpload] = None
+        downloaded: Optional[RequestBuffer] = None
+        if file:
+            if file.size == 0:
+                raise HTTPException(status_code=400, detail="Empty file content")
+            # Read once the events have room in the budget, after this handler returned
+            upload = DeferredUpload(file)
+        elif file_url:
+            downloaded = RequestBuffer(await download_file(file_url, span))
+            if not len(downloaded):
+                raise HTTPException(status_code=400, detail="Empty file content")
+        else:
+            raise HTTPException(status_code=400, detail="No file or file URL provided")
+
+    service = ServiceFactory.get_service(provider)
+    user = User(
+        mobile_no=mobile,
+        company_name=""
+    )
+
+    async def events():
+        with tracer.start_as_current_span("extract_document_info_stream_events", level=TracingLevel.MINIMAL) as span:
+            span.set_attribute("provider", provider.value)
+            first_field_at = None
+            archive_task: Optional[asyncio.Task] = None
+            try:
+                with track_request("stream"):
+                    size = upload.size if upload is not None else len(downloaded)
+                    async with inflight_budget.reserve(size) as reservation:
+                        if upload is not None:
+                            image = await upload.read()
+                            await reservation.shrink(len(image))
+                            if not len(image):
+                                raise HTTPException(status_code=400, detail="Empty file content")
+                        else:
+                            image = downloaded
+                        try:
+                            processed_bytes, preprocessing = await preprocess_image(image.data, preset)
+                        except ValueError as e:
+                            raise HTTPException(status_code=400, detail=str(e))
+                        processed = image if processed_bytes is image.data else RequestBuffer(processed_bytes)
+                        archive_task = asyncio.create_task(_archive(image, archive_file_name(image), user, tenant))
+
+                        parser = IncrementalObjectParser()
+                        result, cache_tier = None, None
+                        # aclosing() stops following the extraction as soon as this generator stops
+                        async with aclosing(stream_extract(service, provider.value, processed)) as extraction:
+                            async for kind, value in extraction:
+                                if kind == "result":
+                                    result, cache_tier = value
+                                    continue
+                                for field, field_value in parser.feed(value):
+                                    if first_field_at is None:
+                                        first_field_at = time.time()
+                                        span.add_event("First field streamed", {"field": field})
+                                    yield _sse_event("field", {"field": field, "value": field_value})
+                                if await request.is_disconnected():
+                                    span.add_event("Client disconnected")
+                                    return
+                        span.set_attribute("cache.hit", cache_tier is not None)
+                        if first_field_at is None:
+                            # Served from the cache or by an extraction already in flight, nothing was streamed
+                            first_field_at = time.time()
+                            for field in DocumentInfo.model_fields:
+                                if field in result:
+                                    yield _sse_event("field", {"field": field, "value": result[field]})
+
+                        routing = result.pop("routing", None)
+                        usage = result.pop("usage", None)
+                        try:
+                            with EXTRACTION_STAGE_DURATION.labels(stage="validation").time():
+                                doc_info = DocumentInfo(**result)
+                        except Exception as e:
+                            span.record_exception(e)
+                            raise HTTPException(status_code=500, detail="Invalid document information format")
+
+                        # An archive that already finished goes into the result, a pending or failed one is
+                        # reported after it
+                        receipt = archive_task.result() if archive_task.done() and archive_task.exception() is None else None
+                        time_taken = time.time() - start_time
+                        response = DocumentResponse(
+                            success=True,
+                            data=doc_info,
+                            time_taken=round(time_taken, 2),
+                            url=receipt.url if receipt else None,
+                            cache_hit=cache_tier is not None,
+                            cache_tier=cache_tier,
+                            preprocessing=preprocessing,
+                            archive_id=receipt.archive_id if receipt else None,
+                            routing=routing,
+                            usage=usage
+                        )
+                        timing = {
+                            "first_field": round(first_field_at - start_time, 3) if first_field_at else None,
+                            "total": round(time_taken, 3)
+                        }
+                        yield _sse_event("result", {**response.model_dump(mode="json"), "timing": timing})
+
+                        if receipt is None:
+                            try:
+                                receipt = await archive_task
+                            except Exception as e:
+                                span.record_exception(e)
+                                error = e.detail if isinstance(e, HTTPException) else str(e)
+                                yield _sse_event("archive", {"error": str(error)})
+                            else:
+                                yield _sse_event("archive", {"url": receipt.url, "archive_id": receipt.archive_id})
+            except Exception as e:
+                span.record_exception(e)
+                span.set_attribute("error", True)
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                yield _sse_event("error", {"error": str(error)})
+            finally:
+                # The client went away or the extraction failed: stop archiving and never leave
+                # the task's exception unretrieved
+                if archive_task is not None:
+                    archive_task.cancel()
+                    archive_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                if upload is not None:
+                    upload.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,292 @@
+import io
+import os
+import asyncio
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+from app.base_service import sniff_container_format, sniff_image_format
+from app.config import INGESTION_SETTINGS, IngestionSettings
+from app.document_validators import normalize_dob, validate_document
+from app.extraction_cache import PER_CALL_KEYS
+from app.image_preprocessing import get_preprocessing_executor
+from app.schemas import PagesInfo, PreprocessingInfo
+from app.tracing import tracer
+
+# Extracts one page image: (result, cache tier, preprocessing info)
+PageExtractor = Callable[[bytes], Awaitable[tuple[dict, Optional[str], PreprocessingInfo]]]
+
+RENDER_QUALITY = 92
+
+
+def _pdf_page_count(path: str) -> int:
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _render_pdf_page(path: str, index: int, scale: float) -> bytes:
+    """Render a single page to JPEG. Runs inside the worker pool, which opens the file itself."""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[index]
+        try:
+            image = page.render(scale=scale).to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="JPEG", quality=RENDER_QUALITY)
+    return output.getvalue()
+
+
+class PagedDocument(ABC):
+    """A multi-page document whose pages are only materialised when asked for."""
+
+    source_format = ""
+
+    def __init__(self, data: bytes, settings: IngestionSettings):
+        self.data = data
+        self.settings = settings
+
+    @abstractmethod
+    async def open(self) -> int:
+        """Prepare the document and return its page count."""
+
+    @abstractmethod
+    async def page(self, index: int) -> Optional[bytes]:
+        """Image bytes of a page, or None when the page is not an image."""
+
+    def close(self):
+        pass
+
+
+class PdfPages(PagedDocument):
+    """
+    PDF pages rasterised on demand in the preprocessing process pool.
+
+    The PDF is written to a temporary file once so that workers open it
+    directly, instead of pickling the whole document for every page.
+    """
+
+    source_format = "pdf"
+
+    def __init__(self, data: bytes, settings: IngestionSettings):
+        super().__init__(data, settings)
+        self.scale = settings.render_dpi / 72
+        self.path: Optional[str] = None
+
+    def _write(self) -> str:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(self.data)
+        return f.name
+
+    async def open(self) -> int:
+        self.path = await asyncio.to_thread(self._write)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_preprocessing_executor(), _pdf_page_count, self.path)
+        except Exception as e:
+            raise ValueError("Unreadable or password-protected PDF") from e
+
+    async def page(self, index: int) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_preprocessing_executor(), _render_pdf_page, self.path, index, self.scale)
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class ZipPages(PagedDocument):
+    """Image members of a ZIP archive in name order, each decompressed only when needed."""
+
+    source_format = "zip"
+
+    def __init__(self, data: bytes, settings: IngestionSettings):
+        super().__init__(data, settings)
+        self.archive: Optional[zipfile.ZipFile] = None
+        self.members: list[zipfile.ZipInfo] = []
+
+    def _open(self) -> int:
+        try:
+            self.archive = zipfile.ZipFile(io.BytesIO(self.data))
+        except zipfile.BadZipFile as e:
+            raise ValueError("Unreadable ZIP archive") from e
+        self.members = sorted(
+            (
+                info for info in self.archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith("__MACOSX/")
+                and info.file_size <= self.settings.max_member_bytes
+            ),
+            key=lambda info: info.filename
+        )
+        return len(self.members)
+
+    async def open(self) -> int:
+        return await asyncio.to_thread(self._open)
+
+    def _read(self, index: int) -> Optional[bytes]:
+        data = self.archive.read(self.members[index])
+        return data if sniff_image_format(data) else None
+
+    async def page(self, index: int) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, index)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+
+def open_paged_document(data: bytes, settings: IngestionSettings = INGESTION_SETTINGS) -> Optional[PagedDocument]:
+    container = sniff_container_format(data)
+    if container == "pdf":
+        return PdfPages(data, settings)
+    if container == "zip":
+        return ZipPages(data, settings)
+    return None
+
+
+def merge_pages(results: dict[int, dict]) -> dict:
+    """
+    Combine per-page results, earlier pages first.
+
+    The id and type come together from the first page whose id validates
+    against its type; every other field takes the first non-empty value.
+    """
+    ordered = [results[index] for index in sorted(results)]
+    merged: dict = {}
+    for result in ordered:
+        for field, value in result.items():
+            if field in PER_CALL_KEYS:
+                continue
+            if field not in merged or (merged[field] in (None, "") and value not in (None, "")):
+                merged[field] = value
+    identified = next((result for result in ordered if validate_document(result)["doc_id"]), None)
+    if identified is not None:
+        merged["doc_id"] = identified["doc_id"]
+        merged["doc_type"] = identified["doc_type"]
+    # Pages may print the date differently, the response model only takes ISO dates
+    normalize_dob(merged)
+
+    usage: dict = {}
+    for result in ordered:
+        for key, value in (result.get("usage") or {}).items():
+            usage[key] = usage.get(key, 0) + value
+    if usage:
+        merged["usage"] = usage
+    return merged
+
+
+async def extract_paged_document(
+    document: PagedDocument,
+    extract_page: PageExtractor,
+    settings: IngestionSettings = INGESTION_SETTINGS
+) -> tuple[dict, Optional[str], PreprocessingInfo]:
+    """
+    Extract a multi-page document page by page.
+
+    Pages are rendered and extracted ``page_concurrency`` at a time, in page
+    order. After each page the results so far are merged, and once the merged
+    result validates no further pages are started and those in flight are
+    cancelled. Pages that fail are skipped; the error is only raised when no
+    page could be extracted.
+
+    Raises:
+        ValueError: If the document is unreadable or has no pages
+    """
+    with tracer.start_as_current_span("extract_paged_document") as span:
+        span.set_attribute("document.format", document.source_format)
+        try:
+            total = min(await document.open(), settings.max_pages)
+            span.set_attribute("document.pages", total)
+            if total == 0:
+                raise ValueError(f"No pages found in {document.source_format.upper()}")
+
+            async def run(index: int) -> Optional[tuple[dict, Optional[str], PreprocessingInfo]]:
+                page_bytes = await document.page(index)
+                if page_bytes is None:
+                    return None
+                return await extract_page(page_bytes)
+
+            pending: dict[asyncio.Task, int] = {}
+            results: dict[int, dict] = {}
+            tiers: list[Optional[str]] = []
+            page_infos: list[PreprocessingInfo] = []
+            errors: list[Exception] = []
+            next_index = 0
+            stopped_early = False
+            merged: dict = {}
+
+            try:
+                while True:
+                    while next_index < total and len(pending) < settings.page_concurrency:
+                        pending[asyncio.create_task(run(next_index))] = next_index
+                        next_index += 1
+                    if not pending:
+                        break
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index = pending.pop(task)
+                        try:
+                            outcome = task.result()
+                        except Exception as e:
+                            span.add_event("Page failed", {"page": index, "error": str(getattr(e, "detail", e))})
+                            errors.append(e)
+                            continue
+                        if outcome is None:
+                            continue
+                        result, tier, info = outcome
+                        results[index] = result
+                        tiers.append(tier)
+                        page_infos.append(info)
+
+                    merged = merge_pages(results)
+                    if settings.stop_early and merged and all(validate_document(merged).values()):
+                        stopped_early = next_index < total or bool(pending)
+                        break
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            if not results:
+                if errors:
+                    raise errors[0]
+                raise ValueError(f"No images found in {document.source_format.upper()}")
+        finally:
+            document.close()
+
+        span.set_attribute("document.pages_extracted", len(results))
+        span.set_attribute("document.stopped_early", stopped_early)
+        merged["file_type"] = document.source_format
+        merged["pages"] = PagesInfo(
+            source_format=document.source_format,
+            total_pages=total,
+            pages_extracted=len(results),
+            stopped_early=stopped_early
+        ).model_dump()
+
+        # Only a cache hit if every extracted page was served from the cache
+        cache_tier = tiers[0] if all(tiers) else None
+        preprocessing = PreprocessingInfo(
+            preset=page_infos[0].preset,
+            source_format=document.source_format,
+            output_format=page_infos[0].output_format,
+            original_bytes=len(document.data),
+            processed_bytes=sum(info.processed_bytes for info in page_infos),
+            estimated_tokens_saved=sum(info.estimated_tokens_saved for info in page_infos)
+        )
+        return merged, cache_tier, preprocessing
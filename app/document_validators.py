@@ -0,0 +1,111 @@
+import re
+from datetime import date, datetime
+from typing import Optional
+
+PAN_CARD = "PAN CARD"
+AADHAAR_CARD = "AADHAAR CARD"
+
+PAN_PATTERN = re.compile(r"^[A-Z]{5}[0-9]{4}[A-Z]$")
+AADHAAR_PATTERN = re.compile(r"^[2-9][0-9]{11}$")
+NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z .'-]*[A-Za-z.]$")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y")
+
+# Verhoeff checksum tables: multiplication in the dihedral group D5, and the position permutation
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+def verhoeff_valid(number: str) -> bool:
+    if not number.isdigit():
+        return False
+    checksum = 0
+    for position, digit in enumerate(reversed(number)):
+        checksum = _VERHOEFF_D[checksum][_VERHOEFF_P[position % 8][int(digit)]]
+    return checksum == 0
+
+
+def normalize_id(value: Optional[str]) -> str:
+    return re.sub(r"[\s-]", "", value or "").upper()
+
+
+def is_valid_pan(value: Optional[str]) -> bool:
+    return bool(PAN_PATTERN.match(normalize_id(value)))
+
+
+def is_valid_aadhaar(value: Optional[str]) -> bool:
+    number = normalize_id(value)
+    return bool(AADHAAR_PATTERN.match(number)) and verhoeff_valid(number)
+
+
+def parse_date(value) -> Optional[date]:
+    """Parse the date formats printed on Indian ID cards, returns None when unparseable."""
+    if isinstance(value, date):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+        if 1900 <= parsed.year <= date.today().year:
+            return parsed
+    return None
+
+
+def normalize_dob(result: dict) -> dict:
+    """Rewrite a dob parse_date reads as YYYY-MM-DD, the only form DocumentInfo accepts."""
+    parsed = parse_date(result.get("dob"))
+    if parsed is not None:
+        result["dob"] = parsed.isoformat()
+    return result
+
+
+def is_valid_name(value: Optional[str]) -> bool:
+    return bool(value) and bool(NAME_PATTERN.match(value.strip()))
+
+
+def validate_document(result: dict) -> dict[str, bool]:
+    """
+    Check each validated field of an extraction result.
+
+    Returns:
+        dict: Field name to whether it passed. doc_id is checked against the
+            format of the detected doc_type (PAN pattern, Aadhaar Verhoeff).
+    """
+    doc_type = (result.get("doc_type") or "").upper()
+    doc_id = result.get("doc_id")
+    if doc_type == PAN_CARD:
+        doc_id_valid = is_valid_pan(doc_id)
+    elif doc_type == AADHAAR_CARD:
+        doc_id_valid = is_valid_aadhaar(doc_id)
+    else:
+        doc_id_valid = False
+    return {
+        "doc_type": doc_type in (PAN_CARD, AADHAAR_CARD),
+        "doc_id": doc_id_valid,
+        "full_name": is_valid_name(result.get("full_name")),
+        "dob": parse_date(result.get("dob")) is not None,
+    }
@@ -0,0 +1,267 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Optional
+from app.config import CACHE_SETTINGS, CacheSettings
+from app.document_validators import validate_document
+from app.tracing import instrument, tracer
+from app.single_flight import SingleFlight
+from app.request_buffer import ImageInput, as_request_buffer
+
+logger = logging.getLogger(__name__)
+
+# Result keys describing one provider call (its tokens, which provider answered), never cached
+PER_CALL_KEYS = ("usage", "routing")
+
+
+class CacheTier:
+    MEMORY = "memory"
+    REDIS = "redis"
+
+
+class LRUCache:
+    """In-process LRU cache with a TTL per entry and a cap on the total stored bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[int] = None):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + (ttl_seconds or self.ttl_seconds), value)
+        self.size_bytes += len(value)
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size_bytes -= len(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Shared second tier backed by Redis. Errors are logged and treated as a miss."""
+
+    def __init__(self, url: str, prefix: str, ttl_seconds: int):
+        from redis.asyncio import Redis
+
+        instrument("redis")
+        self.client = Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning("Redis cache get failed: %s", e)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[int] = None):
+        try:
+            await self.client.set(self.prefix + key, value, ex=ttl_seconds or self.ttl_seconds)
+        except Exception as e:
+            logger.warning("Redis cache set failed: %s", e)
+
+
+class ExtractionCache:
+    """
+    Tiered cache of extraction results keyed by image hash, provider, model and prompt version.
+
+    Lookups go to the in-process LRU first and then to Redis (when configured);
+    a Redis hit is promoted into the LRU. Results that fail validation are
+    only kept for ``invalid_ttl_seconds``, or not at all.
+    """
+
+    def __init__(self, settings: CacheSettings = CACHE_SETTINGS):
+        self.enabled = settings.enabled
+        self.invalid_ttl_seconds = settings.invalid_ttl_seconds
+        self.memory = LRUCache(settings.max_entries, settings.max_bytes, settings.ttl_seconds)
+        self.redis = RedisCache(settings.redis_url, settings.redis_prefix, settings.ttl_seconds) if settings.redis_url else None
+
+    @staticmethod
+    def make_key(image_digest: str, provider: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{image_digest}:{provider}:{model}:{prompt_version}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Returns:
+            tuple: The cached result (or None) and the tier it was found in.
+        """
+        if not self.enabled:
+            return None, None
+        value = self.memory.get(key)
+        if value is not None:
+            return json.loads(value), CacheTier.MEMORY
+        if self.redis is not None:
+            value = await self.redis.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                return json.loads(value), CacheTier.REDIS
+        return None, None
+
+    async def set(self, key: str, result: dict):
+        if not self.enabled:
+            return
+        ttl_seconds = None
+        if not all(validate_document(result).values()):
+            if not self.invalid_ttl_seconds:
+                return
+            ttl_seconds = self.invalid_ttl_seconds
+        value = json.dumps(result, default=str).encode("utf-8")
+        self.memory.set(key, value, ttl_seconds)
+        if self.redis is not None:
+            await self.redis.set(key, value, ttl_seconds)
+
+
+def image_digest(image: ImageInput) -> str:
+    # A RequestBuffer hashes once, however many callers ask
+    return as_request_buffer(image).digest
+
+
+extraction_cache = ExtractionCache()
+# Coalesces provider calls for the same cache key, even across tenants and users;
+# a call nobody waits for any more, such as a stream all of whose clients went away, is cancelled
+extraction_flight = SingleFlight(cancel_abandoned=True)
+
+
+async def cached_extract(service, provider: str, image_bytes: ImageInput) -> tuple[dict, Optional[str]]:
+    """
+    Run ``service.extract_document_info`` through the extraction cache.
+
+    Returns:
+        tuple: The extraction result and the cache tier that served it, or None on a miss.
+    """
+    with tracer.start_as_current_span("extraction_cache") as span:
+        key = ExtractionCache.make_key(image_digest(image_bytes), provider, service.model, service.prompt_version)
+        result, tier = await extraction_cache.get(key)
+        span.set_attribute("cache.hit", result is not None)
+        if result is not None:
+            span.set_attribute("cache.tier", tier)
+            return result, tier
+
+        async def extract_and_store() -> dict:
+            result = await service.extract_document_info(image_bytes)
+            await _store(key, result)
+            return result
+
+        result, shared = await extraction_flight.do(key, extract_and_store)
+        span.set_attribute("single_flight.shared", shared)
+        # Hand each caller its own copy, the shared result may be mutated downstream
+        return dict(result), None
+
+
+async def _store(key: str, result: dict):
+    # A cache hit costs no tokens and is routed nowhere
+    await extraction_cache.set(key, {k: v for k, v in result.items() if k not in PER_CALL_KEYS})
+
+
+class SharedStream:
+    """
+    Text deltas of one provider stream, replayed to every request following it.
+
+    A request that joins late first gets the deltas streamed so far, so each
+    follower sees the whole output.
+    """
+
+    def __init__(self):
+        self.deltas: list[str] = []
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, delta: str):
+        async with self._changed:
+            self.deltas.append(delta)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.finished = True
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.deltas) or self.finished)
+                deltas, finished = self.deltas[index:], self.finished
+            index += len(deltas)
+            for delta in deltas:
+                yield delta
+            if finished:
+                return
+
+
+# Provider streams in flight by cache key, for requests joining them
+_streams: dict[str, SharedStream] = {}
+
+
+async def _stream_and_store(service, image_bytes: ImageInput, key: str, stream: SharedStream) -> dict:
+    try:
+        async with aclosing(service.stream_document_info(image_bytes)) as deltas:
+            async for delta in deltas:
+                await stream.publish(delta)
+        result = service.parse_extraction("".join(stream.deltas))
+        result["file_type"] = service.detect_image_format(image_bytes)
+        await _store(key, result)
+        return result
+    finally:
+        if _streams.get(key) is stream:
+            del _streams[key]
+        await stream.finish()
+
+
+async def stream_extract(service, provider: str, image_bytes: ImageInput) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Run ``service.stream_document_info`` through the extraction cache.
+
+    Yields ``("delta", text)`` while the provider streams, then one
+    ``("result", (result, cache tier))``. A cache hit, or a plain extraction
+    of the same document already in flight, yields only the result.
+    Concurrent streams of the same document share one provider stream. When
+    the last request following it stops (its generator is closed or
+    cancelled), the provider stream is cancelled and nothing is cached.
+    """
+    key = ExtractionCache.make_key(image_digest(image_bytes), provider, service.model, service.prompt_version)
+    result, tier = await extraction_cache.get(key)
+    if result is not None:
+        yield "result", (result, tier)
+        return
+
+    stream = SharedStream()
+    task, shared = extraction_flight.start(key, lambda: _stream_and_store(service, image_bytes, key, stream))
+    with extraction_flight.follow(task):
+        if shared:
+            # None when the flight is a plain extraction, which has no deltas to follow
+            stream = _streams.get(key)
+        else:
+            _streams[key] = stream
+        if stream is not None:
+            async for delta in stream.follow():
+                yield "delta", delta
+        result = await asyncio.shield(task)
+    yield "result", (dict(result), None)
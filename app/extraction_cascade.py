@@ -0,0 +1,91 @@
+import time
+from typing import AsyncIterator
+from app.base_service import AIServiceBase
+from app.request_buffer import ImageInput
+from app.config import CASCADE_SETTINGS, CascadeSettings
+from app.document_validators import normalize_dob, validate_document
+from app.metrics import CASCADE_STAGE_DURATION, CASCADE_STAGE_OUTCOMES
+from app.openai_service import OpenAIService
+from app.tracing import tracer
+
+# doc_id is validated against doc_type, so a failure in one re-asks for both
+LINKED_FIELDS = {"doc_id": ("doc_type",), "doc_type": ("doc_id",)}
+
+
+def fields_to_retry(failed: list[str]) -> tuple[str, ...]:
+    fields = set(failed)
+    for field in failed:
+        fields.update(LINKED_FIELDS.get(field, ()))
+    return tuple(sorted(fields))
+
+
+def merge_usage(total: dict, usage: dict) -> dict:
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in total.keys() | usage.keys()}
+
+
+class ExtractionCascade(AIServiceBase):
+    """
+    Runs OpenAI extractions as a cascade of increasingly expensive stages.
+
+    The first stage is a cheap pass (low detail, small token budget by
+    default). Its result is validated: PAN pattern or Aadhaar Verhoeff
+    checksum, a DOB that parses to a date and a non-empty name. Only results
+    that fail go on to the next stage, which by default asks for just the
+    failed fields and merges them into the result. The last stage's result is
+    returned whether or not it validates.
+    """
+
+    def __init__(self, service: OpenAIService, settings: CascadeSettings = CASCADE_SETTINGS):
+        self.service = service
+        self.settings = settings
+        self.prompt = service.prompt
+        # Part of the extraction cache key, so changing the stages never reuses old results
+        self.model = "cascade:" + ">".join(f"{stage.model}/{stage.detail}" for stage in settings.stages)
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
+        with tracer.start_as_current_span("extraction_cascade") as span:
+            result: dict = {}
+            failed: list[str] = []
+            last_stage = len(self.settings.stages) - 1
+            for index, stage in enumerate(self.settings.stages):
+                fields = fields_to_retry(failed) if result and self.settings.retry_failed_fields_only else None
+                started = time.monotonic()
+                stage_result = await self.service.extract_document_info(
+                    image_bytes,
+                    model=stage.model,
+                    detail=stage.detail,
+                    max_tokens=stage.max_tokens,
+                    fields=fields
+                )
+                CASCADE_STAGE_DURATION.labels(stage=str(index)).observe(time.monotonic() - started)
+
+                usage = merge_usage(result.get("usage", {}), stage_result.pop("usage", {}))
+                if fields:
+                    result.update({field: stage_result.get(field, "") for field in fields})
+                else:
+                    result = stage_result
+                result["usage"] = usage
+                # The stage may have read "15/08/1990", the response model only takes ISO dates
+                normalize_dob(result)
+
+                failed = [field for field, valid in validate_document(result).items() if not valid]
+                span.add_event("Cascade stage finished", {
+                    "stage": index,
+                    "model": stage.model,
+                    "detail": stage.detail,
+                    "retried_fields": list(fields or ()),
+                    "failed_fields": failed,
+                })
+                if not failed:
+                    CASCADE_STAGE_OUTCOMES.labels(stage=str(index), outcome="accepted").inc()
+                    break
+                CASCADE_STAGE_OUTCOMES.labels(stage=str(index), outcome="exhausted" if index == last_stage else "escalated").inc()
+
+            span.set_attribute("cascade.stages_run", index + 1)
+            span.set_attribute("cascade.valid", not failed)
+            return result
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        """Streams cannot be validated before the client sees them, they use the plain OpenAI service."""
+        async for delta in self.service.stream_document_info(image_bytes):
+            yield delta
@@ -1,113 +1,131 @@
 import json
-import base64
-from typing import Dict
+from typing import AsyncIterator, Dict, Optional
 import httpx
-from app.config import SETTINGS
+from fastapi import HTTPException
+from app.admission import get_admission_controller
+from app.config import SETTINGS, ADMISSION_SETTINGS, TracingLevel
 from app.base_service import AIServiceBase
+from app.metrics import record_token_usage, track_provider_call
+from app.request_buffer import ImageInput, as_request_buffer
 from app.tracing import tracer
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_grok_client() -> httpx.AsyncClient:
+    """Process-wide client, so every Grok request shares one connection pool."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=SETTINGS.GROK_MAX_CONCURRENCY,
+                max_keepalive_connections=SETTINGS.GROK_MAX_CONCURRENCY
+            )
+        )
+    return _client
+
+
+async def close_grok_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 class GrokService(AIServiceBase):
+    model = "grok-1"
+
     def __init__(self):
         self.api_key = SETTINGS.GROK_KEY
-        self.base_url = "https://api.x.ai/v1"
+        self.base_url = SETTINGS.GROK_BASE_URL.rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.admission = get_admission_controller("grok")
+
+    def _build_payload(self, image_bytes: ImageInput) -> tuple[dict, str]:
+        instruction = self.prompt.text
+        buffer = as_request_buffer(image_bytes)
+        image_format = self.detect_image_format(buffer)
 
-    async def extract_document_info(self, image_bytes: bytes) -> dict:
-        with tracer.start_as_current_span('extract_document_info_grok') as span:
-            json_template = {
-                "doc_id": "",
-                "doc_type": "",
-                "full_name": "",
-                "fathers_name": "",
-                "address": "",
-                "dob": ""
-            }
-
-            instruction = f"""
-            You are an expert at extracting information from documents. Carefully analyze the provided image and extract the following key details into JSON format.
-
-            Please return ONLY the completed JSON with these fields:
-            {json.dumps(json_template, indent=2)}
-
-            Extraction guidelines:
-
-            1. Document ID:
-            - Look for any unique identifier in the document
-            - This could be a number, alphanumeric code, or reference number
-
-            1. Document Type:
-                - Identify the type of document. This field should return either "PAN CARD" or "AADHAAR CARD".
-                - For a PAN CARD, look for keywords such as "Permanent Account Number" or a 10-character alphanumeric code.
-                - For an AADHAAR CARD, look for terms like "Aadhaar" or a 12-digit numeric sequence.
-                - If the document type cannot be clearly determined, leave this field as NA.
-            
-            2. Full Name:
-            - The person's complete name as mentioned in the document
-            - Usually appears after labels like "Name:", "Full Name:"
-            
-            3. Father's Name:
-            - Look for text labeled as "Father's Name:"
-            - May be preceded by "S/O" (Son Of) or "D/O" (Daughter Of)
-            
-            4. Address:
-            - Complete address as mentioned in the document
-            - May span multiple lines
-            
-            5. Date of Birth:
-            - Look for text labeled as "Date of Birth:" or "DOB:"
-            - Format should be YYYY-MM-DD
-            - Convert other date formats to this standard format
-
-            Important instructions:
-            - If any field cannot be clearly identified, leave it as an empty string
-            - Do not make assumptions about data you cannot clearly see
-            - Return ONLY the completed JSON without any explanations
-            - Do not include any additional text or formatting
-            - Ensure the response is valid JSON
-            """
-            # Convert image to base64
-            image_format = self.detect_image_format(image_bytes)
-
-            # Convert image bytes to base64
-            mime_type = f'image/{image_format}'
-            b64_image = base64.b64encode(image_bytes).decode("utf-8")
-
-            # Prepare the request payload
-            payload = {
-                "model": "grok-1",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": instruction},
-                            {
-                                "type": "image",
-                                "image": {
-                                    "data": b64_image,
-                                    "type": image_format
-                                }
+        # Prepare the request payload
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": instruction},
+                        {
+                            "type": "image",
+                            "image": {
+                                "data": buffer.b64,
+                                "type": image_format
                             }
-                        ]
-                    }
-                ],
-                "max_tokens": 1000
-            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 1000
+        }
+        return payload, image_format
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
+        with tracer.start_as_current_span('extract_document_info_grok', level=TracingLevel.MINIMAL) as span:
+            payload, image_format = self._build_payload(image_bytes)
 
             # Make the API request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30.0
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Grok API error: {response.text}")
+            async with self.admission.admit(ADMISSION_SETTINGS.estimated_prompt_tokens + payload["max_tokens"]) as admission:
+                with track_provider_call("grok", self.model):
+                    response = await get_grok_client().post(
+                        f"{self.base_url}/chat/completions",
+                        headers=self.headers,
+                        json=payload
+                    )
+
+                    if response.status_code == 429:
+                        raise admission.throttled(response.headers)
+                    if response.status_code != 200:
+                        raise httpx.HTTPStatusError(f"Grok API error: {response.text}", request=response.request, response=response)
 
                 result = response.json()
-                extracted_data = json.loads(result["choices"][0]["message"]["content"])
+                admission.update(response.headers, (result.get("usage") or {}).get("total_tokens"))
+                extracted_data = self.parse_extraction(result["choices"][0]["message"]["content"])
                 extracted_data['file_type'] = image_format
-                return extracted_data
\ No newline at end of file
+                extracted_data['usage'] = self.token_usage(result.get("usage"))
+                span.set_attribute("usage.prompt_tokens", extracted_data['usage']['prompt_tokens'])
+                span.set_attribute("usage.cached_prompt_tokens", extracted_data['usage']['cached_prompt_tokens'])
+                span.set_attribute("usage.completion_tokens", extracted_data['usage']['completion_tokens'])
+                record_token_usage("grok", self.model, extracted_data['usage'])
+                return extracted_data
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        payload, _ = self._build_payload(image_bytes)
+        payload["stream"] = True
+        async with self.admission.admit(ADMISSION_SETTINGS.estimated_prompt_tokens + payload["max_tokens"]) as admission:
+            async with get_grok_client().stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload
+            ) as response:
+                if response.status_code == 429:
+                    raise admission.throttled(response.headers)
+                admission.update(response.headers)
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"Grok API error: {response.text}")
+
+                # Server-sent events, one JSON chunk per "data:" line
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        yield content
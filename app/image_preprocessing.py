@@ -0,0 +1,161 @@
+import io
+import math
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.base_service import sniff_image_format, SUPPORTED_IMAGE_FORMATS
+from app.config import PREPROCESSING_SETTINGS, PreprocessingSettings, ImagePreset
+from app.metrics import EXTRACTION_STAGE_DURATION
+from app.schemas import PreprocessingInfo
+from app.tracing import tracer
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_preprocessing_executor() -> ProcessPoolExecutor:
+    """Worker pool for decoding and re-encoding, keeps CPU-heavy image work off the event loop."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PREPROCESSING_SETTINGS.max_workers)
+    return _executor
+
+
+def shutdown_preprocessing_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def preset_parameters(preset: ImagePreset, settings: PreprocessingSettings = PREPROCESSING_SETTINGS) -> tuple[int, int]:
+    """Returns the long edge cap and encoder quality of a preset."""
+    if preset == ImagePreset.FAST:
+        return settings.fast_long_edge, settings.fast_quality
+    if preset == ImagePreset.QUALITY:
+        return settings.quality_long_edge, settings.quality_quality
+    return settings.balanced_long_edge, settings.balanced_quality
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+    """
+    Estimate the prompt tokens of an image sent at high detail.
+
+    The image is scaled to fit 2048x2048, then so that its short side is at most
+    768px, and billed at 170 tokens per 512px tile plus a base of 85.
+    """
+    if width <= 0 or height <= 0:
+        return 0
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+
+def _register_heif_opener():
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        return
+    register_heif_opener()
+
+
+def _transcode(image_bytes: bytes, long_edge: int, output_format: str, quality: int, keep_original: bool) -> tuple[bytes, dict]:
+    """
+    Decode, orient, downscale and re-encode an image. Runs inside the worker pool.
+
+    When ``keep_original`` is set the source bytes are returned unchanged if
+    re-encoding would not make them smaller and no resize was needed.
+    """
+    from PIL import Image, ImageOps
+
+    _register_heif_opener()
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = ImageOps.exif_transpose(image)
+        original_size = image.size
+
+        if max(image.size) > long_edge:
+            image.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+        resized = image.size != original_size
+
+        if image.mode not in ("RGB", "L"):
+            # JPEG has no alpha channel, flatten transparent images onto white
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+
+        output = io.BytesIO()
+        image.save(output, format=output_format.upper(), quality=quality, optimize=True)
+        processed = output.getvalue()
+        processed_size = image.size
+
+    if keep_original and not resized and len(processed) >= len(image_bytes):
+        return image_bytes, {"original_size": original_size, "processed_size": original_size, "transcoded": False}
+    return processed, {"original_size": original_size, "processed_size": processed_size, "transcoded": True}
+
+
+async def preprocess_image(image_bytes: bytes, preset: ImagePreset) -> tuple[bytes, PreprocessingInfo]:
+    """
+    Prepare an uploaded image for the vision providers according to a preset.
+
+    Formats the providers do not accept (HEIC, TIFF) are always transcoded, even
+    with the ``none`` preset.
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    with tracer.start_as_current_span("preprocess_image") as span, EXTRACTION_STAGE_DURATION.labels(stage="preprocess").time():
+        source_format = sniff_image_format(image_bytes)
+        span.set_attribute("image.preset", preset.value)
+        span.set_attribute("image.source_format", source_format or "unknown")
+        if source_format is None:
+            raise ValueError("Unsupported image format")
+
+        if preset == ImagePreset.NONE and source_format in SUPPORTED_IMAGE_FORMATS:
+            return image_bytes, PreprocessingInfo(
+                preset=preset.value,
+                source_format=source_format,
+                output_format=source_format,
+                original_bytes=len(image_bytes),
+                processed_bytes=len(image_bytes)
+            )
+
+        if preset == ImagePreset.NONE:
+            long_edge, quality = 1 << 16, PREPROCESSING_SETTINGS.quality_quality
+        else:
+            long_edge, quality = preset_parameters(preset)
+        output_format = PREPROCESSING_SETTINGS.output_format.value
+
+        loop = asyncio.get_running_loop()
+        try:
+            processed, details = await loop.run_in_executor(
+                get_preprocessing_executor(),
+                _transcode,
+                image_bytes,
+                long_edge,
+                output_format,
+                quality,
+                source_format in SUPPORTED_IMAGE_FORMATS
+            )
+        except Exception as e:
+            span.record_exception(e)
+            raise ValueError("Unsupported image format") from e
+
+        original_tokens = estimate_vision_tokens(*details["original_size"])
+        processed_tokens = estimate_vision_tokens(*details["processed_size"])
+        info = PreprocessingInfo(
+            preset=preset.value,
+            source_format=source_format,
+            output_format=output_format if details["transcoded"] else source_format,
+            original_bytes=len(image_bytes),
+            processed_bytes=len(processed),
+            bytes_saved=len(image_bytes) - len(processed),
+            original_dimensions=list(details["original_size"]),
+            processed_dimensions=list(details["processed_size"]),
+            estimated_tokens_saved=original_tokens - processed_tokens
+        )
+        span.set_attribute("image.bytes_saved", info.bytes_saved)
+        span.set_attribute("image.estimated_tokens_saved", info.estimated_tokens_saved)
+        return processed, info
@@ -0,0 +1,293 @@
+import time
+import asyncio
+from abc import abstractmethod
+from typing import Optional
+from app.config import JOB_SETTINGS, JobSettings, JobQueueBackend
+from app.schemas import Job, JobStatus, DocumentResponse
+
+
+class JobQueue():
+    """
+    Queue of extraction jobs shared by the API (producer) and the workers (consumers).
+
+    A dequeued job is leased for ``visibility_timeout`` seconds. If the worker
+    neither completes nor fails it in that time, the job becomes visible again
+    and is handed to another worker, up to ``max_attempts`` deliveries.
+    """
+
+    def __init__(self, settings: JobSettings):
+        self.settings = settings
+
+    @abstractmethod
+    async def enqueue(self, job: Job, image_bytes: Optional[bytes]):
+        pass
+
+    @abstractmethod
+    async def dequeue(self) -> Optional[tuple[Job, Optional[bytes]]]:
+        """Lease the next visible job, returns None when the queue is empty."""
+        pass
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    async def complete(self, job: Job, result: DocumentResponse):
+        pass
+
+    @abstractmethod
+    async def fail(self, job: Job, error: str, retry: bool = True) -> Job:
+        """Record a failed attempt, requeueing the job with backoff while attempts remain."""
+        pass
+
+    async def close(self):
+        pass
+
+    def retry_delay(self, attempts: int) -> float:
+        return self.settings.retry_backoff * (2 ** max(attempts - 1, 0))
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a SQLite database, or in memory when ``sqlite_path`` is ``:memory:``."""
+
+    def __init__(self, settings: JobSettings):
+        super().__init__(settings)
+        self._db = None
+        self._lock = asyncio.Lock()
+
+    async def _connection(self):
+        if self._db is None:
+            import aiosqlite
+
+            self._db = await aiosqlite.connect(self.settings.sqlite_path)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    job TEXT NOT NULL,
+                    image BLOB,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            await self._db.execute("CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (status, visible_at)")
+            await self._db.commit()
+        return self._db
+
+    async def _save(self, db, job: Job, visible_at: Optional[float] = None, drop_image: bool = False):
+        job.updated_at = time.time()
+        if visible_at is None:
+            await db.execute(
+                "UPDATE jobs SET status = ?, job = ?, attempts = ? WHERE job_id = ?",
+                (job.status.value, job.model_dump_json(), job.attempts, job.job_id)
+            )
+        else:
+            await db.execute(
+                "UPDATE jobs SET status = ?, job = ?, attempts = ?, visible_at = ? WHERE job_id = ?",
+                (job.status.value, job.model_dump_json(), job.attempts, visible_at, job.job_id)
+            )
+        if drop_image:
+            await db.execute("UPDATE jobs SET image = NULL WHERE job_id = ?", (job.job_id,))
+        await db.commit()
+
+    async def enqueue(self, job: Job, image_bytes: Optional[bytes]):
+        async with self._lock:
+            db = await self._connection()
+            await db.execute(
+                "INSERT INTO jobs (job_id, status, job, image, attempts, visible_at, created_at) VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (job.job_id, job.status.value, job.model_dump_json(), image_bytes, job.created_at, job.created_at)
+            )
+            await db.commit()
+
+    async def dequeue(self) -> Optional[tuple[Job, Optional[bytes]]]:
+        now = time.time()
+        async with self._lock:
+            db = await self._connection()
+            # Leases that expired on their last attempt will never be delivered again
+            async with db.execute(
+                "SELECT job FROM jobs WHERE status = ? AND visible_at <= ? AND attempts >= ?",
+                (JobStatus.RUNNING.value, now, self.settings.max_attempts)
+            ) as cursor:
+                expired = [Job.model_validate_json(row[0]) for row in await cursor.fetchall()]
+            for job in expired:
+                job.status = JobStatus.FAILED
+                job.error = "Visibility timeout exceeded"
+                await self._save(db, job, drop_image=True)
+
+            async with db.execute(
+                """
+                SELECT job, image FROM jobs
+                WHERE status IN (?, ?) AND visible_at <= ? AND attempts < ?
+                ORDER BY created_at LIMIT 1
+                """,
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value, now, self.settings.max_attempts)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+
+            job = Job.model_validate_json(row[0])
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            await self._save(db, job, visible_at=now + self.settings.visibility_timeout)
+            return job, row[1]
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with self._lock:
+            db = await self._connection()
+            async with db.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)) as cursor:
+                row = await cursor.fetchone()
+        return Job.model_validate_json(row[0]) if row else None
+
+    async def complete(self, job: Job, result: DocumentResponse):
+        job.status = JobStatus.SUCCEEDED
+        job.result = result
+        job.error = None
+        async with self._lock:
+            await self._save(await self._connection(), job, drop_image=True)
+
+    async def fail(self, job: Job, error: str, retry: bool = True) -> Job:
+        job.error = error
+        async with self._lock:
+            db = await self._connection()
+            if retry and job.attempts < self.settings.max_attempts:
+                job.status = JobStatus.QUEUED
+                await self._save(db, job, visible_at=time.time() + self.retry_delay(job.attempts))
+            else:
+                job.status = JobStatus.FAILED
+                await self._save(db, job, drop_image=True)
+        return job
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+# Atomically pop the next job id and record its lease deadline
+_REDIS_LEASE_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if job_id then
+    redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+end
+return job_id
+"""
+
+# Move jobs whose lease or retry delay has passed back onto the queue
+_REDIS_REQUEUE_SCRIPT = """
+local job_ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, job_id in ipairs(job_ids) do
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('LPUSH', KEYS[2], job_id)
+end
+return #job_ids
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Job queue in Redis, for workers running on other hosts.
+
+    Visible jobs are ids in a list. Leased jobs and jobs waiting out a retry
+    delay live in sorted sets scored by the time they become visible again.
+    """
+
+    def __init__(self, settings: JobSettings):
+        super().__init__(settings)
+        from redis.asyncio import Redis
+        from app.tracing import instrument
+
+        instrument("redis")
+        self.client = Redis.from_url(settings.redis_url)
+        self.queue_key = f"{settings.redis_prefix}queue"
+        self.leases_key = f"{settings.redis_prefix}leases"
+        self.delayed_key = f"{settings.redis_prefix}delayed"
+        self._lease = self.client.register_script(_REDIS_LEASE_SCRIPT)
+        self._requeue = self.client.register_script(_REDIS_REQUEUE_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.settings.redis_prefix}job:{job_id}"
+
+    def _image_key(self, job_id: str) -> str:
+        return f"{self.settings.redis_prefix}image:{job_id}"
+
+    async def _save(self, job: Job):
+        job.updated_at = time.time()
+        await self.client.set(self._job_key(job.job_id), job.model_dump_json(), ex=self.settings.result_ttl)
+
+    async def enqueue(self, job: Job, image_bytes: Optional[bytes]):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._job_key(job.job_id), job.model_dump_json(), ex=self.settings.result_ttl)
+            if image_bytes is not None:
+                pipe.set(self._image_key(job.job_id), image_bytes, ex=self.settings.result_ttl)
+            pipe.lpush(self.queue_key, job.job_id)
+            await pipe.execute()
+
+    async def dequeue(self) -> Optional[tuple[Job, Optional[bytes]]]:
+        now = time.time()
+        await self._requeue(keys=[self.leases_key, self.queue_key], args=[now])
+        await self._requeue(keys=[self.delayed_key, self.queue_key], args=[now])
+        while True:
+            job_id = await self._lease(
+                keys=[self.queue_key, self.leases_key],
+                args=[now + self.settings.visibility_timeout]
+            )
+            if job_id is None:
+                return None
+            job = await self.get(job_id.decode())
+            if job is None or job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+                await self.client.zrem(self.leases_key, job_id)
+                continue
+            if job.attempts >= self.settings.max_attempts:
+                await self.client.zrem(self.leases_key, job_id)
+                await self.fail(job, "Visibility timeout exceeded", retry=False)
+                continue
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            await self._save(job)
+            return job, await self.client.get(self._image_key(job.job_id))
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        data = await self.client.get(self._job_key(job_id))
+        return Job.model_validate_json(data) if data else None
+
+    async def complete(self, job: Job, result: DocumentResponse):
+        job.status = JobStatus.SUCCEEDED
+        job.result = result
+        job.error = None
+        await self._save(job)
+        await self.client.zrem(self.leases_key, job.job_id)
+        await self.client.delete(self._image_key(job.job_id))
+
+    async def fail(self, job: Job, error: str, retry: bool = True) -> Job:
+        job.error = error
+        await self.client.zrem(self.leases_key, job.job_id)
+        if retry and job.attempts < self.settings.max_attempts:
+            job.status = JobStatus.QUEUED
+            await self._save(job)
+            await self.client.zadd(self.delayed_key, {job.job_id: time.time() + self.retry_delay(job.attempts)})
+        else:
+            job.status = JobStatus.FAILED
+            await self._save(job)
+            await self.client.delete(self._image_key(job.job_id))
+        return job
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        if JOB_SETTINGS.backend == JobQueueBackend.REDIS:
+            _job_queue = RedisJobQueue(JOB_SETTINGS)
+        else:
+            _job_queue = SQLiteJobQueue(JOB_SETTINGS)
+    return _job_queue
@@ -0,0 +1,119 @@
+"""
+Extraction worker for asynchronous jobs.
+
+Run one or more worker processes next to the API, scaled independently:
+
+    python -m app.job_worker --concurrency 8
+"""
+import time
+import asyncio
+import logging
+import argparse
+from typing import Optional
+import httpx
+from fastapi import HTTPException
+from app.config import JOB_SETTINGS, ARCHIVE_SETTINGS, ImagePreset, TracingLevel
+from app.archive_spool import archive_spool
+from app.job_queue import JobQueue, get_job_queue
+from app.schemas import Job, JobStatus
+from app.document import download_file, process_document
+from app.tracing import tracer
+from app.url_fetcher import check_url
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """Pulls jobs from the queue and runs them through the extraction pipeline."""
+
+    def __init__(self, queue: JobQueue, concurrency: int = JOB_SETTINGS.concurrency):
+        self.queue = queue
+        self.concurrency = concurrency
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        self._webhook_client = httpx.AsyncClient(timeout=JOB_SETTINGS.webhook_timeout)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+
+    async def wait(self):
+        await asyncio.gather(*self._tasks)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                leased = await self.queue.dequeue()
+            except Exception as e:
+                logger.exception("Failed to dequeue job: %s", e)
+                leased = None
+            if leased is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=JOB_SETTINGS.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job, image_bytes = leased
+            await self._process(job, image_bytes)
+
+    async def _process(self, job: Job, image_bytes: Optional[bytes]):
+        start_time = time.time()
+        with tracer.start_as_current_span("process_job", level=TracingLevel.MINIMAL) as span:
+            span.set_attribute("job.id", job.job_id)
+            span.set_attribute("job.attempt", job.attempts)
+            try:
+                if image_bytes is None:
+                    image_bytes = await download_file(job.file_url, span)
+                result = await process_document(
+                    image_bytes, job.provider, ImagePreset(job.preset), job.mobile, job.tenant, start_time, span
+                )
+            except Exception as e:
+                span.record_exception(e)
+                span.set_attribute("error", True)
+                # Client errors such as unsupported images will not succeed on a retry, rate limits will
+                retry = not (isinstance(e, HTTPException) and e.status_code < 500 and e.status_code != 429)
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                job = await self.queue.fail(job, str(error), retry=retry)
+            else:
+                await self.queue.complete(job, result)
+        if job.webhook_url and job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+            await self._notify(job)
+
+    async def _notify(self, job: Job):
+        try:
+            # Checked again, the host may resolve elsewhere than at submission
+            await check_url(job.webhook_url, JOB_SETTINGS.webhook_allow_private_networks)
+        except HTTPException as e:
+            logger.warning("Webhook for job %s refused: %s", job.job_id, e.detail)
+            return
+        try:
+            response = await self._webhook_client.post(job.webhook_url, content=job.model_dump_json(), headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning("Webhook for job %s failed: %s", job.job_id, e)
+
+
+async def main(concurrency: int):
+    if ARCHIVE_SETTINGS.spool_enabled:
+        archive_spool.start()
+    worker = JobWorker(get_job_queue(), concurrency)
+    worker.start()
+    try:
+        await worker.wait()
+    finally:
+        await worker.stop()
+        await worker.queue.close()
+        await archive_spool.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extraction job worker")
+    parser.add_argument("--concurrency", type=int, default=JOB_SETTINGS.concurrency)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().concurrency))
@@ -0,0 +1,67 @@
+import time
+import uuid
+from http import HTTPStatus
+from typing import Optional
+from fastapi import APIRouter, UploadFile, HTTPException, Form, Depends
+from app.schemas import AIProvider, Job, Trace
+from app.config import JOB_SETTINGS, PREPROCESSING_SETTINGS, ImagePreset, TracingLevel
+from app.auth import get_current_user
+from app.job_queue import get_job_queue
+from app.tracing import tracer
+from app.url_fetcher import check_url
+
+jobs_router = APIRouter()
+
+
+@jobs_router.post("", response_model=Job, status_code=HTTPStatus.ACCEPTED)
+async def submit_job(
+    file: Optional[UploadFile] = None,
+    file_url: Optional[str] = Form(None),
+    provider: AIProvider = Form(AIProvider.OPENAI),
+    preset: ImagePreset = Form(PREPROCESSING_SETTINGS.default_preset),
+    mobile: str = Form(None),
+    tenant: str = Form(None),
+    webhook_url: Optional[str] = Form(None),
+    trace: Trace = Depends(get_current_user)
+):
+    """
+    Queue a document for extraction and return its job id immediately.
+
+    Poll GET /documents/jobs/{job_id} for the result, or pass a webhook_url to
+    receive the finished job as a JSON POST.
+    """
+    with tracer.start_as_current_span("submit_job", level=TracingLevel.MINIMAL) as span:
+        image_bytes = None
+        if file:
+            image_bytes = await file.read()
+            if not image_bytes:
+                raise HTTPException(status_code=400, detail="Empty file content")
+        elif not file_url:
+            raise HTTPException(status_code=400, detail="No file or file URL provided")
+        if webhook_url:
+            # The worker POSTs the result there, so it gets the same checks as a fetched URL
+            await check_url(webhook_url, JOB_SETTINGS.webhook_allow_private_networks)
+
+        now = time.time()
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            provider=provider,
+            preset=preset.value,
+            file_url=None if file else file_url,
+            mobile=mobile,
+            tenant=tenant,
+            webhook_url=webhook_url,
+            created_at=now,
+            updated_at=now
+        )
+        span.set_attribute("job.id", job.job_id)
+        await get_job_queue().enqueue(job, image_bytes)
+        return job
+
+
+@jobs_router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str, trace: Trace = Depends(get_current_user)):
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
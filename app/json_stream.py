@@ -0,0 +1,59 @@
+import json
+from typing import Any, Iterator
+
+
+class IncrementalObjectParser:
+    """
+    Parse a JSON object arriving in text fragments and report each top-level
+    member as soon as its value is complete.
+
+    Text before the opening brace (for example a markdown code fence) is
+    ignored. Nested values are reported whole once they close.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = -1
+        self.done = False
+
+    def feed(self, text: str) -> Iterator[tuple[str, Any]]:
+        self.buffer += text
+        while self.position < len(self.buffer) and not self.done:
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                if self.depth == 1:
+                    self.member_start = self.position + 1
+            elif char in "}]" or (char == "," and self.depth == 1):
+                if self.depth == 1:
+                    member = self._parse_member(self.buffer[self.member_start:self.position])
+                    if member is not None:
+                        yield member
+                    self.member_start = self.position + 1
+                if char != ",":
+                    self.depth -= 1
+                    self.done = self.depth == 0
+            self.position += 1
+
+    @staticmethod
+    def _parse_member(text: str):
+        if not text.strip():
+            return None
+        try:
+            parsed = json.loads("{" + text + "}")
+        except json.JSONDecodeError:
+            return None
+        return next(iter(parsed.items()), None)
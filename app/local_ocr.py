@@ -0,0 +1,252 @@
+import re
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+from app.base_service import sniff_image_format
+from app.config import LOCAL_OCR_SETTINGS, LocalOcrSettings
+from app.document_validators import (
+    PAN_CARD, AADHAAR_CARD, is_valid_pan, is_valid_aadhaar, is_valid_name, parse_date, normalize_id
+)
+from app.metrics import LOCAL_OCR_ATTEMPTS, LOCAL_OCR_LATENCY
+from app.request_buffer import ImageInput, image_data
+from app.schemas import RoutingInfo
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+LOCAL_OCR_PROVIDER = "local_ocr"
+
+DATE_PATTERN = re.compile(r"(\d{2}[/.-]\d{2}[/.-]\d{4})")
+AADHAAR_NUMBER_PATTERN = re.compile(r"\b(\d{4})\s(\d{4})\s(\d{4})\b")
+PAN_HEADER_PATTERN = re.compile(r"INCOME\s*TAX|GOVT|GOVERNMENT", re.IGNORECASE)
+PAN_LABEL_PATTERN = re.compile(r"PERMANENT|ACCOUNT|NUMBER|SIGNATURE", re.IGNORECASE)
+NAME_LABEL_PATTERN = re.compile(r"^\W*name\b", re.IGNORECASE)
+FATHER_LABEL_PATTERN = re.compile(r"father", re.IGNORECASE)
+DOB_LABEL_PATTERN = re.compile(r"\bDOB\b|date\s*of\s*birth", re.IGNORECASE)
+# Lines on an Aadhaar front that are never the holder's name
+AADHAAR_BOILERPLATE_PATTERN = re.compile(r"government|india|aadhaar|unique|authority", re.IGNORECASE)
+
+REQUIRED_FIELDS = ("doc_id", "doc_type", "full_name", "dob")
+
+
+@dataclass
+class OcrWord:
+    text: str
+    confidence: float
+
+
+@dataclass
+class OcrLine:
+    words: list[OcrWord]
+
+    @property
+    def text(self) -> str:
+        return " ".join(word.text for word in self.words)
+
+    @property
+    def confidence(self) -> float:
+        return sum(word.confidence for word in self.words) / len(self.words)
+
+
+# A field value and the confidence of the words it was read from
+FieldReading = tuple[str, float]
+
+
+def parse_tsv(tsv: str) -> list[OcrLine]:
+    """Group the word rows of Tesseract's TSV output into lines, in reading order."""
+    lines: dict[tuple[str, str, str, str], list[OcrWord]] = {}
+    for row in tsv.splitlines()[1:]:
+        columns = row.split("\t")
+        if len(columns) < 12 or columns[0] != "5":
+            continue
+        text = columns[11].strip()
+        try:
+            confidence = float(columns[10])
+        except ValueError:
+            continue
+        if not text or confidence < 0:
+            continue
+        lines.setdefault(tuple(columns[1:5]), []).append(OcrWord(text=text, confidence=confidence))
+    return [OcrLine(words=words) for words in lines.values()]
+
+
+def _find_date(line: OcrLine) -> Optional[FieldReading]:
+    for word in line.words:
+        match = DATE_PATTERN.search(word.text)
+        if match:
+            parsed = parse_date(match.group(1).replace(".", "/").replace("-", "/"))
+            if parsed is not None:
+                return parsed.isoformat(), word.confidence
+    return None
+
+
+def _name_after(lines: list[OcrLine], index: int) -> Optional[FieldReading]:
+    if index + 1 < len(lines) and is_valid_name(lines[index + 1].text):
+        line = lines[index + 1]
+        return line.text, line.confidence
+    return None
+
+
+def parse_pan(lines: list[OcrLine]) -> Optional[dict[str, FieldReading]]:
+    """
+    Read a PAN card, both the labelled layout ("Name", "Father's Name",
+    "Date of Birth") and the older one with unlabelled lines under the header.
+    """
+    fields: dict[str, FieldReading] = {}
+    for line in lines:
+        for word in line.words:
+            token = normalize_id(re.sub(r"[^A-Za-z0-9]", "", word.text))
+            if is_valid_pan(token):
+                fields["doc_id"] = (token, word.confidence)
+    if "doc_id" not in fields:
+        return None
+    fields["doc_type"] = (PAN_CARD, fields["doc_id"][1])
+
+    for index, line in enumerate(lines):
+        if FATHER_LABEL_PATTERN.search(line.text):
+            reading = _name_after(lines, index)
+            if reading:
+                fields.setdefault("fathers_name", reading)
+        elif NAME_LABEL_PATTERN.search(line.text):
+            reading = _name_after(lines, index)
+            if reading:
+                fields.setdefault("full_name", reading)
+        if "dob" not in fields:
+            reading = _find_date(line)
+            if reading:
+                fields["dob"] = reading
+
+    if "full_name" not in fields:
+        header = max((i for i, line in enumerate(lines) if PAN_HEADER_PATTERN.search(line.text)), default=None)
+        if header is not None:
+            names = [
+                line for line in lines[header + 1:]
+                if is_valid_name(line.text) and not PAN_LABEL_PATTERN.search(line.text)
+            ]
+            if names:
+                fields["full_name"] = (names[0].text, names[0].confidence)
+            if len(names) > 1:
+                fields.setdefault("fathers_name", (names[1].text, names[1].confidence))
+    return fields
+
+
+def parse_aadhaar(lines: list[OcrLine]) -> Optional[dict[str, FieldReading]]:
+    """Read the front of an Aadhaar card: number, name above the DOB line, and DOB."""
+    fields: dict[str, FieldReading] = {}
+    for line in lines:
+        match = AADHAAR_NUMBER_PATTERN.search(line.text)
+        if match and is_valid_aadhaar("".join(match.groups())):
+            digit_words = [word for word in line.words if word.text in match.groups()]
+            confidence = min((word.confidence for word in digit_words), default=line.confidence)
+            fields["doc_id"] = ("".join(match.groups()), confidence)
+            break
+    if "doc_id" not in fields:
+        return None
+    fields["doc_type"] = (AADHAAR_CARD, fields["doc_id"][1])
+
+    for index, line in enumerate(lines):
+        if not DOB_LABEL_PATTERN.search(line.text):
+            continue
+        reading = _find_date(line)
+        if reading is None:
+            continue
+        fields["dob"] = reading
+        for previous in reversed(lines[:index]):
+            if is_valid_name(previous.text) and not AADHAAR_BOILERPLATE_PATTERN.search(previous.text):
+                fields["full_name"] = (previous.text, previous.confidence)
+                break
+        break
+    return fields
+
+
+class LocalOcr:
+    """
+    On-box Tesseract pass that answers clean PAN and Aadhaar cards without an LLM call.
+
+    Tesseract runs as a subprocess, a few at a time, so OCR never blocks the
+    event loop. A result is only returned when every required field was read
+    above ``min_confidence`` and passes validation (PAN pattern, Aadhaar
+    Verhoeff checksum, parseable DOB, plausible name); otherwise the caller
+    falls back to the AI provider.
+    """
+
+    def __init__(self, settings: LocalOcrSettings = LOCAL_OCR_SETTINGS):
+        self.settings = settings
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.settings.max_workers)
+        return self._semaphore
+
+    async def recognize(self, image_bytes: ImageInput) -> list[OcrLine]:
+        """
+        Raises:
+            RuntimeError: If tesseract is missing, fails or times out
+        """
+        async with self.semaphore:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.settings.tesseract_cmd, "stdin", "stdout", "-l", self.settings.languages, "tsv",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except FileNotFoundError:
+                raise RuntimeError(f"{self.settings.tesseract_cmd} not found")
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(image_data(image_bytes)), timeout=self.settings.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise RuntimeError("tesseract timed out")
+            except asyncio.CancelledError:
+                process.kill()
+                raise
+            if process.returncode != 0:
+                raise RuntimeError(f"tesseract exited with {process.returncode}: {stderr.decode(errors='replace').strip()}")
+        return parse_tsv(stdout.decode("utf-8", errors="replace"))
+
+    def accept(self, fields: Optional[dict[str, FieldReading]]) -> bool:
+        if not fields:
+            return False
+        return all(
+            field in fields and fields[field][1] >= self.settings.min_confidence
+            for field in REQUIRED_FIELDS
+        )
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> Optional[dict]:
+        """Returns an extraction result in the AI services' shape, or None to fall back."""
+        with tracer.start_as_current_span("local_ocr") as span:
+            started = time.monotonic()
+            try:
+                lines = await self.recognize(image_bytes)
+            except RuntimeError as e:
+                logger.warning("Local OCR failed: %s", e)
+                span.record_exception(e)
+                LOCAL_OCR_ATTEMPTS.labels(outcome="error").inc()
+                return None
+            finally:
+                LOCAL_OCR_LATENCY.observe(time.monotonic() - started)
+
+            fields = parse_pan(lines) or parse_aadhaar(lines)
+            accepted = self.accept(fields)
+            span.set_attribute("local_ocr.lines", len(lines))
+            span.set_attribute("local_ocr.doc_type", fields["doc_type"][0] if fields else "")
+            span.set_attribute("local_ocr.hit", accepted)
+            LOCAL_OCR_ATTEMPTS.labels(outcome="hit" if accepted else "miss").inc()
+            if not accepted:
+                return None
+
+            result = {field: value for field, (value, _) in fields.items()}
+            result.setdefault("fathers_name", "")
+            result["address"] = ""
+            result["file_type"] = sniff_image_format(image_data(image_bytes))
+            result["routing"] = RoutingInfo(provider=LOCAL_OCR_PROVIDER, attempts=[LOCAL_OCR_PROVIDER]).model_dump()
+            return result
+
+
+local_ocr = LocalOcr()
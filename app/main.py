@@ -1,12 +1,45 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.document import router
 from app.config import SETTINGS
 from app.auth_api import auth_router
+from app.openai_service import close_openai_client
+from app.grok_service import close_grok_client
+from app.image_preprocessing import shutdown_preprocessing_executor
+from app.jobs_api import jobs_router
+from app.job_queue import get_job_queue
+from app.job_worker import JobWorker
+from app.config import JOB_SETTINGS, ARCHIVE_SETTINGS
+from app.archive_spool import archive_spool
+from app.url_fetcher import url_fetcher
+from app.metrics import metrics_app, mark_worker_stopped
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ARCHIVE_SETTINGS.spool_enabled:
+        archive_spool.start()
+    worker = None
+    if JOB_SETTINGS.inprocess_workers:
+        worker = JobWorker(get_job_queue())
+        worker.start()
+    yield
+    if worker is not None:
+        await worker.stop()
+    await get_job_queue().close()
+    await archive_spool.stop()
+    await close_openai_client()
+    await close_grok_client()
+    await url_fetcher.close()
+    shutdown_preprocessing_executor()
+    mark_worker_stopped()
+
 
 app = FastAPI(
     title=SETTINGS.PROJECT_NAME,
-    openapi_url=f"{SETTINGS.API_V1_STR}/openapi.json"
+    openapi_url=f"{SETTINGS.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -20,5 +53,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(router, prefix=f"{SETTINGS.API_V1_STR}/documents", tags=["documents"])
+app.include_router(jobs_router, prefix=f"{SETTINGS.API_V1_STR}/documents/jobs", tags=["jobs"])
+
+app.include_router(auth_router, prefix=f"{SETTINGS.API_V1_STR}/auth", tags=["auth"])
 
-app.include_router(auth_router, prefix=f"{SETTINGS.API_V1_STR}/auth", tags=["auth"])
\ No newline at end of file
+app.mount("/metrics", metrics_app())
\ No newline at end of file
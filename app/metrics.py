@@ -0,0 +1,220 @@
+import os
+import time
+import httpx
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from fastapi import HTTPException
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app, multiprocess
+
+# Set for multi-worker deployments: every worker writes its samples to files in this
+# directory and /metrics aggregates them, whichever worker serves the scrape
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+ARCHIVE_SPOOL_DEPTH = Gauge(
+    "archive_spool_depth",
+    "Documents waiting in the archive spool",
+    multiprocess_mode="livemax"
+)
+ARCHIVE_UPLOAD_LAG = Histogram(
+    "archive_upload_lag_seconds",
+    "Time from spooling a document to its successful upload",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+)
+ARCHIVE_UPLOAD_FAILURES = Counter(
+    "archive_upload_failures_total",
+    "Failed archive upload attempts"
+)
+ARCHIVE_DEAD_LETTERS = Counter(
+    "archive_dead_letters_total",
+    "Spool entries given up on after ARCHIVE_MAX_ATTEMPTS failed uploads"
+)
+ARCHIVE_INDEX_LOOKUPS = Counter(
+    "archive_index_lookups_total",
+    "Archive index lookups by outcome; a hit skips the upload",
+    ["outcome"]
+)
+ARCHIVE_BYTES_SKIPPED = Counter(
+    "archive_bytes_skipped_total",
+    "Bytes of duplicate documents that were not uploaded again"
+)
+LOCAL_OCR_ATTEMPTS = Counter(
+    "local_ocr_attempts_total",
+    "Local OCR fast path attempts by outcome; hit rate is hit / all outcomes",
+    ["outcome"]
+)
+LOCAL_OCR_LATENCY = Histogram(
+    "local_ocr_duration_seconds",
+    "Time spent running Tesseract on a document",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+CASCADE_STAGE_OUTCOMES = Counter(
+    "cascade_stage_outcomes_total",
+    "Extraction cascade stage results: accepted, escalated to the next stage, or exhausted at the last",
+    ["stage", "outcome"]
+)
+CASCADE_STAGE_DURATION = Histogram(
+    "cascade_stage_duration_seconds",
+    "Latency of each extraction cascade stage",
+    ["stage"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+INFLIGHT_BYTES = Gauge(
+    "document_inflight_bytes",
+    "Memory reserved by documents being processed, as counted by the in-flight budget",
+    multiprocess_mode="livesum"
+)
+INFLIGHT_BUDGET_REJECTIONS = Counter(
+    "document_inflight_budget_rejections_total",
+    "Requests rejected by the in-flight memory budget",
+    ["reason"]
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Provider calls waiting for admission",
+    ["provider"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time provider calls waited for a concurrency slot and rate-limit budget",
+    ["provider"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Provider calls answered with 429: queue full, deadline passed, or rate limited upstream",
+    ["provider", "reason"]
+)
+REPLAY_LOOKUPS = Counter(
+    "replay_lookups_total",
+    "Replay provider lookups by outcome: hit, miss served from another entry, or miss rejected",
+    ["outcome"]
+)
+REPLAY_RECORDED = Counter(
+    "replay_recorded_total",
+    "Live provider calls appended to the replay corpus",
+    ["provider", "outcome"]
+)
+EXTRACTION_STAGE_DURATION = Histogram(
+    "extraction_stage_duration_seconds",
+    "Time spent in each stage of an extraction: upload_read, url_fetch, preprocess, base64_encode, s3_upload, validation",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+EXTRACT_REQUEST_DURATION = Histogram(
+    "extract_request_duration_seconds",
+    "End-to-end time of extraction requests, per batch item for batches",
+    ["endpoint", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+EXTRACT_REQUESTS_IN_FLIGHT = Gauge(
+    "extract_requests_in_flight",
+    "Extraction requests being processed, per batch item for batches",
+    ["endpoint"],
+    multiprocess_mode="livesum"
+)
+PROVIDER_CALL_DURATION = Histogram(
+    "provider_call_duration_seconds",
+    "Latency of AI provider calls, after admission",
+    ["provider", "model", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+PROVIDER_CALLS_IN_FLIGHT = Gauge(
+    "provider_calls_in_flight",
+    "AI provider calls waiting for a response",
+    ["provider"],
+    multiprocess_mode="livesum"
+)
+PROVIDER_ERRORS = Counter(
+    "provider_errors_total",
+    "Failed AI provider calls by error type, e.g. http_504 or APIConnectionError",
+    ["provider", "type"]
+)
+PROVIDER_TOKENS = Counter(
+    "provider_tokens_total",
+    "Tokens reported in provider usage by kind: prompt, cached_prompt or completion",
+    ["provider", "model", "kind"]
+)
+PACKED_CALL_IMAGES = Histogram(
+    "packed_call_images",
+    "Images sent in each packed provider request",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+PACKING_FALLBACKS = Counter(
+    "packing_fallbacks_total",
+    "Images of packed requests extracted again on their own: parse, unmapped or error",
+    ["reason"]
+)
+
+
+def error_type(error: BaseException) -> str:
+    if isinstance(error, HTTPException):
+        return f"http_{error.status_code}"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    return type(error).__name__
+
+
+@contextmanager
+def track_provider_call(provider: str, model: str) -> Iterator[None]:
+    """Count a provider call as in flight and record its latency and, if it fails, its error type."""
+    in_flight = PROVIDER_CALLS_IN_FLIGHT.labels(provider=provider)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception as e:
+        outcome = "error"
+        PROVIDER_ERRORS.labels(provider=provider, type=error_type(e)).inc()
+        raise
+    except BaseException:
+        # Cancelled, e.g. the losing side of a hedge
+        outcome = "cancelled"
+        raise
+    finally:
+        in_flight.dec()
+        PROVIDER_CALL_DURATION.labels(provider=provider, model=model, outcome=outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[None]:
+    """Count an extraction request as in flight and record its duration and outcome."""
+    in_flight = EXTRACT_REQUESTS_IN_FLIGHT.labels(endpoint=endpoint)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    except BaseException:
+        outcome = "cancelled"
+        raise
+    finally:
+        in_flight.dec()
+        EXTRACT_REQUEST_DURATION.labels(endpoint=endpoint, outcome=outcome).observe(time.perf_counter() - started)
+
+
+def record_token_usage(provider: str, model: str, usage: Optional[dict]):
+    """Add a TokenUsage dict to the token counters; prompt tokens include the cached ones."""
+    for kind in ("prompt", "cached_prompt", "completion"):
+        tokens = (usage or {}).get(f"{kind}_tokens") or 0
+        if tokens:
+            PROVIDER_TOKENS.labels(provider=provider, model=model, kind=kind).inc(tokens)
+
+
+def metrics_app():
+    """The /metrics ASGI app, aggregating every worker's samples in multiprocess mode."""
+    if not MULTIPROCESS_DIR:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+def mark_worker_stopped():
+    """Drop this worker's live gauges from the aggregate, called on shutdown."""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
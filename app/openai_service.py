@@ -1,119 +1,222 @@
 import json
-import base64
-from typing import Dict
-from openai import OpenAI
-from app.config import SETTINGS
+from typing import AsyncIterator, Dict, Optional
+import httpx
+from fastapi import HTTPException
+from openai import AsyncOpenAI, APITimeoutError, RateLimitError
+from app.admission import get_admission_controller
+from app.config import SETTINGS, ADMISSION_SETTINGS, TracingLevel
 from app.base_service import AIServiceBase
+from app.metrics import record_token_usage, track_provider_call
+from app.prompts import PACKED_PROMPT, Prompt, get_field_prompt
+from app.request_buffer import ImageInput, RequestBuffer, as_request_buffer
 from app.tracing import tracer
 
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Process-wide async client, so every request shares one connection pool."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=SETTINGS.OPENAI_KEY,
+            base_url=SETTINGS.OPENAI_BASE_URL,
+            timeout=SETTINGS.OPENAI_TIMEOUT,
+            max_retries=SETTINGS.OPENAI_MAX_RETRIES,
+            # httpx.AsyncClient is looked up now: once the tracing instrumentor has replaced the
+            # class, the SDK only accepts instances of the replacement (DefaultAsyncHttpxClient
+            # subclasses the original and is rejected)
+            http_client=httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=SETTINGS.OPENAI_MAX_CONCURRENCY,
+                    max_keepalive_connections=SETTINGS.OPENAI_MAX_CONCURRENCY
+                )
+            )
+        )
+    return _client
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
 class OpenAIService(AIServiceBase):
+    model = "gpt-4o-mini"
+
     def __init__(self):
-        self.client = OpenAI(api_key=SETTINGS.OPENAI_KEY)
-
-    async def extract_document_info(self, image_bytes: bytes) -> dict:
-        with tracer.start_as_current_span('extract_document_info_grok') as span:
-            json_template = {
-                "doc_id": "",
-                "doc_type": "",
-                "full_name": "",
-                "fathers_name": "",
-                "address": "",
-                "dob": ""
-            }
+        self.client = get_openai_client()
+        # Caps concurrency and follows OpenAI's rate limits for the whole process
+        self.admission = get_admission_controller("openai")
 
-            instruction = f"""
-            You are an expert at extracting information from documents. Carefully analyze the provided image and extract the following key details into JSON format.
-
-            Please return ONLY the completed JSON with these fields:
-            {json.dumps(json_template, indent=2)}
-
-            Extraction guidelines:
-
-            1. Document ID:
-            - Look for any unique identifier in the document
-            - This could be a number, alphanumeric code, or reference number
-
-            1. Document Type:
-                - Identify the type of document. This field should return either "PAN CARD" or "AADHAAR CARD".
-                - For a PAN CARD, look for keywords such as "Permanent Account Number" or a 10-character alphanumeric code.
-                - For an AADHAAR CARD, look for terms like "Aadhaar" or a 12-digit numeric sequence.
-                - If the document type cannot be clearly determined, leave this field as NA.
-            
-            2. Full Name:
-            - The person's complete name as mentioned in the document
-            - Usually appears after labels like "Name:", "Full Name:"
-            
-            3. Father's Name:
-            - Look for text labeled as "Father's Name:"
-            - May be preceded by "S/O" (Son Of) or "D/O" (Daughter Of)
-            
-            4. Address:
-            - Complete address as mentioned in the document
-            - May span multiple lines
-            
-            5. Date of Birth:
-            - Look for text labeled as "Date of Birth:" or "DOB:"
-            - Format should be YYYY-MM-DD
-            - Convert other date formats to this standard format
-
-            Important instructions:
-            - If any field cannot be clearly identified, leave it as an empty string
-            - Do not make assumptions about data you cannot clearly see
-            - Return ONLY the completed JSON without any explanations
-            - Do not include any additional text or formatting
-            - Ensure the response is valid JSON
-            """
-
-            image_format = self.detect_image_format(image_bytes)
-
-            # Convert image bytes to base64
-            mime_type = f'image/{image_format}'
-            b64_image = base64.b64encode(image_bytes).decode("utf-8")
+    def _build_messages(self, image_bytes: ImageInput, detail: str = "high", prompt: Optional[Prompt] = None) -> tuple[list[dict], str]:
+        instruction = (prompt or self.prompt).text
+        buffer = as_request_buffer(image_bytes)
 
+        image_format = self.detect_image_format(buffer)
 
-            # Create the API request
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
+        # The data URL is encoded once per buffer and reused by retries, hedges and cascade stages
+        mime_type = f'image/{image_format}'
+
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": instruction},
                     {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": instruction},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{b64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
+                        "type": "image_url",
+                        "image_url": {
+                            "url": buffer.data_url(mime_type),
+                            "detail": detail
+                        }
                     }
-                ],
-                max_tokens=1000
-            )
-            
+                ]
+            }
+        ]
+        return messages, image_format
+
+    async def extract_document_info(
+        self,
+        image_bytes: ImageInput,
+        model: Optional[str] = None,
+        detail: str = "high",
+        max_tokens: int = 1000,
+        fields: Optional[tuple[str, ...]] = None
+    ) -> dict:
+        """
+        The keyword arguments let the extraction cascade run cheaper or stronger
+        passes, and ask for only ``fields`` instead of the whole document.
+        """
+        with tracer.start_as_current_span('extract_document_info_openai', level=TracingLevel.MINIMAL) as span:
+            prompt = get_field_prompt(fields) if fields else self.prompt
+            model = model or self.model
+            messages, image_format = self._build_messages(image_bytes, detail, prompt)
+            span.set_attribute("openai.model", model)
+            span.set_attribute("openai.detail", detail)
+
+            # Create the API request
+            async with self.admission.admit(ADMISSION_SETTINGS.estimated_prompt_tokens + max_tokens) as admission:
+                with track_provider_call("openai", model):
+                    try:
+                        raw_response = await self.client.chat.completions.with_raw_response.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            timeout=SETTINGS.OPENAI_TIMEOUT
+                        )
+                    except APITimeoutError as e:
+                        span.record_exception(e)
+                        raise HTTPException(status_code=504, detail="OpenAI extraction timed out")
+                    except RateLimitError as e:
+                        span.record_exception(e)
+                        raise admission.throttled(e.response.headers)
+                    response = raw_response.parse()
+                admission.update(raw_response.headers, response.usage.total_tokens if response.usage else None)
+
             # Extract the response content
             content = response.choices[0].message.content.strip()
-            
-            # Try to find JSON in the response
-            try:
-                # First try direct JSON parsing
-                extracted_data = json.loads(content)
-            except json.JSONDecodeError:
-                # If direct parsing fails, try to find JSON-like structure
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_str = content[start_idx:end_idx]
-                    extracted_data = json.loads(json_str)
-                else:
-                    # If no JSON structure found, return empty template
-                    extracted_data = json_template
-            
-            # Validate the extracted data has all required fields
-            for key in json_template.keys():
-                if key not in extracted_data:
-                    extracted_data[key] = ""
-            
+            extracted_data = self.parse_extraction(content, prompt)
             extracted_data['file_type'] = image_format
-            return extracted_data
\ No newline at end of file
+            extracted_data['usage'] = self.token_usage(response.usage.model_dump() if response.usage else None)
+            span.set_attribute("usage.prompt_tokens", extracted_data['usage']['prompt_tokens'])
+            span.set_attribute("usage.cached_prompt_tokens", extracted_data['usage']['cached_prompt_tokens'])
+            span.set_attribute("usage.completion_tokens", extracted_data['usage']['completion_tokens'])
+            record_token_usage("openai", model, extracted_data['usage'])
+            return extracted_data
+
+    def _build_packed_messages(self, images: list[RequestBuffer], detail: str) -> tuple[list[dict], list[str]]:
+        # The instructions come first and never change, so the prompt prefix stays cacheable
+        content: list[dict] = [{"type": "text", "text": PACKED_PROMPT.text}]
+        image_formats = []
+        for number, image in enumerate(images, start=1):
+            image_format = self.detect_image_format(image)
+            image_formats.append(image_format)
+            content.append({"type": "text", "text": f"Image {number}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": image.data_url(f'image/{image_format}'), "detail": detail}
+            })
+        content.append({"type": "text", "text": f"Return an array of {len(images)} objects."})
+        return [{"role": "user", "content": content}], image_formats
+
+    async def extract_documents_packed(
+        self,
+        images: list[ImageInput],
+        model: Optional[str] = None,
+        detail: str = "high",
+        max_tokens: int = 1000
+    ) -> list[Optional[dict]]:
+        """
+        Extract several documents in one request, ``max_tokens`` per image.
+
+        Returns:
+            list: The result of each image in order, None for images the
+                response could not be mapped back to. The usage of the request
+                is shared between the results.
+        """
+        with tracer.start_as_current_span('extract_documents_packed_openai', level=TracingLevel.MINIMAL) as span:
+            model = model or self.model
+            buffers = [as_request_buffer(image) for image in images]
+            messages, image_formats = self._build_packed_messages(buffers, detail)
+            span.set_attribute("openai.model", model)
+            span.set_attribute("openai.detail", detail)
+            span.set_attribute("packing.images", len(buffers))
+
+            estimated_tokens = (ADMISSION_SETTINGS.estimated_prompt_tokens + max_tokens) * len(buffers)
+            async with self.admission.admit(estimated_tokens) as admission:
+                with track_provider_call("openai", model):
+                    try:
+                        raw_response = await self.client.chat.completions.with_raw_response.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens * len(buffers),
+                            timeout=SETTINGS.OPENAI_TIMEOUT
+                        )
+                    except APITimeoutError as e:
+                        span.record_exception(e)
+                        raise HTTPException(status_code=504, detail="OpenAI extraction timed out")
+                    except RateLimitError as e:
+                        span.record_exception(e)
+                        raise admission.throttled(e.response.headers)
+                    response = raw_response.parse()
+                admission.update(raw_response.headers, response.usage.total_tokens if response.usage else None)
+
+            usage = self.token_usage(response.usage.model_dump() if response.usage else None)
+            span.set_attribute("usage.prompt_tokens", usage['prompt_tokens'])
+            span.set_attribute("usage.cached_prompt_tokens", usage['cached_prompt_tokens'])
+            span.set_attribute("usage.completion_tokens", usage['completion_tokens'])
+            record_token_usage("openai", model, usage)
+
+            results = self.parse_packed_extraction(response.choices[0].message.content.strip(), len(buffers), PACKED_PROMPT)
+            span.set_attribute("packing.mapped", sum(result is not None for result in results))
+            for result, image_format, share in zip(results, image_formats, self.split_usage(usage, len(buffers))):
+                if result is not None:
+                    result['file_type'] = image_format
+                    result['usage'] = share
+            return results
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        messages, _ = self._build_messages(image_bytes)
+        async with self.admission.admit(ADMISSION_SETTINGS.estimated_prompt_tokens + 1000) as admission:
+            try:
+                raw_response = await self.client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=1000,
+                    timeout=SETTINGS.OPENAI_TIMEOUT,
+                    stream=True
+                )
+            except RateLimitError as e:
+                raise admission.throttled(e.response.headers)
+            admission.update(raw_response.headers)
+            stream = raw_response.parse()
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Also runs when the consumer is cancelled, so the upstream request is aborted
+                await stream.close()
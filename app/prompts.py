@@ -0,0 +1,149 @@
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from app.schemas import DocumentInfo
+
+# Filled in by the service from the image itself, never asked of the model
+SERVICE_FIELDS = {"file_type"}
+
+FIELD_GUIDELINES = {
+    "doc_id": [
+        "Look for any unique identifier in the document",
+        "This could be a number, alphanumeric code, or reference number",
+    ],
+    "doc_type": [
+        'Identify the type of document. This field should return either "PAN CARD" or "AADHAAR CARD".',
+        'For a PAN CARD, look for keywords such as "Permanent Account Number" or a 10-character alphanumeric code.',
+        'For an AADHAAR CARD, look for terms like "Aadhaar" or a 12-digit numeric sequence.',
+        "If the document type cannot be clearly determined, leave this field as NA.",
+    ],
+    "full_name": [
+        "The person's complete name as mentioned in the document",
+        'Usually appears after labels like "Name:", "Full Name:"',
+    ],
+    "fathers_name": [
+        "Look for text labeled as \"Father's Name:\"",
+        'May be preceded by "S/O" (Son Of) or "D/O" (Daughter Of)',
+    ],
+    "address": [
+        "Complete address as mentioned in the document",
+        "May span multiple lines",
+    ],
+    "dob": [
+        'Look for text labeled as "Date of Birth:" or "DOB:"',
+        "Format should be YYYY-MM-DD",
+        "Convert other date formats to this standard format",
+    ],
+}
+
+FIELD_TITLES = {
+    "doc_id": "Document ID",
+    "doc_type": "Document Type",
+    "full_name": "Full Name",
+    "fathers_name": "Father's Name",
+    "address": "Address",
+    "dob": "Date of Birth",
+}
+
+IMPORTANT_INSTRUCTIONS = [
+    "If any field cannot be clearly identified, leave it as an empty string",
+    "Do not make assumptions about data you cannot clearly see",
+    "Return ONLY the completed JSON without any explanations",
+    "Do not include any additional text or formatting",
+    "Ensure the response is valid JSON",
+]
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """
+    A rendered extraction prompt.
+
+    ``text`` is built once and sent unchanged as the first part of every
+    request, so providers that cache prompt prefixes can reuse it.
+    """
+    name: str
+    version: str
+    text: str
+    fields: tuple[str, ...]
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}-{self.version}"
+
+    @property
+    def template(self) -> dict:
+        return {field: "" for field in self.fields}
+
+
+def extraction_fields() -> tuple[str, ...]:
+    return tuple(name for name in DocumentInfo.model_fields if name not in SERVICE_FIELDS)
+
+
+def build_full_prompt(fields: tuple[str, ...]) -> str:
+    template = {field: "" for field in fields}
+    lines = [
+        "You are an expert at extracting information from documents. Carefully analyze the provided image "
+        "and extract the following key details into JSON format.",
+        "",
+        "Please return ONLY the completed JSON with these fields:",
+        json.dumps(template, indent=2),
+        "",
+        "Extraction guidelines:",
+    ]
+    for number, field in enumerate(fields, start=1):
+        lines.append("")
+        lines.append(f"{number}. {FIELD_TITLES.get(field, field)}:")
+        lines.extend(f"- {guideline}" for guideline in FIELD_GUIDELINES.get(field, []))
+    lines.append("")
+    lines.append("Important instructions:")
+    lines.extend(f"- {instruction}" for instruction in IMPORTANT_INSTRUCTIONS)
+    return "\n".join(lines)
+
+
+def build_compact_prompt(fields: tuple[str, ...]) -> str:
+    descriptions = {field: DocumentInfo.model_fields[field].description or "" for field in fields}
+    return (
+        "Extract these fields from the document image. Reply with one JSON object only, "
+        "no prose or code fences. Use \"\" for anything not clearly visible.\n"
+        + json.dumps(descriptions, separators=(",", ":"))
+    )
+
+
+def build_packed_prompt(fields: tuple[str, ...]) -> str:
+    descriptions = {field: DocumentInfo.model_fields[field].description or "" for field in fields}
+    return (
+        "Each numbered image below is a separate document. Extract these fields from every image. "
+        "Reply with one JSON array only, no prose or code fences, holding one object per image in order, "
+        "each with \"image\" set to the image number. Use \"\" for anything not clearly visible.\n"
+        + json.dumps(descriptions, separators=(",", ":"))
+    )
+
+
+def _build_registry() -> dict[str, Prompt]:
+    fields = extraction_fields()
+    return {
+        "full": Prompt(name="full", version="2", text=build_full_prompt(fields), fields=fields),
+        "compact": Prompt(name="compact", version="1", text=build_compact_prompt(fields), fields=fields),
+    }
+
+
+# Rendered once at import, every request reuses the same strings
+PROMPT_REGISTRY = _build_registry()
+
+
+def get_prompt(name: str) -> Prompt:
+    try:
+        return PROMPT_REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown prompt variant: {name}")
+
+
+# Several documents per request, the instructions are the same whatever the number of images
+PACKED_PROMPT = Prompt(name="packed", version="1", text=build_packed_prompt(extraction_fields()), fields=extraction_fields())
+
+
+@lru_cache()
+def get_field_prompt(fields: tuple[str, ...]) -> Prompt:
+    """Compact prompt asking for a subset of the fields, used to re-extract only what failed validation."""
+    return Prompt(name="fields", version="1", text=build_compact_prompt(fields), fields=fields)
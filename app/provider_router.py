@@ -0,0 +1,218 @@
+import time
+import asyncio
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from app.base_service import AIServiceBase
+from app.request_buffer import ImageInput
+from app.config import ROUTER_SETTINGS, RouterSettings
+from app.schemas import AIProvider, RoutingInfo
+from app.tracing import tracer
+
+
+class ProviderUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a provider after repeated failures.
+
+    The breaker opens after ``failure_threshold`` consecutive failures, or when
+    the provider's error rate goes above ``error_rate``. Once ``open_seconds``
+    have passed a single probe call is let through: success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, error_rate: float, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+
+    def is_available(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.open_seconds
+        return False
+
+    def try_acquire(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self, error_rate: float):
+        self.consecutive_failures += 1
+        if (
+            self.state == self.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+            or error_rate > self.error_rate
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """Exponentially weighted moving averages of a provider's latency and error rate."""
+
+    def __init__(self, alpha: float, default_latency: float):
+        self.alpha = alpha
+        self.latency = default_latency
+        self.error_rate = 0.0
+        self.samples = 0
+
+    def record(self, latency: Optional[float], failed: bool):
+        self.samples += 1
+        # Seed with the first observation instead of the default guess
+        alpha = 1.0 if self.samples == 1 else self.alpha
+        if latency is not None:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+        self.error_rate = self.alpha * float(failed) + (1 - self.alpha) * self.error_rate
+
+
+class ProviderRouter(AIServiceBase):
+    """
+    The ``auto`` provider: routes each extraction to the fastest healthy backend.
+
+    Providers are ranked by EWMA latency, skipping those whose circuit breaker
+    is open. If the chosen provider has not answered after ``hedge_after``
+    seconds a duplicate request goes to the next one and whichever finishes
+    first wins; the other is cancelled. A failing provider fails over to the
+    next one straight away.
+    """
+
+    model = "auto"
+
+    def __init__(self, settings: RouterSettings = ROUTER_SETTINGS):
+        self.settings = settings
+        self.providers = [AIProvider(provider) for provider in settings.providers]
+        self.stats = {provider: ProviderStats(settings.ewma_alpha, settings.default_latency) for provider in self.providers}
+        self.breakers = {
+            provider: CircuitBreaker(settings.breaker_failure_threshold, settings.breaker_error_rate, settings.breaker_open_seconds)
+            for provider in self.providers
+        }
+
+    def rank(self) -> list[AIProvider]:
+        available = [provider for provider in self.providers if self.breakers[provider].is_available()]
+        # sorted() is stable, so configuration order breaks ties
+        return sorted(available, key=lambda provider: self.stats[provider].latency)
+
+    async def _call(self, provider: AIProvider, image_bytes: ImageInput) -> dict:
+        from app.service_factory import ServiceFactory
+
+        breaker = self.breakers[provider]
+        if not breaker.try_acquire():
+            raise ProviderUnavailable(f"Circuit open for {provider.value}")
+        started = time.monotonic()
+        try:
+            result = await ServiceFactory.get_service(provider).extract_document_info(image_bytes)
+        except asyncio.CancelledError:
+            # Losing a hedge race says nothing about the provider's health
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                breaker.state = CircuitBreaker.OPEN
+            raise
+        except Exception as e:
+            if isinstance(e, HTTPException) and e.status_code == 429:
+                # Rate limited or queue full: busy rather than broken, fail over without tripping the breaker
+                if breaker.state == CircuitBreaker.HALF_OPEN:
+                    breaker.state = CircuitBreaker.OPEN
+                raise
+            if self._is_client_error(e):
+                breaker.record_success()
+                raise
+            stats = self.stats[provider]
+            stats.record(None, failed=True)
+            breaker.record_failure(stats.error_rate)
+            raise
+        self.stats[provider].record(time.monotonic() - started, failed=False)
+        breaker.record_success()
+        return result
+
+    @staticmethod
+    def _is_client_error(e: Exception) -> bool:
+        """Errors caused by the document itself, another provider would fail the same way."""
+        return isinstance(e, ValueError) or (isinstance(e, HTTPException) and e.status_code < 500 and e.status_code != 429)
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
+        with tracer.start_as_current_span("provider_router") as span:
+            remaining = self.rank()
+            span.set_attribute("routing.order", [provider.value for provider in remaining])
+            if not remaining:
+                raise HTTPException(status_code=503, detail="No AI provider available")
+
+            pending: dict[asyncio.Task, AIProvider] = {}
+            attempts: list[str] = []
+            hedged = False
+            failover = False
+            last_error: Optional[Exception] = None
+
+            def launch():
+                provider = remaining.pop(0)
+                attempts.append(provider.value)
+                pending[asyncio.create_task(self._call(provider, image_bytes))] = provider
+
+            launch()
+            try:
+                while pending:
+                    can_hedge = self.settings.hedge_enabled and remaining and not hedged
+                    done, _ = await asyncio.wait(
+                        pending,
+                        timeout=self.settings.hedge_after if can_hedge else None,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        hedged = True
+                        span.add_event("Hedging request", {"provider": remaining[0].value})
+                        launch()
+                        continue
+
+                    for task in done:
+                        provider = pending.pop(task)
+                        error = task.exception()
+                        if error is None:
+                            routing = RoutingInfo(provider=provider.value, attempts=attempts, hedged=hedged, failover=failover)
+                            span.set_attribute("routing.provider", provider.value)
+                            span.set_attribute("routing.hedged", hedged)
+                            span.set_attribute("routing.failover", failover)
+                            result = task.result()
+                            result["routing"] = routing.model_dump()
+                            return result
+                        if self._is_client_error(error):
+                            raise error
+                        last_error = error
+                        span.add_event("Provider failed", {"provider": provider.value, "error": str(error)})
+
+                    if not pending and remaining:
+                        failover = True
+                        launch()
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            span.set_attribute("error", True)
+            if isinstance(last_error, HTTPException):
+                raise last_error
+            raise HTTPException(status_code=502, detail=f"All AI providers failed: {last_error}")
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        """A stream cannot be hedged or failed over half-way, it goes to the best-ranked provider."""
+        from app.service_factory import ServiceFactory
+
+        ranked = self.rank()
+        if not ranked:
+            raise HTTPException(status_code=503, detail="No AI provider available")
+        async for delta in ServiceFactory.get_service(ranked[0]).stream_document_info(image_bytes):
+            yield delta
@@ -0,0 +1,193 @@
+import asyncio
+import copy
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from app.base_service import AIServiceBase
+from app.config import REPLAY_SETTINGS, ReplayLatency, ReplayMiss, ReplaySettings, TracingLevel
+from app.metrics import REPLAY_LOOKUPS, REPLAY_RECORDED, track_provider_call
+from app.request_buffer import ImageInput, as_request_buffer
+from app.schemas import AIProvider
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayCorpus:
+    """
+    Recorded provider calls, one JSON object per line.
+
+    Every entry has ``digest`` (SHA-256 of the image sent to the provider),
+    ``provider``, ``model``, ``size``, ``latency`` in seconds and
+    ``recorded_at``, plus either ``result`` (the extraction with its usage) or
+    ``error``, ``error_type`` and ``status`` for calls that failed. The corpus
+    holds extracted personal data and should be kept like the archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    def load(self, source_provider: str = "") -> tuple[dict[str, list[dict]], list[float]]:
+        """Returns the entries by image digest and every recorded latency."""
+        index: dict[str, list[dict]] = defaultdict(list)
+        latencies: list[float] = []
+        try:
+            corpus = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return {}, []
+        with corpus:
+            for line in corpus:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line of a recorder that was killed mid-write
+                    continue
+                if source_provider and entry.get("provider") != source_provider:
+                    continue
+                index[entry["digest"]].append(entry)
+                latencies.append(entry["latency"])
+        return dict(index), latencies
+
+    def _write(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as corpus:
+            corpus.write(line)
+
+    async def append(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._write, line)
+
+
+replay_corpus = ReplayCorpus(REPLAY_SETTINGS.corpus_path)
+
+
+class ReplayService(AIServiceBase):
+    """
+    The ``replay`` provider: serves extractions recorded from live providers.
+
+    Entries are looked up by the hash of the image the provider would be
+    sent. Before answering, each call sleeps for a latency drawn from the
+    recorded calls (or the entry's own), so a deployment can be load-tested
+    with production-shaped latencies, errors included, without tokens or
+    network access. Random choices are seeded from the image hash and
+    ``seed``, so the same images replay the same way on every run.
+    """
+
+    model = "replay"
+
+    def __init__(self, corpus: ReplayCorpus = replay_corpus, settings: ReplaySettings = REPLAY_SETTINGS):
+        self.corpus = corpus
+        self.settings = settings
+        self._index: Optional[dict[str, list[dict]]] = None
+        self._digests: list[str] = []
+        self._latencies: list[float] = []
+        self._load_lock = asyncio.Lock()
+
+    async def _load(self):
+        if self._index is not None:
+            return
+        async with self._load_lock:
+            if self._index is None:
+                index, self._latencies = await asyncio.to_thread(self.corpus.load, self.settings.source_provider)
+                self._digests = sorted(index)
+                self._index = index
+
+    def _latency(self, entry: dict, rng: random.Random) -> float:
+        if self.settings.latency == ReplayLatency.NONE:
+            return 0.0
+        latency = entry["latency"]
+        if self.settings.latency == ReplayLatency.SAMPLED and self._latencies:
+            latency = rng.choice(self._latencies)
+        return latency * self.settings.latency_scale
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
+        """
+        Raises:
+            HTTPException: 404 when no entry can be served for the image, or
+                the recorded status of a replayed provider error
+        """
+        with tracer.start_as_current_span("extract_document_info_replay", level=TracingLevel.MINIMAL) as span:
+            await self._load()
+            digest = as_request_buffer(image_bytes).digest
+            rng = random.Random(f"{self.settings.seed}:{digest}")
+            entries = self._index.get(digest)
+            if entries:
+                outcome = "hit"
+            elif self.settings.miss == ReplayMiss.ANY and self._digests:
+                outcome = "miss"
+                entries = self._index[rng.choice(self._digests)]
+            else:
+                REPLAY_LOOKUPS.labels(outcome="rejected").inc()
+                raise HTTPException(status_code=404, detail="No recorded extraction for this document")
+            REPLAY_LOOKUPS.labels(outcome=outcome).inc()
+
+            entry = rng.choice(entries)
+            span.set_attribute("replay.outcome", outcome)
+            span.set_attribute("replay.provider", entry.get("provider", ""))
+            with track_provider_call("replay", entry.get("model", self.model)):
+                await asyncio.sleep(self._latency(entry, rng))
+                if "error" in entry:
+                    if entry.get("status"):
+                        raise HTTPException(status_code=entry["status"], detail=entry["error"])
+                    if entry.get("error_type") == "ValueError":
+                        raise ValueError(entry["error"])
+                    raise Exception(f"Replayed {entry.get('provider')} error: {entry['error']}")
+            return copy.deepcopy(entry["result"])
+
+
+class RecordingService(AIServiceBase):
+    """
+    Passes calls through to a live provider and appends each one, with its
+    result, usage and latency, to the replay corpus.
+    """
+
+    def __init__(self, service: AIServiceBase, provider: AIProvider, corpus: ReplayCorpus = replay_corpus):
+        self.service = service
+        self.provider = provider
+        self.corpus = corpus
+        self.model = service.model
+        self.prompt = service.prompt
+
+    async def _record(self, entry: dict, started: float, outcome: str):
+        entry["latency"] = round(time.monotonic() - started, 4)
+        entry["recorded_at"] = datetime.now(timezone.utc).isoformat()
+        try:
+            await self.corpus.append(entry)
+        except OSError as e:
+            # Recording is best effort, the caller still gets its result
+            logger.warning("Replay corpus write failed: %s", e)
+            return
+        REPLAY_RECORDED.labels(provider=self.provider.value, outcome=outcome).inc()
+
+    async def extract_document_info(self, image_bytes: ImageInput) -> dict:
+        buffer = as_request_buffer(image_bytes)
+        entry = {"digest": buffer.digest, "provider": self.provider.value, "model": self.model, "size": len(buffer)}
+        started = time.monotonic()
+        try:
+            result = await self.service.extract_document_info(buffer)
+        except HTTPException as e:
+            # Rate limits depend on the deployment's load, replaying them would skew the run
+            if e.status_code != 429:
+                entry.update(error=str(e.detail), error_type=type(e).__name__, status=e.status_code)
+                await self._record(entry, started, "error")
+            raise
+        except Exception as e:
+            entry.update(error=str(e), error_type=type(e).__name__, status=None)
+            await self._record(entry, started, "error")
+            raise
+        entry["result"] = result
+        await self._record(entry, started, "ok")
+        return result
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        # Streams are not recorded, only complete extractions are
+        async for delta in self.service.stream_document_info(image_bytes):
+            yield delta
@@ -0,0 +1,197 @@
+import io
+import base64
+import hashlib
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Union
+from fastapi import HTTPException, UploadFile
+from app.config import BUFFER_SETTINGS, BufferSettings
+from app.metrics import EXTRACTION_STAGE_DURATION, INFLIGHT_BYTES, INFLIGHT_BUDGET_REJECTIONS
+
+
+class RequestBuffer:
+    """
+    The bytes of one document, read once and shared by every consumer.
+
+    Hashing and file writes take ``view`` (a memoryview, no copy). The base64
+    form and the data URL are built on first use and cached, so archival,
+    hedged requests and cascade stages all reuse the same encoding instead of
+    each making their own.
+    """
+
+    __slots__ = ("data", "_digest", "_b64", "_data_url")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._digest: Optional[str] = None
+        self._b64: Optional[str] = None
+        self._data_url: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.data)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.view).hexdigest()
+        return self._digest
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            with EXTRACTION_STAGE_DURATION.labels(stage="base64_encode").time():
+                self._b64 = base64.b64encode(self.view).decode("ascii")
+        return self._b64
+
+    def data_url(self, mime_type: str) -> str:
+        if self._data_url is None or not self._data_url.startswith(f"data:{mime_type};"):
+            # Encode without caching the standalone base64 too, the URL already holds it
+            with EXTRACTION_STAGE_DURATION.labels(stage="base64_encode").time():
+                b64 = self._b64 or base64.b64encode(self.view).decode("ascii")
+                self._data_url = f"data:{mime_type};base64,{b64}"
+        return self._data_url
+
+
+ImageInput = Union[bytes, RequestBuffer]
+
+
+def as_request_buffer(image: ImageInput) -> RequestBuffer:
+    """Wrap plain bytes without copying them; buffers are returned as they are."""
+    return image if isinstance(image, RequestBuffer) else RequestBuffer(image)
+
+
+def image_data(image: ImageInput) -> bytes:
+    return image.data if isinstance(image, RequestBuffer) else image
+
+
+async def read_upload(upload: UploadFile) -> RequestBuffer:
+    with EXTRACTION_STAGE_DURATION.labels(stage="upload_read").time():
+        return RequestBuffer(await upload.read())
+
+
+class DeferredUpload:
+    """
+    An uploaded file taken over from its request, to be read after the handler returned.
+
+    The server spools uploads to disk past a small size and closes them with
+    the request form once the handler returns; a streaming response that only
+    loads each document when it gets to it keeps the file open here instead.
+    """
+
+    def __init__(self, upload: UploadFile):
+        self.filename = upload.filename or ""
+        self.size = upload.size
+        self.file = upload.file
+        # Closing the form now closes this stand-in, not the spooled file
+        upload.file = io.BytesIO()
+
+    async def read(self) -> RequestBuffer:
+        with EXTRACTION_STAGE_DURATION.labels(stage="upload_read").time():
+            data = await asyncio.to_thread(self._read)
+        return RequestBuffer(data)
+
+    def _read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+class Reservation:
+    """Bytes one request holds in an :class:`InFlightBudget`."""
+
+    def __init__(self, budget: "InFlightBudget", cost: int = 0):
+        self.budget = budget
+        self.cost = cost
+
+    async def shrink(self, size: int):
+        """Give back what a document turned out not to need, once its real size is known."""
+        cost = self.budget.cost(size)
+        if cost >= self.cost:
+            return
+        async with self.budget.condition:
+            self.budget.in_flight -= self.cost - cost
+            self.cost = cost
+            INFLIGHT_BYTES.set(self.budget.in_flight)
+            self.budget.condition.notify_all()
+
+
+class InFlightBudget:
+    """
+    Process-wide cap on the memory held by documents being processed.
+
+    Each request reserves its size times ``amplification`` (decoded image,
+    encodings, provider request body) before its bytes are loaded. Requests
+    that do not fit wait up to ``wait_timeout`` for others to finish and are
+    then rejected with 503; a single document larger than the whole budget
+    is rejected with 413 straight away.
+    """
+
+    def __init__(self, settings: BufferSettings = BUFFER_SETTINGS):
+        self.settings = settings
+        self.in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def cost(self, size: int) -> int:
+        return int(size * self.settings.amplification)
+
+    @asynccontextmanager
+    async def reserve(self, size: Optional[int]) -> AsyncIterator[Reservation]:
+        """
+        Reserve room for a document of ``size`` bytes, or for the most it may
+        hold when the size is not known yet; shrink the reservation once it is.
+        None stands for an upload of unknown size and reserves ``max_upload_bytes``.
+
+        Raises:
+            HTTPException: 413 when the document can never fit, 503 when the
+                budget stayed exhausted for ``wait_timeout`` seconds
+        """
+        reservation = Reservation(self)
+        if not self.settings.max_inflight_bytes:
+            yield reservation
+            return
+        cost = self.cost(self.settings.max_upload_bytes if size is None else size)
+        if cost > self.settings.max_inflight_bytes:
+            INFLIGHT_BUDGET_REJECTIONS.labels(reason="too_large").inc()
+            raise HTTPException(status_code=413, detail="Document is too large to process")
+
+        deadline = time.monotonic() + self.settings.wait_timeout
+        async with self.condition:
+            while self.in_flight + cost > self.settings.max_inflight_bytes:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise TimeoutError
+                    await asyncio.wait_for(self.condition.wait(), timeout=remaining)
+                except TimeoutError:
+                    INFLIGHT_BUDGET_REJECTIONS.labels(reason="exhausted").inc()
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Server is busy processing other documents",
+                        headers={"Retry-After": str(max(1, round(self.settings.wait_timeout)))}
+                    )
+            self.in_flight += cost
+            reservation.cost = cost
+            INFLIGHT_BYTES.set(self.in_flight)
+        try:
+            yield reservation
+        finally:
+            async with self.condition:
+                self.in_flight -= reservation.cost
+                INFLIGHT_BYTES.set(self.in_flight)
+                self.condition.notify_all()
+
+
+inflight_budget = InFlightBudget()
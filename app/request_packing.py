@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from app.base_service import AIServiceBase
+from app.config import PACKING_SETTINGS, PackingSettings
+from app.metrics import PACKED_CALL_IMAGES, PACKING_FALLBACKS
+from app.openai_service import OpenAIService
+from app.prompts import PACKED_PROMPT
+from app.request_buffer import ImageInput, RequestBuffer, as_request_buffer
+
+logger = logging.getLogger(__name__)
+
+# Model, detail and max_tokens per image
+PackKey = tuple[str, str, int]
+
+
+class PendingPack:
+    """Images waiting to be sent together, with the future each caller awaits."""
+
+    def __init__(self):
+        self.images: list[RequestBuffer] = []
+        self.futures: list[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class PackingService(AIServiceBase):
+    """
+    Packs concurrent OpenAI extractions into multi-image requests.
+
+    The first call waits up to ``window_seconds`` for others with the same
+    model, detail and token budget to join it, and at most ``max_images`` go
+    into one request, so the instructions and per-call overhead are paid once
+    per pack. Each caller still gets its own result, with its share of the
+    usage. Images the response cannot be mapped back to, and every image of
+    a pack that failed for any reason but a rate limit, timeout or provider
+    outage, are extracted again on their own.
+
+    Calls asking for a subset of the fields, such as cascade escalations,
+    are never packed.
+    """
+
+    def __init__(self, service: OpenAIService, settings: PackingSettings = PACKING_SETTINGS):
+        self.service = service
+        self.settings = settings
+        self.model = service.model
+        # Part of the extraction cache key, packed results are not mixed with single ones
+        self.prompt = PACKED_PROMPT
+        self._pending: dict[PackKey, PendingPack] = {}
+        self._running: set[asyncio.Task] = set()
+
+    async def extract_document_info(
+        self,
+        image_bytes: ImageInput,
+        model: Optional[str] = None,
+        detail: str = "high",
+        max_tokens: int = 1000,
+        fields: Optional[tuple[str, ...]] = None
+    ) -> dict:
+        if fields or self.settings.max_images < 2:
+            return await self.service.extract_document_info(image_bytes, model=model, detail=detail, max_tokens=max_tokens, fields=fields)
+
+        key = (model or self.model, detail, max_tokens)
+        pack = self._pending.get(key)
+        if pack is None:
+            pack = self._pending[key] = PendingPack()
+            pack.timer = asyncio.get_running_loop().call_later(self.settings.window_seconds, self._send, key)
+        future = asyncio.get_running_loop().create_future()
+        pack.images.append(as_request_buffer(image_bytes))
+        pack.futures.append(future)
+        if len(pack.images) >= self.settings.max_images:
+            self._send(key)
+        # A cancelled caller cancels only its own future, the pack goes ahead for the others
+        return await future
+
+    def _send(self, key: PackKey):
+        pack = self._pending.pop(key, None)
+        if pack is None:
+            return
+        pack.timer.cancel()
+        task = asyncio.create_task(self._extract_pack(key, pack))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _extract_pack(self, key: PackKey, pack: PendingPack):
+        model, detail, max_tokens = key
+        waiting = [(image, future) for image, future in zip(pack.images, pack.futures) if not future.done()]
+        if not waiting:
+            return
+        if len(waiting) == 1:
+            image, future = waiting[0]
+            await self._extract_single(image, future, model, detail, max_tokens)
+            return
+
+        PACKED_CALL_IMAGES.observe(len(waiting))
+        try:
+            results = await self.service.extract_documents_packed(
+                [image for image, _ in waiting], model=model, detail=detail, max_tokens=max_tokens
+            )
+        except HTTPException as e:
+            if e.status_code == 429 or e.status_code >= 500:
+                # Sending the images one by one would only add load to a provider that is already failing
+                for _, future in waiting:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            results, reason = [None] * len(waiting), "error"
+        except Exception as e:
+            logger.warning("Packed extraction of %d images failed, extracting them one by one: %s", len(waiting), e)
+            results, reason = [None] * len(waiting), "error"
+        else:
+            reason = "parse" if all(result is None for result in results) else "unmapped"
+
+        retries = []
+        for (image, future), result in zip(waiting, results):
+            if future.done():
+                continue
+            if result is not None:
+                future.set_result(result)
+            else:
+                retries.append(self._extract_single(image, future, model, detail, max_tokens))
+        if retries:
+            PACKING_FALLBACKS.labels(reason=reason).inc(len(retries))
+            await asyncio.gather(*retries)
+
+    async def _extract_single(self, image: RequestBuffer, future: asyncio.Future, model: str, detail: str, max_tokens: int):
+        try:
+            result = await self.service.extract_document_info(image, model=model, detail=detail, max_tokens=max_tokens)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def stream_document_info(self, image_bytes: ImageInput) -> AsyncIterator[str]:
+        # Streams go out as soon as they are asked for, they are not packed
+        async for delta in self.service.stream_document_info(image_bytes):
+            yield delta
@@ -1,3 +1,7 @@
+import io
+import asyncio
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
 from fastapi import HTTPException
 import httpx
 from httpx import Timeout
@@ -6,8 +10,40 @@ from app.schemas import (
     ProductBytes,
     User
 )
+from app.metrics import EXTRACTION_STAGE_DURATION
 from app.tracing import tracer
-from app.config import SETTINGS
+from app.config import SETTINGS, FILE_UPLOAD_SETTINGS, FileUploadServer
+
+_boto_session = None
+
+
+def get_boto_session():
+    """Process-wide aioboto3 session, sessions are expensive to create."""
+    global _boto_session
+    if _boto_session is None:
+        import aioboto3
+
+        _boto_session = aioboto3.Session(
+            aws_access_key_id=FILE_UPLOAD_SETTINGS.key_id,
+            aws_secret_access_key=FILE_UPLOAD_SETTINGS.access_key,
+            region_name=FILE_UPLOAD_SETTINGS.region
+        )
+    return _boto_session
+
+
+@dataclass
+class UploadFileSource:
+    """A file to archive, backed by an in-memory buffer or a file on disk."""
+    file_name: str
+    content_type: str
+    data: Optional[Union[bytes, memoryview]] = None
+    path: Optional[str] = None
+
+    def open(self) -> BinaryIO:
+        if self.path is not None:
+            return open(self.path, "rb")
+        # BytesIO shares the buffer of a bytes object instead of copying it
+        return io.BytesIO(self.data)
 
 class S3Service:
     """Service for handling S3-related operations"""
@@ -27,7 +63,7 @@ class S3Service:
         }
 
     async def upload_to_s3_file_bytes(self, user: User, docs: list[ProductBytes], tenant: str) -> dict:
-        with tracer.start_as_current_span("upload_to_s3") as span:
+        with tracer.start_as_current_span("upload_to_s3") as span, EXTRACTION_STAGE_DURATION.labels(stage="s3_upload").time():
             s3_request = S3UploadFileBytesRequest(
                 user=user,
                 products=docs,
@@ -57,6 +93,73 @@ class S3Service:
             finally:
                 await self.client.aclose()
 
+    async def upload_files_binary(self, user: User, product_code: str, files: list[UploadFileSource], tenant: str) -> list[Optional[str]]:
+        """
+        Archive files without base64 or JSON re-encoding.
+
+        With the s3 server the files go straight to the bucket through aioboto3
+        (multipart for large files); otherwise they are streamed as one
+        multipart/form-data request to the upload service.
+
+        Returns:
+            list: The URL of each file, in order
+        """
+        with tracer.start_as_current_span("upload_to_s3_binary") as span, EXTRACTION_STAGE_DURATION.labels(stage="s3_upload").time():
+            span.set_attribute("s3.files", len(files))
+            span.set_attribute("s3.server", FILE_UPLOAD_SETTINGS.server.value)
+            try:
+                if FILE_UPLOAD_SETTINGS.server == FileUploadServer.S3:
+                    return await self._upload_direct(user, files, tenant)
+                return await self._upload_multipart(user, product_code, files, tenant)
+            finally:
+                await self.client.aclose()
+
+    async def _upload_multipart(self, user: User, product_code: str, files: list[UploadFileSource], tenant: str) -> list[Optional[str]]:
+        handles = [source.open() for source in files]
+        try:
+            response = await self.client.post(
+                f"{SETTINGS.S3_BASE_URL}{FILE_UPLOAD_SETTINGS.multipart_path}",
+                data={
+                    "mobile_no": user.mobile_no,
+                    "company_name": user.company_name or "",
+                    "product_code": product_code,
+                    "tenant": tenant or "placeorder"
+                },
+                # httpx reads file objects in chunks while sending, nothing is buffered whole
+                files=[("files", (source.file_name, handle, source.content_type)) for source, handle in zip(files, handles)],
+                headers=self.get_s3_headers(),
+                timeout=Timeout(60.0)
+            )
+            response.raise_for_status()
+            urls = response.json().get('s3_urls', {}).get(product_code, [])
+            return [urls[i] if i < len(urls) else None for i in range(len(files))]
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to upload to S3: {str(e)}"
+            )
+        finally:
+            for handle in handles:
+                handle.close()
+
+    async def _upload_direct(self, user: User, files: list[UploadFileSource], tenant: str) -> list[Optional[str]]:
+        settings = FILE_UPLOAD_SETTINGS
+        base_url = settings.public_base_url or f"https://{settings.bucket}.s3.{settings.region}.amazonaws.com"
+        try:
+            async with get_boto_session().client("s3", endpoint_url=settings.endpoint_url or None) as s3:
+                async def upload(source: UploadFileSource) -> str:
+                    key = f"{tenant or 'placeorder'}/{user.mobile_no}/{source.file_name}"
+                    with source.open() as handle:
+                        await s3.upload_fileobj(handle, settings.bucket, key, ExtraArgs={"ContentType": source.content_type})
+                    return f"{base_url.rstrip('/')}/{key}"
+
+                return list(await asyncio.gather(*(upload(source) for source in files)))
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to upload to S3: {str(e)}"
+            )
+
     async def __aenter__(self):
         return self
 
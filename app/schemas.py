@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
 from typing import Optional
 from pydantic.networks import HttpUrl
@@ -17,6 +17,8 @@ class CamelModel(BaseModel):
 class AIProvider(str, Enum):
     OPENAI = "openai"
     GROK = "grok"
+    AUTO = "auto"
+    REPLAY = "replay"
 
 class InboundDocumentType(str, Enum):
     PDF = "application/pdf"
@@ -24,16 +26,48 @@ class InboundDocumentType(str, Enum):
     ZIP = "application/zip"
     JSON = "application/json"
     PNG = "image/png"
+    GIF = "image/gif"
+    WEBP = "image/webp"
+    TIFF = "image/tiff"
+    HEIC = "image/heic"
     BINARY = "binary/octet-stream"
 
 class DocumentInfo(BaseModel):
-    doc_id: str
-    doc_type: str
+    doc_id: str = Field(description="Unique identifier of the document, e.g. the PAN or Aadhaar number")
+    doc_type: str = Field(description='"PAN CARD", "AADHAAR CARD" or "NA"')
     file_type: str
-    full_name: str
-    fathers_name: Optional[str] = None
-    address: Optional[str] = None
-    dob: Optional[date] = None
+    full_name: str = Field(description="Complete name of the holder")
+    fathers_name: Optional[str] = Field(default=None, description="Father's name, may follow S/O or D/O")
+    address: Optional[str] = Field(default=None, description="Complete address, may span several lines")
+    dob: Optional[date] = Field(default=None, description="Date of birth as YYYY-MM-DD")
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+class PreprocessingInfo(BaseModel):
+    preset: str
+    source_format: str
+    output_format: str
+    original_bytes: int
+    processed_bytes: int
+    bytes_saved: int = 0
+    original_dimensions: Optional[list[int]] = None
+    processed_dimensions: Optional[list[int]] = None
+    estimated_tokens_saved: int = 0
+
+class RoutingInfo(BaseModel):
+    provider: str
+    attempts: list[str]
+    hedged: bool = False
+    failover: bool = False
+
+class PagesInfo(BaseModel):
+    source_format: str
+    total_pages: int
+    pages_extracted: int
+    stopped_early: bool = False
 
 class DocumentResponse(BaseModel):
     success: bool
@@ -41,6 +75,38 @@ class DocumentResponse(BaseModel):
     error: Optional[str] = None
     time_taken: float
     url: Optional[str] = None
+    cache_hit: bool = False
+    cache_tier: Optional[str] = None
+    preprocessing: Optional[PreprocessingInfo] = None
+    archive_id: Optional[str] = None
+    routing: Optional[RoutingInfo] = None
+    usage: Optional[TokenUsage] = None
+    pages: Optional[PagesInfo] = None
+
+class BatchItemResponse(DocumentResponse):
+    index: int
+    source: str
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class Job(BaseModel):
+    job_id: str
+    status: JobStatus = JobStatus.QUEUED
+    provider: AIProvider = AIProvider.OPENAI
+    preset: str
+    file_url: Optional[str] = None
+    mobile: Optional[str] = None
+    tenant: Optional[str] = None
+    webhook_url: Optional[str] = None
+    attempts: int = 0
+    created_at: float
+    updated_at: float
+    result: Optional[DocumentResponse] = None
+    error: Optional[str] = None
 
 
 class SuccessCode(str, Enum):
@@ -3,13 +3,39 @@ from typing import Union
 from app.openai_service import OpenAIService
 from app.grok_service import GrokService
 from app.schemas import AIProvider
+from app.base_service import AIServiceBase
+from app.config import CASCADE_SETTINGS, PACKING_SETTINGS, REPLAY_SETTINGS
 
 class ServiceFactory:
+    # One instance per provider is reused, so clients and the auto router's live statistics
+    # are shared by the whole process
+    _services: dict[AIProvider, AIServiceBase] = {}
+
     @staticmethod
-    def get_service(provider: AIProvider) -> Union[OpenAIService, GrokService]:
+    def get_service(provider: AIProvider) -> AIServiceBase:
+        service = ServiceFactory._services.get(provider)
+        if service is not None:
+            return service
         if provider == AIProvider.OPENAI:
-            return OpenAIService()
+            service = OpenAIService()
+            if PACKING_SETTINGS.enabled:
+                from app.request_packing import PackingService
+                service = PackingService(service)
+            if CASCADE_SETTINGS.enabled:
+                from app.extraction_cascade import ExtractionCascade
+                service = ExtractionCascade(service)
         elif provider == AIProvider.GROK:
-            return GrokService()
+            service = GrokService()
+        elif provider == AIProvider.AUTO:
+            from app.provider_router import ProviderRouter
+            service = ProviderRouter()
+        elif provider == AIProvider.REPLAY:
+            from app.replay_service import ReplayService
+            service = ReplayService()
         else:
             raise ValueError(f"Unknown AI provider: {provider}")
+        if REPLAY_SETTINGS.record and provider in (AIProvider.OPENAI, AIProvider.GROK):
+            from app.replay_service import RecordingService
+            service = RecordingService(service, provider)
+        ServiceFactory._services[provider] = service
+        return service
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable, Iterator
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts the task; callers arriving while it is
+    running wait on the same task and receive its result or exception. Waiters
+    are shielded, so cancelling one of them never cancels the shared task,
+    unless ``cancel_abandoned`` is set and every waiter left before the task
+    finished. The key is released as soon as the task finishes, so failures
+    are not cached.
+    """
+
+    def __init__(self, cancel_abandoned: bool = False):
+        self.cancel_abandoned = cancel_abandoned
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Args:
+            key: Identifies duplicate work
+            func: Zero-argument coroutine function performing the work
+
+        Returns:
+            tuple: The result and whether it was shared from another caller's task
+        """
+        task, shared = self.start(key, func)
+        with self.follow(task):
+            return await asyncio.shield(task), shared
+
+    def start(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> tuple[asyncio.Task, bool]:
+        """
+        Like :meth:`do`, but returns the task without waiting for it, for callers
+        that follow the work while it runs. Await it through ``asyncio.shield``,
+        inside :meth:`follow`.
+
+        Returns:
+            tuple: The task and whether it was started by another caller
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        return task, shared
+
+    @contextmanager
+    def follow(self, task: asyncio.Task) -> Iterator[asyncio.Task]:
+        """
+        Count the caller as a waiter of ``task`` for the duration of the block.
+        With ``cancel_abandoned``, the last waiter leaving before the task
+        finished cancels it and releases its key.
+        """
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            yield task
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if self.cancel_abandoned and not task.done():
+                    # A caller arriving before the cancellation lands starts afresh
+                    for key in [key for key, running in self._tasks.items() if running is task]:
+                        del self._tasks[key]
+                    task.cancel()
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Retrieve the exception so an abandoned failed task is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
@@ -1,23 +1,181 @@
+import importlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.resources import Resource, SERVICE_NAME
-from opentelemetry.instrumentation.tortoiseorm import TortoiseORMInstrumentor
-from opentelemetry.instrumentation.redis import RedisInstrumentor
-from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
-
-resource = Resource(attributes={
-    SERVICE_NAME: 'ocr-openai'
-})
-
-provider = TracerProvider(resource=resource)
-trace.set_tracer_provider(provider)
-provider.add_span_processor(
-    BatchSpanProcessor(OTLPSpanExporter())
-)
-tracer = trace.get_tracer(__name__)
-
-TortoiseORMInstrumentor().instrument(tracer_provider=provider)
-RedisInstrumentor().instrument(tracer_provider=provider)
-HTTPXClientInstrumentor().instrument(tracer_provider=provider)
\ No newline at end of file
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
+from opentelemetry.trace import NonRecordingSpan, StatusCode
+from app.config import TRACING_SETTINGS, TracingExporter, TracingLevel, TracingSettings
+
+LEVEL_ORDER = {TracingLevel.MINIMAL: 0, TracingLevel.STANDARD: 1, TracingLevel.VERBOSE: 2}
+
+# Instrumentors by library, each loaded by instrument() once the library is in use
+INSTRUMENTORS = {
+    "httpx": ("opentelemetry.instrumentation.httpx", "HTTPXClientInstrumentor"),
+    "redis": ("opentelemetry.instrumentation.redis", "RedisInstrumentor"),
+}
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Holds each trace's spans until its local root span ends, then passes the
+    whole trace on when it was head sampled (by its remote parent, or by the
+    trace id under ``sample_ratio``), failed anywhere, or took at least
+    ``tail_slow_seconds``. Spans ending after the decision follow it. At most
+    ``tail_max_traces`` unfinished traces are held, the oldest is dropped.
+    """
+
+    def __init__(self, delegate: SpanProcessor, settings: TracingSettings):
+        self.delegate = delegate
+        self.settings = settings
+        self.bound = TraceIdRatioBased.get_bound_for_rate(settings.sample_ratio)
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._failed: set[int] = set()
+        self._decided: OrderedDict[int, bool] = OrderedDict()
+        # Spans may end on any thread
+        self._lock = threading.Lock()
+
+    def _head_sampled(self, root: ReadableSpan) -> bool:
+        if root.parent is not None and root.parent.is_remote:
+            return root.parent.trace_flags.sampled
+        return (root.context.trace_id & TraceIdRatioBased.TRACE_ID_LIMIT) < self.bound
+
+    @staticmethod
+    def _is_failure(span: ReadableSpan) -> bool:
+        return span.status.status_code == StatusCode.ERROR or span.attributes.get("error") is True
+
+    def _decide(self, trace_id: int, root: ReadableSpan) -> bool:
+        failed = trace_id in self._failed
+        self._failed.discard(trace_id)
+        slow = (root.end_time - root.start_time) / 1e9 >= self.settings.tail_slow_seconds
+        keep = failed or slow or self._head_sampled(root)
+        self._decided[trace_id] = keep
+        while len(self._decided) > self.settings.tail_max_traces:
+            self._decided.popitem(last=False)
+        return keep
+
+    def on_end(self, span: ReadableSpan):
+        trace_id = span.context.trace_id
+        with self._lock:
+            keep = self._decided.get(trace_id)
+            if keep is None:
+                spans = self._pending.setdefault(trace_id, [])
+                spans.append(span)
+                if self._is_failure(span):
+                    self._failed.add(trace_id)
+                if span.parent is not None and not span.parent.is_remote:
+                    while len(self._pending) > self.settings.tail_max_traces:
+                        dropped, _ = self._pending.popitem(last=False)
+                        self._failed.discard(dropped)
+                    return
+                del self._pending[trace_id]
+                export = spans if self._decide(trace_id, span) else []
+            else:
+                export = [span] if keep else []
+        for finished in export:
+            self.delegate.on_end(finished)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+class QuietSpan:
+    """A span that drops events and forwards everything else, exceptions included."""
+
+    __slots__ = ("span",)
+
+    def __init__(self, span):
+        self.span = span
+
+    def add_event(self, name, attributes=None, timestamp=None):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.span, name)
+
+
+class LeveledTracer:
+    """
+    The OpenTelemetry tracer at the verbosity of ``TRACING_LEVEL``.
+
+    Spans take a ``level``: ``minimal`` for request and provider call spans,
+    ``standard`` (the default) for the others. A span above the configured
+    level is not created; its attributes are dropped and its children attach
+    to the enclosing span. Events are only recorded at ``verbose``.
+    """
+
+    def __init__(self, tracer: trace.Tracer, level: TracingLevel):
+        self.tracer = tracer
+        self.rank = LEVEL_ORDER[level]
+        self.events = level == TracingLevel.VERBOSE
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[dict] = None, level: TracingLevel = TracingLevel.STANDARD, **kwargs) -> Iterator:
+        if LEVEL_ORDER[level] > self.rank:
+            yield NonRecordingSpan(trace.get_current_span().get_span_context())
+            return
+        with self.tracer.start_as_current_span(name, attributes=attributes, **kwargs) as span:
+            yield span if self.events or not span.is_recording() else QuietSpan(span)
+
+
+def create_provider(settings: TracingSettings) -> Optional[TracerProvider]:
+    if not settings.enabled:
+        return None
+    # With tail keeping every span is recorded, the processor decides what is exported
+    sampler = ALWAYS_ON if settings.tail_keep else ParentBased(TraceIdRatioBased(settings.sample_ratio))
+    tracer_provider = TracerProvider(resource=Resource(attributes={SERVICE_NAME: 'ocr-openai'}), sampler=sampler)
+    trace.set_tracer_provider(tracer_provider)
+    return tracer_provider
+
+
+provider = create_provider(TRACING_SETTINGS)
+_instrumented: set[str] = set()
+
+
+def add_span_exporter(exporter: SpanExporter, settings: TracingSettings = TRACING_SETTINGS):
+    """Export finished spans in batches, behind the tail sampler when it is enabled."""
+    if provider is None:
+        return
+    processor: SpanProcessor = BatchSpanProcessor(exporter)
+    if settings.tail_keep:
+        processor = TailSamplingProcessor(processor, settings)
+    provider.add_span_processor(processor)
+
+
+def instrument(library: str):
+    """
+    Install the instrumentor for ``library`` the first time it is used.
+
+    Does nothing when tracing is disabled, at the minimal level, or when the
+    instrumentation package is not installed.
+    """
+    if provider is None or TRACING_SETTINGS.level == TracingLevel.MINIMAL or library in _instrumented:
+        return
+    _instrumented.add(library)
+    module_name, class_name = INSTRUMENTORS[library]
+    try:
+        instrumentor = getattr(importlib.import_module(module_name), class_name)
+    except ImportError:
+        return
+    instrumentor().instrument(tracer_provider=provider)
+
+
+if TRACING_SETTINGS.exporter == TracingExporter.OTLP:
+    # Imported only when used, the OTLP exporter pulls in protobuf and requests
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    add_span_exporter(OTLPSpanExporter())
+elif TRACING_SETTINGS.exporter == TracingExporter.CONSOLE:
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    add_span_exporter(ConsoleSpanExporter())
+
+# Every provider call and upload goes through httpx
+instrument("httpx")
+
+tracer = LeveledTracer(trace.get_tracer(__name__), TRACING_SETTINGS.level)
@@ -0,0 +1,229 @@
+import time
+import socket
+import asyncio
+import ipaddress
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+import httpx
+from fastapi import HTTPException
+from app.base_service import sniff_image_format, sniff_container_format
+from app.config import FETCH_SETTINGS, FetchSettings
+from app.metrics import EXTRACTION_STAGE_DURATION
+from app.request_buffer import InFlightBudget, RequestBuffer
+from app.single_flight import SingleFlight
+from app.tracing import tracer
+
+# Enough bytes to recognise every format sniff_image_format and sniff_container_format know
+SNIFF_BYTES = 12
+
+
+@dataclass
+class CachedFetch:
+    body: bytes
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+async def check_url(url: str, allow_private_networks: bool = False):
+    """
+    Refuse URLs the service must not request on a caller's behalf: anything
+    but http(s), and hosts resolving to loopback, private, link-local or
+    otherwise non-public addresses.
+
+    Raises:
+        HTTPException: 400 when the URL is not allowed
+    """
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL:
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise HTTPException(status_code=400, detail="Only http and https URLs are supported")
+    if allow_private_networks:
+        return
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(parsed.host, parsed.port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise HTTPException(status_code=400, detail="Unable to resolve URL host")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise HTTPException(status_code=400, detail="URL host is not a public address")
+
+
+class UrlFetcher:
+    """
+    Downloads documents referenced by ``file_url`` on a shared, pooled client.
+
+    Bodies are streamed with a byte cap and a total deadline, and the first
+    bytes are sniffed so that non-documents are rejected before the rest arrives.
+    Redirects are followed by hand, up to ``max_redirects``, and every URL
+    requested is checked by :func:`check_url` first. Recent responses are
+    kept in a small LRU under the URL that served them: fresh entries are
+    returned without a request, stale ones are revalidated with a conditional
+    GET once the redirects lead back to the same URL.
+    """
+
+    def __init__(self, settings: FetchSettings = FETCH_SETTINGS):
+        self.settings = settings
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: OrderedDict[str, CachedFetch] = OrderedDict()
+        # Requested URL to the URL that served it, for URLs that redirected
+        self._locations: OrderedDict[str, str] = OrderedDict()
+        self._cache_bytes = 0
+        self._flight = SingleFlight()
+        self._prefetch_semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=False,
+                timeout=httpx.Timeout(self.settings.total_timeout, connect=self.settings.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.settings.max_connections,
+                    max_keepalive_connections=self.settings.max_connections
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        Raises:
+            HTTPException: 400 for unreachable URLs or non-images, 413 when over
+                the size cap, 504 when the deadline is exceeded
+        """
+        body, _ = await self._flight.do(url, lambda: self._fetch(url))
+        return body
+
+    @asynccontextmanager
+    async def prefetch(self, url: str, budget: InFlightBudget) -> AsyncIterator[RequestBuffer]:
+        """
+        Download ``url`` under the prefetch concurrency cap, so that the
+        documents of a batch arrive together instead of one per free slot.
+
+        Room for ``max_bytes`` is reserved in ``budget`` before the download
+        starts and shrunk to the real size once it arrived; the body keeps its
+        room until the block exits.
+        """
+        if self._prefetch_semaphore is None:
+            self._prefetch_semaphore = asyncio.Semaphore(self.settings.prefetch_concurrency)
+        async with AsyncExitStack() as stack:
+            async with self._prefetch_semaphore:
+                reservation = await stack.enter_async_context(budget.reserve(self.settings.max_bytes))
+                body = await self.fetch(url)
+            await reservation.shrink(len(body))
+            yield RequestBuffer(body)
+
+    async def _fetch(self, url: str) -> bytes:
+        with tracer.start_as_current_span("fetch_file_url") as span, EXTRACTION_STAGE_DURATION.labels(stage="url_fetch").time():
+            cached_url = self._locations.get(url, url)
+            cached = self._cache.get(cached_url)
+            if cached is not None and time.time() - cached.fetched_at < self.settings.cache_ttl:
+                self._cache.move_to_end(cached_url)
+                span.set_attribute("fetch.cache", "fresh")
+                return cached.body
+
+            location = url
+            try:
+                async with asyncio.timeout(self.settings.total_timeout):
+                    for redirects in range(self.settings.max_redirects + 1):
+                        await check_url(location, self.settings.allow_private_networks)
+                        # Validators only mean something to the URL that issued them
+                        headers = cached.conditional_headers() if cached is not None and location == cached_url else {}
+                        async with self.client.stream("GET", location, headers=headers) as response:
+                            if response.has_redirect_location:
+                                location = str(response.url.join(response.headers["location"]))
+                                continue
+                            span.set_attribute("http.status_code", response.status_code)
+                            span.set_attribute("fetch.redirects", redirects)
+                            if response.status_code == 304 and headers:
+                                span.set_attribute("fetch.cache", "revalidated")
+                                cached.fetched_at = time.time()
+                                self._cache.move_to_end(cached_url)
+                                return cached.body
+                            if response.status_code != 200:
+                                raise HTTPException(status_code=400, detail="Unable to retrieve file from URL")
+                            body = await self._read_body(response)
+                            break
+                    else:
+                        raise HTTPException(status_code=400, detail="Too many redirects retrieving file from URL")
+            except TimeoutError:
+                span.set_attribute("error", True)
+                raise HTTPException(status_code=504, detail="Timed out retrieving file from URL")
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                span.record_exception(e)
+                raise HTTPException(status_code=400, detail="Unable to retrieve file from URL")
+
+            span.set_attribute("file.size", len(body))
+            self._store(location, CachedFetch(
+                body=body,
+                fetched_at=time.time(),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified")
+            ))
+            self._locations.pop(url, None)
+            if location != url:
+                self._locations[url] = location
+                while len(self._locations) > self.settings.cache_max_entries:
+                    self._locations.popitem(last=False)
+            return body
+
+    async def _read_body(self, response: httpx.Response) -> bytes:
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.settings.max_bytes:
+            raise HTTPException(status_code=413, detail="File at URL is too large")
+
+        chunks: list[bytes] = []
+        received = 0
+        sniffed = False
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            received += len(chunk)
+            if received > self.settings.max_bytes:
+                raise HTTPException(status_code=413, detail="File at URL is too large")
+            if not sniffed and received >= SNIFF_BYTES:
+                sniffed = True
+                if not self.is_supported(b"".join(chunks)[:SNIFF_BYTES]):
+                    raise HTTPException(status_code=400, detail="Unsupported image format")
+        body = b"".join(chunks)
+        if not sniffed and not self.is_supported(body):
+            raise HTTPException(status_code=400, detail="Unsupported image format")
+        return body
+
+    @staticmethod
+    def is_supported(head: bytes) -> bool:
+        return sniff_image_format(head) is not None or sniff_container_format(head) is not None
+
+    def _store(self, url: str, entry: CachedFetch):
+        if len(entry.body) > self.settings.cache_max_bytes:
+            return
+        previous = self._cache.pop(url, None)
+        if previous is not None:
+            self._cache_bytes -= len(previous.body)
+        self._cache[url] = entry
+        self._cache_bytes += len(entry.body)
+        while len(self._cache) > self.settings.cache_max_entries or self._cache_bytes > self.settings.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted.body)
+
+
+url_fetcher = UrlFetcher()
@@ -0,0 +1,96 @@
+"""
+Per-request cost of bearer token authentication.
+
+Calls the auth dependency directly with a long-lived service token, the way
+service-to-service callers reuse the token from /auth/token:
+
+- legacy: the previous implementation, error objects built up front and a
+  jwt.decode on every request
+- miss: get_current_user with the verified-token cache disabled
+- hit: get_current_user with the token already in the cache
+
+    python -m benchmarks.auth_overhead [--iterations 20000]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import jwt
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import auth
+from app.config import SETTINGS, AuthSettings
+from app.schemas import ErrorCode, GenericResponse, Trace
+from app.tracing import tracer
+
+
+async def legacy_get_current_user(request: Request, x_device_id: str, authorization: str, trace: Trace) -> Trace:
+    attributes = {
+        'token': str(authorization),
+        'request_id': request.headers.get('x-request-id', ''),
+        'device_id': x_device_id or '',
+    }
+    with tracer.start_as_current_span("get_request_param", attributes=attributes):
+        error_response = GenericResponse.get_error_response(
+            error_code=ErrorCode.ERROR_CODE_AUTH_ERROR,
+            customer_message='Invalid Token',
+            debug_info={}
+        )
+        credentials_exception = HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail=error_response.dict())
+        try:
+            token = authorization.split("Bearer ")[1]
+            payload = jwt.decode(token, SETTINGS.JWT_SECRET_KEY, algorithms=[SETTINGS.JWT_ALGORITHM])
+            if payload.get("sub") != SETTINGS.SERVICE_ID:
+                raise credentials_exception
+        except Exception:
+            raise credentials_exception
+        return trace
+
+
+async def measure(call, iterations: int) -> float:
+    await call()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    return (time.perf_counter() - started) / iterations
+
+
+async def main(args):
+    SETTINGS.JWT_SECRET_KEY = SETTINGS.JWT_SECRET_KEY or "benchmark-secret"
+    SETTINGS.JWT_ALGORITHM = SETTINGS.JWT_ALGORITHM or "HS256"
+    SETTINGS.SERVICE_ID = SETTINGS.SERVICE_ID or "benchmark-service"
+    token = jwt.encode(
+        {"sub": SETTINGS.SERVICE_ID, "iat": datetime.utcnow(), "exp": datetime.utcnow() + timedelta(days=90)},
+        SETTINGS.JWT_SECRET_KEY,
+        algorithm=SETTINGS.JWT_ALGORITHM
+    )
+    authorization = f"Bearer {token}"
+    request = Request({"type": "http", "headers": [(b"x-request-id", b"benchmark"), (b"authorization", authorization.encode())]})
+    trace = Trace(request_id="benchmark", device_id="benchmark")
+
+    def current_user():
+        return auth.get_current_user(request, "benchmark", "benchmark", authorization, trace)
+
+    results = {"legacy": await measure(lambda: legacy_get_current_user(request, "benchmark", authorization, trace), args.iterations)}
+    auth.verified_tokens = auth.VerifiedTokenCache(AuthSettings(token_cache_size=0))
+    results["miss"] = await measure(current_user, args.iterations)
+    auth.verified_tokens = auth.VerifiedTokenCache(AuthSettings())
+    results["hit"] = await measure(current_user, args.iterations)
+
+    for mode, seconds in results.items():
+        print(json.dumps({
+            "mode": mode,
+            "iterations": args.iterations,
+            "us_per_request": round(seconds * 1e6, 2),
+            "speedup_vs_legacy": round(results["legacy"] / seconds, 2),
+        }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    asyncio.run(main(parser.parse_args()))
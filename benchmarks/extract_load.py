@@ -0,0 +1,261 @@
+"""
+End-to-end load test of POST /api/v1/documents/extract.
+
+For every load level it starts the provider and S3 stubs (benchmarks.stubs)
+and a fresh API worker in their own processes, the worker pointed at the
+stubs, then drives the endpoint over HTTP:
+
+- closed loop: --concurrency N keeps N requests in flight, --requests per level
+- open loop: --rate R starts R requests a second for --duration seconds
+  whether or not earlier ones finished, so a saturated worker shows up as
+  growing latency rather than as a lower arrival rate. Latency is measured
+  from the scheduled start, and arrivals beyond --max-outstanding are
+  counted as dropped.
+
+Each level prints one JSON line, also appended to --output, with throughput,
+latency percentiles, status counts, the worker's event-loop lag and peak
+RSS (its main process, not the preprocessing pool) and the stub counters,
+for tracking regressions between commits.
+
+Uploads are distinct noise JPEGs so that neither the result cache nor
+single-flight merges them, and the worker runs with the cache disabled and
+archives inline unless --spool is given. Other worker settings come from the
+environment as usual, e.g. API_OPENAI_MAX_CONCURRENCY or ADMISSION_ENABLED.
+
+    python -m benchmarks.extract_load --concurrency 1 8 32 --requests 200
+    python -m benchmarks.extract_load --rate 5 20 --duration 30 \\
+        --openai-latency lognormal:0.8:0.3 --openai-error-rate 0.02 --output results.jsonl
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
+import jwt
+
+from benchmarks.harness import ChildServer, peak_rss_mb, serve_until_stdin_closes, summarize_ms
+from benchmarks.stubs import add_stub_arguments, base_urls, services_from_arguments, stub_arguments
+
+EXTRACT_PATH = "/api/v1/documents/extract"
+JWT_SECRET = "benchmark-secret"
+SERVICE_ID = "benchmark-service"
+
+
+def noise_jpegs(count: int, size_kb: float, seed: Optional[int]) -> list[bytes]:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    # Noise hardly compresses, a quality 90 JPEG of it takes about 2.5 bytes a pixel
+    side = max(16, int(math.sqrt(size_kb * 1024 / 2.5)))
+    images = []
+    for _ in range(count):
+        image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=90)
+        images.append(output.getvalue())
+    return images
+
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def worker_env(args, spool_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update(base_urls(args.stub_port))
+    env.update({
+        "API_OPENAI_KEY": "stub",
+        "API_GROK_KEY": "stub",
+        "API_JWT_SECRET_KEY": JWT_SECRET,
+        "API_JWT_ALGORITHM": "HS256",
+        "API_SERVICE_ID": SERVICE_ID,
+        "CACHE_ENABLED": "false",
+        "ARCHIVE_SPOOL_ENABLED": "true" if args.spool else "false",
+        "ARCHIVE_SPOOL_DIR": spool_dir,
+        "JOBS_SQLITE_PATH": ":memory:",
+    })
+    return env
+
+
+class Driver:
+    """Sends extract requests and records (latency, outcome) for each."""
+
+    def __init__(self, client: httpx.AsyncClient, images: list[bytes], args):
+        self.client = client
+        self.images = images
+        self.args = args
+        token = jwt.encode(
+            {"sub": SERVICE_ID, "exp": datetime.now(timezone.utc) + timedelta(hours=12)},
+            JWT_SECRET,
+            algorithm="HS256"
+        )
+        self.headers = {"authorization": f"Bearer {token}", "x-device-id": "benchmark"}
+        self.sent = 0
+        self.results: list[tuple[float, str]] = []
+
+    async def send(self, started: Optional[float] = None) -> tuple[float, str]:
+        started = started or time.perf_counter()
+        image = self.images[self.sent % len(self.images)]
+        self.sent += 1
+        try:
+            response = await self.client.post(
+                EXTRACT_PATH,
+                files={"file": ("document.jpg", image, "image/jpeg")},
+                data={"provider": self.args.provider, "preset": self.args.preset, "mobile": "9999999999", "tenant": "benchmark"},
+                headers={**self.headers, "x-request-id": uuid.uuid4().hex}
+            )
+            outcome = str(response.status_code)
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        return time.perf_counter() - started, outcome
+
+    async def record(self, started: Optional[float] = None):
+        self.results.append(await self.send(started))
+
+    async def closed_loop(self, concurrency: int, requests: int):
+        pending = iter(range(requests))
+
+        async def client_loop():
+            for _ in pending:
+                await self.record()
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, duration: float, poisson: bool, max_outstanding: int, rng: random.Random) -> int:
+        """Returns how many arrivals were dropped because too many requests were outstanding."""
+        tasks: set[asyncio.Task] = set()
+        dropped = 0
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled < start + duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_outstanding:
+                dropped += 1
+            else:
+                task = asyncio.create_task(self.record(scheduled))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            scheduled += rng.expovariate(rate) if poisson else 1 / rate
+        await asyncio.gather(*tasks)
+        return dropped
+
+
+async def run_level(args, images: list[bytes], concurrency: Optional[int] = None, rate: Optional[float] = None) -> dict:
+    spool_dir = tempfile.mkdtemp(prefix="extract_load_spool_")
+    stubs = ChildServer("benchmarks.stubs", ["--port", str(args.stub_port), *stub_arguments(args)])
+    worker = ChildServer("benchmarks.extract_load", ["--serve", str(args.port)], env=worker_env(args, spool_dir))
+    level: dict = {"mode": "closed", "concurrency": concurrency} if rate is None else {
+        "mode": "open", "rate_rps": rate, "duration_s": args.duration, "arrivals": args.arrivals
+    }
+    try:
+        async with stubs:
+            await worker.start()
+            try:
+                limits = httpx.Limits(max_connections=concurrency or args.max_outstanding, max_keepalive_connections=None)
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits) as client:
+                    driver = Driver(client, images, args)
+                    for _ in range(args.warmup):
+                        await driver.send()
+                    started = time.perf_counter()
+                    if rate is None:
+                        await driver.closed_loop(concurrency, args.requests)
+                    else:
+                        level["dropped"] = await driver.open_loop(
+                            rate, args.duration, args.arrivals == "poisson", args.max_outstanding, random.Random(args.seed)
+                        )
+                    elapsed = time.perf_counter() - started
+            finally:
+                worker_report = await worker.stop()
+            stub_counters = await stubs.stop()
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    statuses = Counter(outcome for _, outcome in driver.results)
+    ok_latencies = [latency for latency, outcome in driver.results if outcome == "200"]
+    return {
+        "benchmark": "extract_load",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        **level,
+        "provider": args.provider,
+        "preset": args.preset,
+        "image_kb": round(sum(map(len, images)) / len(images) / 1024, 1),
+        "requests": len(driver.results),
+        "ok": len(ok_latencies),
+        "statuses": dict(statuses),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok_latencies) / elapsed, 2),
+        "latency_ms": summarize_ms(ok_latencies),
+        "worker": worker_report,
+        "stubs": {
+            "profiles": {name: profile.describe() for name, profile in services_from_arguments(args).profiles.items()},
+            "counters": stub_counters,
+        },
+    }
+
+
+async def serve(port: int):
+    from app.main import app
+
+    lag = await serve_until_stdin_closes(app, port)
+    print(json.dumps({"loop_lag_ms": summarize_ms(lag, (50, 99)), "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+
+async def main(args):
+    images = noise_jpegs(args.distinct_images, args.image_kb, args.seed)
+    levels = [{"rate": rate} for rate in args.rate] if args.rate else [{"concurrency": c} for c in args.concurrency]
+    for level in levels:
+        report = await run_level(args, images, **level)
+        line = json.dumps(report)
+        print(line, flush=True)
+        if args.output:
+            with open(args.output, "a") as output:
+                output.write(line + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Closed-loop levels")
+    load.add_argument("--requests", type=int, default=200, help="Requests per closed-loop level")
+    load.add_argument("--rate", type=float, nargs="+", help="Open-loop levels in requests per second, replaces --concurrency")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per open-loop level")
+    load.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    load.add_argument("--max-outstanding", type=int, default=1000)
+    load.add_argument("--warmup", type=int, default=5, help="Requests sent before measuring each level")
+    load.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+
+    request = parser.add_argument_group("requests")
+    request.add_argument("--provider", choices=["openai", "grok", "auto"], default="openai")
+    request.add_argument("--preset", choices=["none", "fast", "balanced", "quality"], default="balanced")
+    request.add_argument("--image-kb", type=float, default=200.0, help="Approximate size of each upload")
+    request.add_argument("--distinct-images", type=int, default=256)
+
+    stubs = parser.add_argument_group("stubs")
+    add_stub_arguments(stubs)
+
+    parser.add_argument("--port", type=int, default=8780, help="Port of the API worker")
+    parser.add_argument("--stub-port", type=int, default=8790)
+    parser.add_argument("--spool", action="store_true", help="Archive through the spool instead of inline")
+    parser.add_argument("--output", help="Append the JSON lines to this file")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    asyncio.run(serve(args.serve) if args.serve else main(args))
@@ -0,0 +1,125 @@
+"""
+Measurement and process helpers shared by the benchmarks.
+
+Servers that run in a child process print ``ready`` once they accept
+connections and shut down when their stdin is closed, so the parent can
+stop them without signals and still read a final JSON report.
+"""
+import asyncio
+import json
+import math
+import resource
+import sys
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list[float], interval: float = 0.01):
+    """Append how late each ``interval`` sleep woke up until ``stop`` is set."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize_ms(values: list[float], quantiles: tuple[int, ...] = (50, 95, 99)) -> dict:
+    summary = {f"p{q}": round(percentile(values, q) * 1000, 2) for q in quantiles}
+    summary["max"] = round(max(values, default=0.0) * 1000, 2)
+    return summary
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def start_server_thread(app, port: int) -> tuple[uvicorn.Server, threading.Thread]:
+    """Run an ASGI app on 127.0.0.1 in a daemon thread; stop with ``server.should_exit = True``."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+async def serve_until_stdin_closes(app, port: int) -> list[float]:
+    """
+    Serve ``app`` in this process until the parent closes stdin.
+
+    Returns the event-loop lag samples taken while serving.
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+
+    stop = asyncio.Event()
+    lag: list[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag))
+    print("ready", flush=True)
+    await asyncio.to_thread(sys.stdin.read)
+    server.should_exit = True
+    await serving
+    stop.set()
+    await lag_task
+    return lag
+
+
+class ChildServer:
+    """Parent side of :func:`serve_until_stdin_closes`, running ``python -m <module> <args>``."""
+
+    def __init__(self, module: str, args: list[str], env: Optional[dict] = None, startup_timeout: float = 60.0):
+        self.module = module
+        self.args = args
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", self.module, *self.args,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=self.env
+        )
+        try:
+            while True:
+                line = await asyncio.wait_for(self.process.stdout.readline(), timeout=self.startup_timeout)
+                if not line:
+                    raise RuntimeError(f"{self.module} exited before it was ready")
+                if line.strip() == b"ready":
+                    return
+        except BaseException:
+            if self.process.returncode is None:
+                self.process.kill()
+            await self.process.wait()
+            raise
+
+    async def stop(self) -> Optional[dict]:
+        """Close stdin and return the last JSON line the child printed, if any."""
+        self.process.stdin.close()
+        output, _ = await self.process.communicate()
+        for line in reversed(output.decode().splitlines()):
+            if line.startswith("{"):
+                return json.loads(line)
+        return None
+
+    async def __aenter__(self) -> "ChildServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.process.returncode is None:
+            await self.stop()
@@ -0,0 +1,83 @@
+"""
+Hit rate, accuracy and latency of the local OCR fast path over a fixture directory.
+
+Every image in the directory is preprocessed with the chosen preset, as the
+API does, and run through Tesseract. An optional ``<image>.json`` next to an
+image holds the expected fields; hits are then checked against it, and a hit
+with any wrong required field is counted as a false accept. Needs the
+tesseract binary on PATH (or LOCAL_OCR_TESSERACT_CMD). benchmarks.ocr_fixtures
+writes a reproducible synthetic set to run it against:
+
+    python -m benchmarks.ocr_fixtures fixtures/cards --seed 7
+    python -m benchmarks.local_ocr fixtures/cards [--preset balanced] [--min-confidence 80]
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from app.base_service import sniff_image_format
+from app.config import ImagePreset, LOCAL_OCR_SETTINGS
+from app.document_validators import normalize_id, parse_date
+from app.image_preprocessing import preprocess_image, shutdown_preprocessing_executor
+from app.local_ocr import LocalOcr, REQUIRED_FIELDS
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def matches(field: str, actual, expected) -> bool:
+    if field == "doc_id":
+        return normalize_id(actual) == normalize_id(expected)
+    if field == "dob":
+        return parse_date(actual) == parse_date(expected)
+    return str(actual).strip().upper() == str(expected).strip().upper()
+
+
+async def run(args):
+    ocr = LocalOcr(LOCAL_OCR_SETTINGS.model_copy(update={"min_confidence": args.min_confidence}))
+    images = sorted(path for path in Path(args.fixtures).iterdir() if path.is_file() and sniff_image_format(path.read_bytes()[:12]))
+    latencies: list[float] = []
+    hits = false_accepts = labelled_hits = 0
+
+    for path in images:
+        processed_bytes, _ = await preprocess_image(path.read_bytes(), ImagePreset(args.preset))
+        started = time.perf_counter()
+        result = await ocr.extract_document_info(processed_bytes)
+        latencies.append(time.perf_counter() - started)
+
+        row = {"file": path.name, "hit": result is not None, "seconds": round(latencies[-1], 3)}
+        expected_path = path.with_suffix(".json")
+        if result is not None:
+            hits += 1
+            if expected_path.exists():
+                expected = json.loads(expected_path.read_text())
+                wrong = [field for field in REQUIRED_FIELDS if not matches(field, result.get(field), expected.get(field))]
+                labelled_hits += 1
+                false_accepts += bool(wrong)
+                row["wrong_fields"] = wrong
+        print(json.dumps(row))
+
+    shutdown_preprocessing_executor()
+    print(json.dumps({
+        "documents": len(images),
+        "hits": hits,
+        "hit_rate": round(hits / len(images), 3) if images else 0.0,
+        "labelled_hits": labelled_hits,
+        "false_accepts": false_accepts,
+        "p50_seconds": round(percentile(latencies, 0.5), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", help="Directory of card images with optional <image>.json expectations")
+    parser.add_argument("--preset", default=ImagePreset.BALANCED.value, choices=[preset.value for preset in ImagePreset])
+    parser.add_argument("--min-confidence", type=float, default=LOCAL_OCR_SETTINGS.min_confidence)
+    asyncio.run(run(parser.parse_args()))
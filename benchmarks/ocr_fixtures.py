@@ -0,0 +1,138 @@
+"""
+Synthetic PAN and Aadhaar card fixtures for benchmarks.local_ocr.
+
+Cards are drawn with Pillow from seeded random names, dates and numbers (PAN
+pattern, Verhoeff-valid Aadhaar), so no real person's details are involved and
+the same seed always writes the same set. Every ``<card>.png`` gets a
+``<card>.json`` with its expected fields. A share of the cards is degraded
+(blur, noise, a slight rotation, low contrast) like poor phone photos, so the
+benchmark sees misses and fallbacks as well as clean hits.
+
+    python -m benchmarks.ocr_fixtures fixtures/cards --count 40 --degraded 0.25 --seed 7
+    python -m benchmarks.local_ocr fixtures/cards
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+from app.document_validators import AADHAAR_CARD, PAN_CARD, verhoeff_valid
+
+FIRST_NAMES = ("RAVI", "PRIYA", "ANIL", "SUNITA", "VIKRAM", "MEERA", "ARJUN", "KAVITA", "SANJAY", "NEHA", "RAHUL", "POOJA")
+LAST_NAMES = ("KUMAR", "SHARMA", "PATEL", "SINGH", "IYER", "REDDY", "GUPTA", "NAIR", "JOSHI", "DAS", "MEHTA", "RAO")
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# ID-1 card proportions at roughly 300 dpi
+CARD_SIZE = (1012, 638)
+
+
+def random_name(rng: random.Random, last_name: str = "") -> str:
+    return f"{rng.choice(FIRST_NAMES)} {last_name or rng.choice(LAST_NAMES)}"
+
+
+def random_dob(rng: random.Random) -> date:
+    return date(1950, 1, 1) + timedelta(days=rng.randrange(55 * 365))
+
+
+def random_pan(rng: random.Random, last_name: str) -> str:
+    # Fourth letter P for an individual, fifth the first letter of the surname
+    prefix = "".join(rng.choice(LETTERS) for _ in range(3)) + "P" + last_name[0]
+    return f"{prefix}{rng.randrange(10_000):04d}{rng.choice(LETTERS)}"
+
+
+def random_aadhaar(rng: random.Random) -> str:
+    body = str(rng.randrange(2, 10)) + "".join(str(rng.randrange(10)) for _ in range(10))
+    return next(body + str(check) for check in range(10) if verhoeff_valid(body + str(check)))
+
+
+def pan_card(rng: random.Random) -> tuple[list[str], dict]:
+    last_name = rng.choice(LAST_NAMES)
+    expected = {
+        "doc_type": PAN_CARD,
+        "doc_id": random_pan(rng, last_name),
+        "full_name": random_name(rng, last_name),
+        "fathers_name": random_name(rng, last_name),
+        "dob": random_dob(rng).isoformat(),
+    }
+    lines = [
+        "INCOME TAX DEPARTMENT    GOVT. OF INDIA",
+        "Permanent Account Number Card",
+        expected["doc_id"],
+        "Name",
+        expected["full_name"],
+        "Father's Name",
+        expected["fathers_name"],
+        "Date of Birth",
+        date.fromisoformat(expected["dob"]).strftime("%d/%m/%Y"),
+    ]
+    return lines, expected
+
+
+def aadhaar_card(rng: random.Random) -> tuple[list[str], dict]:
+    number = random_aadhaar(rng)
+    expected = {
+        "doc_type": AADHAAR_CARD,
+        "doc_id": number,
+        "full_name": random_name(rng),
+        "dob": random_dob(rng).isoformat(),
+    }
+    lines = [
+        "GOVERNMENT OF INDIA",
+        expected["full_name"],
+        "DOB: " + date.fromisoformat(expected["dob"]).strftime("%d/%m/%Y"),
+        rng.choice(("MALE", "FEMALE")),
+        " ".join(number[i:i + 4] for i in range(0, 12, 4)),
+    ]
+    return lines, expected
+
+
+def render(lines: list[str], font_size: int = 34) -> Image.Image:
+    image = Image.new("RGB", CARD_SIZE, (246, 244, 238))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    line_height = (CARD_SIZE[1] - 80) // len(lines)
+    for index, line in enumerate(lines):
+        draw.text((60, 40 + index * line_height), line, fill=(20, 20, 20), font=font)
+    return image
+
+
+def degrade(image: Image.Image, rng: random.Random) -> Image.Image:
+    image = image.rotate(rng.uniform(-4, 4), expand=True, fillcolor=(200, 200, 200))
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(1.0, 2.5)))
+    # Drawn from rng rather than Image.effect_noise, which the seed does not reach
+    noise = Image.frombytes("L", image.size, rng.randbytes(image.size[0] * image.size[1])).convert("RGB")
+    image = Image.blend(image, noise, rng.uniform(0.1, 0.25))
+    return ImageEnhance.Contrast(image).enhance(rng.uniform(0.4, 0.7))
+
+
+def write_fixtures(directory: str, count: int, degraded: float, seed: int) -> list[Path]:
+    """Write ``count`` cards, alternating PAN and Aadhaar, returns the image paths."""
+    rng = random.Random(seed)
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(count):
+        kind, make = ("pan", pan_card) if index % 2 == 0 else ("aadhaar", aadhaar_card)
+        lines, expected = make(rng)
+        image = render(lines)
+        if rng.random() < degraded:
+            image = degrade(image, rng)
+            kind += "-degraded"
+        path = root / f"{index:03d}-{kind}.png"
+        image.save(path, format="PNG")
+        path.with_suffix(".json").write_text(json.dumps(expected, indent=2) + "\n")
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Where to write the cards and their <card>.json expectations")
+    parser.add_argument("--count", type=int, default=40)
+    parser.add_argument("--degraded", type=float, default=0.25, help="Share of cards degraded like poor photos")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    paths = write_fixtures(args.directory, args.count, args.degraded, args.seed)
+    print(f"Wrote {len(paths)} cards to {args.directory}")
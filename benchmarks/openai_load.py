@@ -0,0 +1,70 @@
+"""
+Load test of OpenAIService against a local chat completions stub.
+
+Every call sleeps for a fixed latency on the stub side (or one drawn from
+--latency, see benchmarks.stubs), so with a non-blocking client the
+throughput of a single worker should grow linearly with concurrency until
+OPENAI_MAX_CONCURRENCY is reached.
+
+    python -m benchmarks.openai_load --latency 0.5 --requests 64 --concurrency 1 4 16 32
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.harness import measure_loop_lag, start_server_thread
+from benchmarks.stubs import TINY_PNG, LatencySpec, StubProfile, StubServices, base_urls
+
+
+async def run_level(service, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await service.extract_document_info(TINY_PNG)
+
+    stop = asyncio.Event()
+    lag: list[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "max_loop_lag_ms": round(max(lag, default=0.0) * 1000, 2)
+    }
+
+
+async def main(args):
+    # The stub runs in its own thread so its work does not show up as loop lag here
+    server, thread = start_server_thread(StubServices(openai=StubProfile(latency=args.latency)).app, args.port)
+
+    from app.config import SETTINGS
+    SETTINGS.OPENAI_KEY = "stub"
+    SETTINGS.OPENAI_BASE_URL = base_urls(args.port)["API_OPENAI_BASE_URL"]
+    SETTINGS.OPENAI_MAX_CONCURRENCY = max(args.concurrency)
+    from app.openai_service import OpenAIService
+
+    service = OpenAIService()
+    try:
+        for concurrency in args.concurrency:
+            print(json.dumps(await run_level(service, args.requests, concurrency)))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=LatencySpec.parse, default=LatencySpec.parse("0.5"),
+                        help="Stub latency per call, seconds or a spec such as lognormal:0.5:0.3")
+    parser.add_argument("--requests", type=int, default=64, help="Calls per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,123 @@
+"""
+Tokens per document and throughput of packed against unpacked OpenAI calls.
+
+Runs --documents extractions with --concurrency callers, first one image per
+call through OpenAIService, then through PackingService for every
+--pack-sizes, and prints one JSON line per mode: docs/s, latency
+percentiles per document, provider calls, fallbacks to single calls and
+prompt and completion tokens per document.
+
+Against the local stub (the default) token counts follow the stub's model,
+500 prompt tokens of instructions plus 300 per image, and its latency does
+not grow with the images in a call, so only the shape of the saving is
+meaningful and docs/s is an upper bound. With --live the calls go to the
+OpenAI API configured in the environment, using the documents in --images:
+
+    python -m benchmarks.packing --documents 64 --concurrency 16 --pack-sizes 2 4 8
+    python -m benchmarks.packing --live --images fixtures/cards --documents 32 --pack-sizes 2 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from benchmarks.harness import start_server_thread, summarize_ms
+from benchmarks.stubs import TINY_PNG, LatencySpec, StubProfile, StubServices, base_urls
+
+
+def counter_total(sample_name: str, **labels) -> float:
+    from prometheus_client import REGISTRY
+
+    return sum(
+        sample.value
+        for metric in REGISTRY.collect()
+        for sample in metric.samples
+        if sample.name == sample_name and all(sample.labels.get(k) == v for k, v in labels.items())
+    )
+
+
+async def run_mode(service, images: list[bytes], args, mode: str, pack_size: int = 1) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    usages: list[dict] = []
+    failures: list[str] = []
+
+    async def one(image: bytes):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await service.extract_document_info(image, detail=args.detail)
+            except Exception as e:
+                failures.append(type(e).__name__)
+                return
+            latencies.append(time.perf_counter() - started)
+            usages.append(result.get("usage") or {})
+
+    calls_before = counter_total("provider_call_duration_seconds_count", provider="openai")
+    fallbacks_before = counter_total("packing_fallbacks_total")
+    started = time.perf_counter()
+    await asyncio.gather(*(one(images[index % len(images)]) for index in range(args.documents)))
+    elapsed = time.perf_counter() - started
+    ok = len(latencies)
+    return {
+        "mode": mode,
+        "pack_size": pack_size,
+        "documents": args.documents,
+        "concurrency": args.concurrency,
+        "ok": ok,
+        "failed": len(failures),
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(ok / elapsed, 2),
+        "latency_ms": summarize_ms(latencies),
+        "provider_calls": int(counter_total("provider_call_duration_seconds_count", provider="openai") - calls_before),
+        "fallbacks": int(counter_total("packing_fallbacks_total") - fallbacks_before),
+        "prompt_tokens_per_doc": round(sum(u.get("prompt_tokens", 0) for u in usages) / ok, 1) if ok else None,
+        "completion_tokens_per_doc": round(sum(u.get("completion_tokens", 0) for u in usages) / ok, 1) if ok else None,
+    }
+
+
+async def main(args):
+    server = thread = None
+    from app.config import SETTINGS, PackingSettings
+    if args.live:
+        images = [path.read_bytes() for path in sorted(Path(args.images).iterdir()) if path.is_file()]
+        if not images:
+            raise SystemExit(f"No documents in {args.images}")
+    else:
+        images = [TINY_PNG]
+        server, thread = start_server_thread(StubServices(openai=StubProfile(latency=args.latency)).app, args.port)
+        SETTINGS.OPENAI_KEY = "stub"
+        SETTINGS.OPENAI_BASE_URL = base_urls(args.port)["API_OPENAI_BASE_URL"]
+    SETTINGS.OPENAI_MAX_CONCURRENCY = max(SETTINGS.OPENAI_MAX_CONCURRENCY, args.concurrency)
+    from app.openai_service import OpenAIService
+    from app.request_packing import PackingService
+
+    service = OpenAIService()
+    try:
+        print(json.dumps(await run_mode(service, images, args, "unpacked")))
+        for size in args.pack_sizes:
+            packer = PackingService(service, PackingSettings(enabled=True, max_images=size, window_seconds=args.window))
+            print(json.dumps(await run_mode(packer, images, args, "packed", size)))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=64, help="Extractions per mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="Callers extracting at the same time")
+    parser.add_argument("--pack-sizes", type=int, nargs="+", default=[2, 4, 8], help="PACKING_MAX_IMAGES values to compare")
+    parser.add_argument("--window", type=float, default=0.05, help="PACKING_WINDOW_SECONDS")
+    parser.add_argument("--detail", choices=["low", "high", "auto"], default="high")
+    parser.add_argument("--latency", type=LatencySpec.parse, default=LatencySpec.parse("lognormal:0.8:0.3"),
+                        help="Stub latency per call, see benchmarks.stubs")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--live", action="store_true", help="Call the OpenAI API configured in the environment")
+    parser.add_argument("--images", help="Directory of documents sent with --live")
+    args = parser.parse_args()
+    if args.live and not args.images:
+        parser.error("--live needs --images")
+    asyncio.run(main(args))
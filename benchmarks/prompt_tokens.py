@@ -0,0 +1,57 @@
+"""
+Offline token counts of the extraction prompt variants.
+
+Counts use tiktoken's o200k_base encoding (the gpt-4o family) when tiktoken
+is installed and fall back to a four-characters-per-token estimate. Image
+tokens are added for a typical card photo after each preprocessing preset.
+
+    python -m benchmarks.prompt_tokens [--requests 100000]
+"""
+import argparse
+import json
+
+from app.config import ImagePreset
+from app.image_preprocessing import estimate_vision_tokens, preset_parameters
+from app.prompts import PROMPT_REGISTRY
+
+# A 12 MP phone photo in landscape orientation
+SOURCE_DIMENSIONS = (4000, 3000)
+
+
+def token_counter():
+    try:
+        import tiktoken
+    except ImportError:
+        return (lambda text: round(len(text) / 4)), "chars/4"
+    encoding = tiktoken.get_encoding("o200k_base")
+    return (lambda text: len(encoding.encode(text))), "o200k_base"
+
+
+def scaled(dimensions: tuple[int, int], long_edge: int) -> tuple[int, int]:
+    scale = min(1.0, long_edge / max(dimensions))
+    return round(dimensions[0] * scale), round(dimensions[1] * scale)
+
+
+def main(args):
+    count_tokens, method = token_counter()
+    for prompt in PROMPT_REGISTRY.values():
+        text_tokens = count_tokens(prompt.text)
+        row = {
+            "variant": prompt.name,
+            "version": prompt.version,
+            "counting": method,
+            "chars": len(prompt.text),
+            "text_tokens": text_tokens,
+            f"text_tokens_per_{args.requests}_requests": text_tokens * args.requests,
+        }
+        for preset in (ImagePreset.FAST, ImagePreset.BALANCED, ImagePreset.QUALITY):
+            long_edge, _ = preset_parameters(preset)
+            row[f"total_tokens_{preset.value}"] = text_tokens + estimate_vision_tokens(*scaled(SOURCE_DIMENSIONS, long_edge))
+        row["total_tokens_unprocessed"] = text_tokens + estimate_vision_tokens(*SOURCE_DIMENSIONS)
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100_000, help="Request volume to extrapolate text tokens to")
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Peak Python heap of concurrent large uploads: per-consumer copies vs RequestBuffer.
+
+Each simulated request archives its document with the JSON transport (base64
+inside ImageBytes) and runs the real extraction path twice, as a hedged or
+escalated request would: preprocess_and_extract with the ``none`` preset,
+through OpenAIService against the provider stub. The stub runs in a child
+process so its allocations are not counted, and the extraction cache is off.
+Every mode keeps the archived body and both results until its request ends:
+
+- copies: each consumer wraps the bytes itself, so the base64 and data URL
+  are made again for the archive and for every call, as before
+- buffer: one RequestBuffer, its base64 and data URL made once and shared
+- budget: the buffer path under an in-flight byte budget of --budget-mb
+
+Peaks are measured with tracemalloc, so only Python allocations count.
+
+    python -m benchmarks.request_memory --size-mb 8 --uploads 16 --budget-mb 128
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import tracemalloc
+
+from app.config import SETTINGS, BufferSettings, ImagePreset
+from app.document import preprocess_and_extract
+from app.extraction_cache import extraction_cache
+from app.openai_service import OpenAIService, close_openai_client
+from app.request_buffer import InFlightBudget, RequestBuffer
+from app.schemas import AIProvider, ImageBytes, InboundDocumentType
+from benchmarks.harness import ChildServer
+from benchmarks.stubs import base_urls
+
+JPEG_MAGIC = b"\xff\xd8\xff\xe0"
+CALLS_PER_REQUEST = 2
+
+
+async def with_copies(service, data: bytes) -> tuple:
+    archived = ImageBytes(
+        image_name="doc.jpeg",
+        image_type=InboundDocumentType.IMAGE,
+        image_bytes=base64.b64encode(data).decode("utf-8")
+    )
+    results = []
+    for _ in range(CALLS_PER_REQUEST):
+        results.append(await preprocess_and_extract(service, AIProvider.OPENAI, RequestBuffer(data), ImagePreset.NONE))
+    return archived, results
+
+
+async def with_buffer(service, data: bytes) -> tuple:
+    image = RequestBuffer(data)
+    archived = ImageBytes(image_name="doc.jpeg", image_type=InboundDocumentType.IMAGE, image_bytes=image.b64)
+    results = []
+    for _ in range(CALLS_PER_REQUEST):
+        results.append(await preprocess_and_extract(service, AIProvider.OPENAI, image, ImagePreset.NONE))
+    return archived, results
+
+
+async def run_mode(mode: str, service, args) -> dict:
+    size = int(args.size_mb * 1024 * 1024)
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=int(args.budget_mb * 1024 * 1024), wait_timeout=600))
+
+    async def one_request():
+        # Fresh random bytes per request, no two requests share a digest
+        data = JPEG_MAGIC + os.urandom(size - len(JPEG_MAGIC))
+        if mode == "copies":
+            await with_copies(service, data)
+        elif mode == "buffer":
+            await with_buffer(service, data)
+        else:
+            async with budget.reserve(size):
+                await with_buffer(service, data)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await asyncio.gather(*(one_request() for _ in range(args.uploads)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": mode,
+        "uploads": args.uploads,
+        "size_mb": args.size_mb,
+        "peak_mb": round(peak / 1024 / 1024, 1),
+        "peak_per_upload_x": round(peak / (size * args.uploads), 2),
+    }
+
+
+async def main(args):
+    SETTINGS.OPENAI_KEY = "stub"
+    SETTINGS.OPENAI_BASE_URL = base_urls(args.port)["API_OPENAI_BASE_URL"]
+    SETTINGS.OPENAI_MAX_CONCURRENCY = max(SETTINGS.OPENAI_MAX_CONCURRENCY, args.uploads)
+
+    # Every call has to reach the provider, a cache hit would hide the second encoding
+    extraction_cache.enabled = False
+    service = OpenAIService()
+    async with ChildServer("benchmarks.stubs", ["--port", str(args.port), "--openai-latency", f"fixed:{args.latency}"]):
+        try:
+            for mode in ("copies", "buffer", "budget"):
+                print(json.dumps(await run_mode(mode, service, args)))
+        finally:
+            await close_openai_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="Provider stub latency in seconds")
+    parser.add_argument("--budget-mb", type=float, default=128)
+    parser.add_argument("--port", type=int, default=8767, help="Port of the provider stub")
+    asyncio.run(main(parser.parse_args()))
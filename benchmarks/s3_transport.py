@@ -0,0 +1,119 @@
+"""
+Bytes on the wire and peak RSS of the archive upload transports.
+
+Runs a local stand-in for the upload service that counts the request body
+bytes it receives, then uploads the same payload with each transport in a
+fresh child process so that peak RSS is measured in isolation:
+
+- json: base64 images in a JSON body (S3Service.upload_to_s3_file_bytes)
+- multipart: streamed multipart to the upload service (upload_files_binary)
+- direct: aioboto3 straight to an S3-compatible store, only with --s3-endpoint
+  (e.g. a local MinIO or `moto_server`)
+
+    python -m benchmarks.s3_transport --size-mb 8 --uploads 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import peak_rss_mb, start_server_thread
+from benchmarks.stubs import JSON_PATH, MULTIPART_PATH, StubServices, base_urls
+
+
+async def run_child(mode: str, port: int, size_mb: float, uploads: int, s3_endpoint: str) -> dict:
+    from app.config import SETTINGS, FILE_UPLOAD_SETTINGS, FileUploadServer, FileUploadTransport
+    SETTINGS.S3_BASE_URL = base_urls(port)["API_S3_BASE_URL"]
+    if mode == "direct":
+        FILE_UPLOAD_SETTINGS.server = FileUploadServer.S3
+        FILE_UPLOAD_SETTINGS.endpoint_url = s3_endpoint
+        FILE_UPLOAD_SETTINGS.bucket = FILE_UPLOAD_SETTINGS.bucket or "benchmark"
+        FILE_UPLOAD_SETTINGS.key_id = FILE_UPLOAD_SETTINGS.key_id or "minioadmin"
+        FILE_UPLOAD_SETTINGS.access_key = FILE_UPLOAD_SETTINGS.access_key or "minioadmin"
+    if mode != "json":
+        FILE_UPLOAD_SETTINGS.transport = FileUploadTransport.BINARY
+
+    import httpx
+    import base64
+    from app.s3_file_service import S3Service, UploadFileSource
+    from app.schemas import User, ProductBytes, ImageBytes, InboundDocumentType
+
+    payload = os.urandom(int(size_mb * 1024 * 1024))
+    baseline_rss = peak_rss_mb()
+    user = User(mobile_no="9999999999")
+    wire_bytes = 0
+
+    # The stub reports the body bytes it received, collect them from every upload response
+    original_send = httpx.AsyncClient.send
+
+    async def counting_send(client, request, **kwargs):
+        nonlocal wire_bytes
+        response = await original_send(client, request, **kwargs)
+        if request.url.path in (JSON_PATH, MULTIPART_PATH):
+            await response.aread()
+            wire_bytes += response.json().get("received_bytes", 0)
+        return response
+
+    httpx.AsyncClient.send = counting_send
+
+    async def upload_one(index: int):
+        file_name = f"bench_{index}.png"
+        if mode == "json":
+            docs = [ProductBytes(product_code="documents", images=[ImageBytes(
+                image_name=file_name,
+                image_type=InboundDocumentType.PNG,
+                image_bytes=base64.b64encode(payload).decode("utf-8")
+            )])]
+            await S3Service().upload_to_s3_file_bytes(user, docs, "benchmark")
+        else:
+            source = UploadFileSource(file_name=file_name, content_type=InboundDocumentType.PNG.value, data=payload)
+            await S3Service().upload_files_binary(user, "documents", [source], "benchmark")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(upload_one(i) for i in range(uploads)))
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "payload_mb": size_mb,
+        "uploads": uploads,
+        "wire_bytes": wire_bytes if mode != "direct" else None,
+        "wire_overhead": round(wire_bytes / (len(payload) * uploads), 3) if mode != "direct" else None,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "upload_rss_mb": round(peak_rss_mb() - baseline_rss, 1),
+        "elapsed_s": round(elapsed, 3)
+    }
+
+
+def main(args):
+    if args.child:
+        print(json.dumps(asyncio.run(run_child(args.child, args.port, args.size_mb, args.uploads, args.s3_endpoint))))
+        return
+
+    server, thread = start_server_thread(StubServices().app, args.port)
+
+    modes = ["json", "multipart"] + (["direct"] if args.s3_endpoint else [])
+    try:
+        for mode in modes:
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.s3_transport", "--child", mode, "--port", str(args.port),
+                 "--size-mb", str(args.size_mb), "--uploads", str(args.uploads), "--s3-endpoint", args.s3_endpoint],
+                capture_output=True, text=True, check=True
+            )
+            print(result.stdout.strip().splitlines()[-1])
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8.0, help="Size of each uploaded file")
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent uploads per transport")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--s3-endpoint", default="", help="S3-compatible endpoint for the direct transport")
+    parser.add_argument("--child", choices=["json", "multipart", "direct"], help=argparse.SUPPRESS)
+    main(parser.parse_args())
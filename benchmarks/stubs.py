@@ -0,0 +1,311 @@
+"""
+Local stand-ins for the AI providers and the S3 upload service.
+
+One app serves every endpoint the service calls out to:
+
+- /openai/v1/chat/completions: OpenAI chat completions
+- /grok/v1/chat/completions: the Grok endpoint
+- /s3/upload/oaas/files/v2 and /s3/upload/oaas/files/multipart: the upload service
+
+Each endpoint has its own StubProfile: a latency distribution, an injected
+error rate and status, and for the providers the size of the completion and
+an optional requests-per-minute limit, enforced with ``x-ratelimit-*``
+headers and 429s like the real APIs. Streaming completions are not stubbed.
+A completion request with several images (request packing) is answered
+with a JSON array of one numbered document per image; usage counts 500
+prompt tokens for the instructions and 300 per image.
+
+Latency specs are ``<kind>:<params>`` in seconds:
+
+- fixed:0.5, or just 0.5
+- uniform:0.2:1.0
+- lognormal:0.8:0.4 (median, sigma)
+- exp:0.5 (mean)
+
+Standalone, e.g. to point a development server at it, the stubs print
+``ready`` once listening and a JSON line of per-endpoint counters when
+stdin is closed:
+
+    python -m benchmarks.stubs --port 8790 --openai-latency lognormal:0.8:0.4 --openai-error-rate 0.01
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from benchmarks.harness import serve_until_stdin_closes
+
+OPENAI_PATH = "/openai/v1/chat/completions"
+GROK_PATH = "/grok/v1/chat/completions"
+JSON_PATH = "/s3/upload/oaas/files/v2"
+MULTIPART_PATH = "/s3/upload/oaas/files/multipart"
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+STUB_DOCUMENT = {
+    "doc_id": "ABCDE1234F",
+    "doc_type": "PAN CARD",
+    "full_name": "STUB USER",
+    "fathers_name": "STUB FATHER",
+    "address": "",
+    "dob": "1990-01-01"
+}
+
+LATENCY_ARITY = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+PRODUCT_CODE_FIELD = re.compile(rb'name="product_code"\r\n\r\n([^\r]*)\r\n')
+IMAGE_PART = re.compile(rb'"type":\s*"image_url"')
+
+
+@dataclass(frozen=True)
+class LatencySpec:
+    kind: str = "fixed"
+    params: tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencySpec":
+        kind, _, rest = spec.partition(":")
+        if not rest and kind.replace(".", "", 1).isdigit():
+            kind, rest = "fixed", kind
+        try:
+            params = tuple(float(part) for part in rest.split(":")) if rest else ()
+        except ValueError:
+            params = ()
+        if LATENCY_ARITY.get(kind) != len(params):
+            raise ValueError(f"Invalid latency spec {spec!r}, expected fixed:S, uniform:LO:HI, lognormal:MEDIAN:SIGMA or exp:MEAN")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma)
+        if self.kind == "exp":
+            return rng.expovariate(1 / self.params[0])
+        return self.params[0]
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{param:g}" for param in self.params)])
+
+
+@dataclass
+class StubProfile:
+    latency: LatencySpec = field(default_factory=LatencySpec)
+    # Share of requests answered with error_status instead of a result
+    error_rate: float = 0.0
+    error_status: int = 500
+    # Padding in the extracted address, to vary the size of the completion
+    completion_bytes: int = 0
+    # Requests per minute before the stub answers 429, 0 for no limit
+    rpm: int = 0
+
+    def describe(self) -> dict:
+        return {
+            "latency": str(self.latency),
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "completion_bytes": self.completion_bytes,
+            "rpm": self.rpm,
+        }
+
+
+def error_response(status: int, message: str, headers: dict) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": "stub_error", "code": None}}, status_code=status, headers=headers)
+
+
+class StubEndpoint:
+    """One stubbed route: applies its profile and counts what it received."""
+
+    def __init__(self, profile: StubProfile, rng: random.Random, respond: Callable[[bytes], dict]):
+        self.profile = profile
+        self.rng = rng
+        self.respond = respond
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "received_bytes": 0}
+        self._window = 0
+        self._window_count = 0
+
+    def _rate_limit(self) -> tuple[bool, dict]:
+        rpm = self.profile.rpm
+        if not rpm:
+            return False, {}
+        now = time.time()
+        window = int(now // 60)
+        if window != self._window:
+            self._window, self._window_count = window, 0
+        limited = self._window_count >= rpm
+        if not limited:
+            self._window_count += 1
+        reset = 60 - now % 60
+        headers = {
+            "x-ratelimit-limit-requests": str(rpm),
+            "x-ratelimit-remaining-requests": str(rpm - self._window_count),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+        if limited:
+            headers["retry-after"] = str(math.ceil(reset))
+        return limited, headers
+
+    async def handle(self, request: Request) -> Response:
+        body = await request.body()
+        self.stats["requests"] += 1
+        self.stats["received_bytes"] += len(body)
+        limited, headers = self._rate_limit()
+        if limited:
+            # Rate limits are answered straight away, like the real APIs
+            self.stats["throttled"] += 1
+            return error_response(429, "Rate limit reached for requests", headers)
+        await asyncio.sleep(self.profile.latency.sample(self.rng))
+        if self.rng.random() < self.profile.error_rate:
+            self.stats["errors"] += 1
+            if self.profile.error_status == 429:
+                headers["retry-after"] = "1"
+            return error_response(self.profile.error_status, "Injected stub error", headers)
+        return JSONResponse(self.respond(body), headers=headers)
+
+
+def chat_completion(model: str, profile: StubProfile) -> Callable[[bytes], dict]:
+    document = dict(STUB_DOCUMENT, address="X" * profile.completion_bytes)
+    document_tokens = 60 + profile.completion_bytes // 4
+
+    def respond(body: bytes) -> dict:
+        images = max(1, len(IMAGE_PART.findall(body)))
+        if images == 1:
+            content = json.dumps(document)
+        else:
+            content = json.dumps([dict(document, image=number) for number in range(1, images + 1)])
+        prompt_tokens = 500 + 300 * images
+        completion_tokens = document_tokens * images
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    return respond
+
+
+def upload_result(body: bytes) -> dict:
+    if body.startswith(b"{"):
+        products = json.loads(body).get("products", [])
+        counts = {product["product_code"]: len(product.get("images", [])) for product in products}
+    else:
+        match = PRODUCT_CODE_FIELD.search(body)
+        counts = {match.group(1).decode() if match else "documents": body.count(b'name="files"')}
+    return {
+        "s3_urls": {code: [f"http://stub/{code}/{index}" for index in range(count)] for code, count in counts.items()},
+        "received_bytes": len(body)
+    }
+
+
+class StubServices:
+    """The stubbed endpoints with their profiles and counters."""
+
+    def __init__(
+        self,
+        openai: Optional[StubProfile] = None,
+        grok: Optional[StubProfile] = None,
+        s3: Optional[StubProfile] = None,
+        seed: Optional[int] = None
+    ):
+        rng = random.Random(seed)
+        self.profiles = {"openai": openai or StubProfile(), "grok": grok or StubProfile(), "s3": s3 or StubProfile()}
+        upload = StubEndpoint(self.profiles["s3"], rng, upload_result)
+        self.endpoints = {
+            "openai": StubEndpoint(self.profiles["openai"], rng, chat_completion("gpt-4o-mini", self.profiles["openai"])),
+            "grok": StubEndpoint(self.profiles["grok"], rng, chat_completion("grok-1", self.profiles["grok"])),
+            "s3": upload,
+        }
+        self.app = Starlette(routes=[
+            # Bound methods, Starlette serves any other callable as a raw ASGI app
+            Route(OPENAI_PATH, self.endpoints["openai"].handle, methods=["POST"]),
+            Route(GROK_PATH, self.endpoints["grok"].handle, methods=["POST"]),
+            Route(JSON_PATH, upload.handle, methods=["POST"]),
+            Route(MULTIPART_PATH, upload.handle, methods=["POST"]),
+        ])
+
+    def stats(self) -> dict:
+        return {name: dict(endpoint.stats) for name, endpoint in self.endpoints.items()}
+
+
+def base_urls(port: int) -> dict[str, str]:
+    """Settings that point the service at stubs listening on ``port``."""
+    root = f"http://127.0.0.1:{port}"
+    return {
+        "API_OPENAI_BASE_URL": f"{root}/openai/v1",
+        "API_GROK_BASE_URL": f"{root}/grok/v1",
+        "API_S3_BASE_URL": root,
+    }
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    for name, latency in (("openai", "lognormal:0.8:0.3"), ("grok", "lognormal:1.0:0.3"), ("s3", "lognormal:0.05:0.5")):
+        parser.add_argument(f"--{name}-latency", type=LatencySpec.parse, default=LatencySpec.parse(latency), metavar="SPEC")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{name}-error-status", type=int, default=500)
+        if name != "s3":
+            parser.add_argument(f"--{name}-rpm", type=int, default=0, help="Requests per minute before 429s, 0 for none")
+    parser.add_argument("--completion-bytes", type=int, default=0, help="Padding in each stub completion")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def stub_arguments(args: argparse.Namespace) -> list[str]:
+    """Command line that rebuilds the stub options of ``args`` for a child process."""
+    argv = ["--completion-bytes", str(args.completion_bytes)]
+    for name in ("openai", "grok", "s3"):
+        argv += [
+            f"--{name}-latency", str(getattr(args, f"{name}_latency")),
+            f"--{name}-error-rate", str(getattr(args, f"{name}_error_rate")),
+            f"--{name}-error-status", str(getattr(args, f"{name}_error_status")),
+        ]
+        if name != "s3":
+            argv += [f"--{name}-rpm", str(getattr(args, f"{name}_rpm"))]
+    if args.seed is not None:
+        argv += ["--seed", str(args.seed)]
+    return argv
+
+
+def services_from_arguments(args: argparse.Namespace) -> StubServices:
+    def profile(name: str) -> StubProfile:
+        return StubProfile(
+            latency=getattr(args, f"{name}_latency"),
+            error_rate=getattr(args, f"{name}_error_rate"),
+            error_status=getattr(args, f"{name}_error_status"),
+            completion_bytes=args.completion_bytes if name != "s3" else 0,
+            rpm=getattr(args, f"{name}_rpm", 0),
+        )
+
+    return StubServices(openai=profile("openai"), grok=profile("grok"), s3=profile("s3"), seed=args.seed)
+
+
+async def main(args):
+    services = services_from_arguments(args)
+    await serve_until_stdin_closes(services.app, args.port)
+    print(json.dumps(services.stats()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8790)
+    add_stub_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,158 @@
+"""
+Per-request tracing overhead and import time of each tracing setting.
+
+Every setting runs in a fresh process with its TRACING_* variables. The
+process times `import app.tracing`, then replays the spans, attributes and
+events of one /extract request (request root, auth, preprocessing, cache,
+admission, provider call, S3 upload) --iterations times into an exporter
+that only counts what it receives. --failure-rate of the requests are
+marked as failed, which the tail setting keeps whatever its ratio.
+
+A last line times the imports the previous module always made (the SDK,
+the OTLP exporter and the Tortoise, Redis and httpx instrumentors), for
+comparison with import_ms.
+
+    python -m benchmarks.tracing_overhead [--iterations 20000] [--failure-rate 0.01]
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+SETTINGS = {
+    "disabled": {"TRACING_ENABLED": "false"},
+    "ratio_1_verbose": {"TRACING_SAMPLE_RATIO": "1.0", "TRACING_LEVEL": "verbose"},
+    "ratio_1_standard": {"TRACING_SAMPLE_RATIO": "1.0", "TRACING_LEVEL": "standard"},
+    "ratio_1_minimal": {"TRACING_SAMPLE_RATIO": "1.0", "TRACING_LEVEL": "minimal"},
+    "ratio_0.1_verbose": {"TRACING_SAMPLE_RATIO": "0.1", "TRACING_LEVEL": "verbose"},
+    "ratio_0.1_standard": {"TRACING_SAMPLE_RATIO": "0.1", "TRACING_LEVEL": "standard"},
+    "tail_0.01_standard": {"TRACING_SAMPLE_RATIO": "0.01", "TRACING_TAIL_KEEP": "true", "TRACING_LEVEL": "standard"},
+}
+
+LEGACY_IMPORTS = (
+    "opentelemetry.sdk.trace",
+    "opentelemetry.exporter.otlp.proto.http.trace_exporter",
+    "opentelemetry.instrumentation.tortoiseorm",
+    "opentelemetry.instrumentation.redis",
+    "opentelemetry.instrumentation.httpx",
+)
+
+
+def simulate_request(tracer, level, failed: bool):
+    with tracer.start_as_current_span("extract_document_info", level=level.MINIMAL) as span:
+        span.set_attribute("component", "document_extraction")
+        span.add_event("Start processing request")
+        span.add_event("Uploaded file provided")
+        span.set_attribute("file.size", 183_422)
+        with tracer.start_as_current_span("get_request_param", attributes={"token.fingerprint": "3f2a9c81d0e4", "request_id": "bench"}) as auth:
+            auth.set_attribute("auth.cache_hit", True)
+        span.add_event("Service selected", {"provider": "openai"})
+        with tracer.start_as_current_span("preprocess_image") as preprocess:
+            preprocess.set_attribute("image.preset", "balanced")
+            preprocess.set_attribute("image.source_format", "jpeg")
+        with tracer.start_as_current_span("extraction_cache") as cache:
+            cache.set_attribute("cache.hit", False)
+            with tracer.start_as_current_span("admission_wait") as admission:
+                admission.set_attribute("admission.provider", "openai")
+                admission.set_attribute("admission.queue_depth", 0)
+            with tracer.start_as_current_span("extract_document_info_openai", level=level.MINIMAL) as call:
+                call.set_attribute("openai.model", "gpt-4o-mini")
+                call.set_attribute("openai.detail", "high")
+                call.set_attribute("usage.prompt_tokens", 812)
+                call.set_attribute("usage.completion_tokens", 64)
+        with tracer.start_as_current_span("upload_to_s3") as upload:
+            upload.set_attribute("s3.files", 1)
+        span.add_event("Scheduled S3 upload and document extraction tasks")
+        span.add_event("Completed asynchronous tasks", {"s3_url": "https://bucket.s3.amazonaws.com/documents/doc.png"})
+        span.add_event("Converted extraction result to DocumentInfo model")
+        span.set_attribute("time_taken", 2.41)
+        span.add_event("Completed processing", {"duration": 2.41})
+        if failed:
+            span.set_attribute("error", True)
+
+
+def run_child(name: str, args) -> dict:
+    import app.config  # noqa: F401, settings are not part of the tracing import cost
+
+    started = time.perf_counter()
+    from app import tracing
+    import_ms = (time.perf_counter() - started) * 1000
+
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+    from app.config import TracingLevel
+
+    class CountingExporter(SpanExporter):
+        def __init__(self):
+            self.spans = 0
+            self.traces: set[int] = set()
+
+        def export(self, spans):
+            self.spans += len(spans)
+            self.traces.update(span.context.trace_id for span in spans)
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            pass
+
+    exporter = CountingExporter()
+    tracing.add_span_exporter(exporter)
+    rng = random.Random(0)
+    failures = [rng.random() < args.failure_rate for _ in range(args.iterations)]
+
+    for failed in failures[:1000]:
+        simulate_request(tracing.tracer, TracingLevel, failed)
+    started = time.perf_counter()
+    for failed in failures:
+        simulate_request(tracing.tracer, TracingLevel, failed)
+    elapsed = time.perf_counter() - started
+    if tracing.provider is not None:
+        tracing.provider.force_flush()
+
+    return {
+        "setting": name,
+        "iterations": args.iterations,
+        "import_ms": round(import_ms, 1),
+        "us_per_request": round(elapsed / args.iterations * 1e6, 2),
+        "exported_traces": len(exporter.traces),
+        "exported_spans": exporter.spans,
+    }
+
+
+def legacy_imports() -> dict:
+    started = time.perf_counter()
+    for module in LEGACY_IMPORTS:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    return {"setting": "legacy_imports", "import_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def main(args):
+    if args.child == "legacy_imports":
+        print(json.dumps(legacy_imports()))
+        return
+    if args.child:
+        print(json.dumps(run_child(args.child, args)))
+        return
+
+    for name in [*SETTINGS, "legacy_imports"]:
+        env = {**os.environ, "TRACING_EXPORTER": "none", **SETTINGS.get(name, {})}
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.tracing_overhead", "--child", name,
+             "--iterations", str(args.iterations), "--failure-rate", str(args.failure_rate)],
+            capture_output=True, text=True, check=True, env=env
+        )
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+import asyncio
+import io
+import os
+
+# Settings are read when the app modules are first imported
+os.environ.setdefault("TRACING_EXPORTER", "none")
+# Tests that exercise the cache build their own, the shared one would leak results between tests
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+import pytest
+
+
+def make_png(width: int = 64, height: int = 64, color: str = "white") -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def png_bytes() -> bytes:
+    return make_png()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient for the app without auth, archiving or background workers."""
+    from fastapi.testclient import TestClient
+    from app import document
+    from app.archive_spool import ArchiveReceipt
+    from app.auth import get_current_user
+    from app.main import app
+    from app.schemas import Trace
+
+    async def upload_archive(image, file_name, user, tenant):
+        return ArchiveReceipt(archive_id=None, url=f"https://archive.test/{file_name}")
+
+    monkeypatch.setattr(document, "_upload_archive", upload_archive)
+    app.dependency_overrides[get_current_user] = lambda: Trace(request_id="test", device_id="test")
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def use_service(monkeypatch):
+    """Serve a provider from the given service instead of a real client."""
+    from app.service_factory import ServiceFactory
+
+    def use(provider, service):
+        monkeypatch.setitem(ServiceFactory._services, provider, service)
+
+    return use
+
+
+PAN_RESULT = {
+    "doc_id": "ABCDE1234F",
+    "doc_type": "PAN CARD",
+    "full_name": "RAVI KUMAR",
+    "fathers_name": "SURESH KUMAR",
+    "address": "",
+    "dob": "1990-08-15",
+}
+
+
+def stub_service(result: dict = PAN_RESULT, model: str = "stub", deltas: tuple[str, ...] = ()):
+    """Provider stand-in answering every extraction with ``result`` and streaming ``deltas``."""
+    from app.base_service import AIServiceBase
+
+    class StubService(AIServiceBase):
+        def __init__(self):
+            self.model = model
+            self.calls = 0
+            self.streams = 0
+
+        async def extract_document_info(self, image_bytes) -> dict:
+            self.calls += 1
+            return {**result, "file_type": "png", "usage": {"prompt_tokens": 100, "completion_tokens": 10}}
+
+        async def stream_document_info(self, image_bytes):
+            self.streams += 1
+            if not deltas:
+                async for delta in super().stream_document_info(image_bytes):
+                    yield delta
+                return
+            for delta in deltas:
+                await asyncio.sleep(0.001)
+                yield delta
+
+    return StubService()
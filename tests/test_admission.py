@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import admission as admission_module
+from app.admission import AdmissionController, TokenBucket, parse_duration, retry_after_seconds
+from app.config import AdmissionSettings
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("20ms", 0.02),
+    ("1.5s", 1.5),
+    ("6m0s", 360.0),
+    ("1h2m", 3720.0),
+    ("7", 7.0),
+    ("soon", None),
+    (None, None),
+])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert retry_after_seconds({}) is None
+
+
+def test_token_bucket_refills_up_to_one_minute(clock):
+    bucket = TokenBucket(per_minute=600)
+    bucket.take(600)
+    assert bucket.delay(10) == pytest.approx(1.0)
+
+    clock[0] += 1
+    assert bucket.delay(10) == 0
+    assert bucket.level == pytest.approx(10)
+    clock[0] += 3600
+    bucket.delay(1)
+    assert bucket.level == 600
+
+
+def test_token_bucket_debt_and_pause(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(120)
+    # 60 tokens of debt, plus one to cover the request
+    assert bucket.delay(1) == pytest.approx(61)
+    bucket.pause(100)
+    assert bucket.delay(1) == pytest.approx(100)
+
+
+def test_unknown_rate_never_throttles(clock):
+    bucket = TokenBucket(per_minute=0)
+    bucket.take(10_000)
+    assert bucket.delay(10_000) == 0
+    bucket.sync(limit=100, remaining=5)
+    assert (bucket.per_minute, bucket.level) == (100, 5)
+
+
+def test_admission_rejects_when_the_queue_is_full():
+    controller = AdmissionController("test", AdmissionSettings(max_queue=0))
+
+    async def run():
+        async with controller.admit(100):
+            pass
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+
+def test_admission_rejects_calls_that_would_miss_the_deadline():
+    controller = AdmissionController("test", AdmissionSettings(rpm={"test": 1}, queue_timeout=5))
+
+    async def run():
+        async with controller.admit(100):
+            pass
+        # The only request this minute is spent, the next one is 60s away
+        async with controller.admit(100):
+            pass
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "60"
+    assert controller.waiting == 0
+    assert controller.semaphore._value == controller.max_concurrency
+
+
+def test_admission_settles_tokens_and_follows_headers():
+    controller = AdmissionController("test", AdmissionSettings(tpm={"test": 10_000}))
+
+    async def run():
+        async with controller.admit(2_000) as admission:
+            assert controller.tokens.level == pytest.approx(8_000, abs=1)
+            admission.update({"x-ratelimit-limit-tokens": "50000", "x-ratelimit-remaining-tokens": "7000"}, used_tokens=1_500)
+
+    asyncio.run(run())
+    assert controller.tokens.per_minute == 50_000
+    # The provider's 7000 remaining, minus the 500 the call cost less than reserved, given back
+    assert controller.tokens.level == pytest.approx(7_500, abs=5)
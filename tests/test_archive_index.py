@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app import document
+from app.archive_index import ArchiveIndex, archive_file_name, archive_format
+from app.archive_spool import ArchiveReceipt
+from app.config import ArchiveSettings
+from app.request_buffer import RequestBuffer
+from app.schemas import InboundDocumentType, User
+from tests.conftest import make_png
+
+CARD = RequestBuffer(make_png())
+USER = User(mobile_no="9999999999")
+
+
+@pytest.fixture
+def uploads(monkeypatch) -> list[str]:
+    """Archive into a fresh index, recording the name of every upload."""
+    uploads: list[str] = []
+
+    async def upload_archive(image, file_name, user, tenant):
+        uploads.append(file_name)
+        await asyncio.sleep(0.01)
+        return ArchiveReceipt(archive_id=None, url=f"https://archive.test/{file_name}")
+
+    monkeypatch.setattr(document, "_upload_archive", upload_archive)
+    monkeypatch.setattr(document, "archive_index", ArchiveIndex(ArchiveSettings(dedup_enabled=True, index_redis_url="")))
+    return uploads
+
+
+def test_archive_names_follow_the_content():
+    assert archive_file_name(CARD) == f"{CARD.digest}.png"
+    assert archive_format(RequestBuffer(b"\xff\xd8\xff\xe0" + b"\0" * 16)) == ("jpg", InboundDocumentType.IMAGE)
+    assert archive_format(RequestBuffer(b"%PDF-1.7" + b"\0" * 16)) == ("pdf", InboundDocumentType.PDF)
+    assert archive_format(RequestBuffer(b"not a document")) == ("bin", InboundDocumentType.BINARY)
+
+
+def test_index_key_is_scoped_to_tenant_and_user():
+    keys = {
+        ArchiveIndex.make_key(CARD, USER, "a"),
+        ArchiveIndex.make_key(CARD, USER, "b"),
+        ArchiveIndex.make_key(CARD, User(mobile_no="8888888888"), "a"),
+    }
+    assert len(keys) == 3
+
+
+def test_duplicates_are_not_uploaded_again(uploads):
+    async def run():
+        first = await document._archive(CARD, archive_file_name(CARD), USER, "tenant")
+        second = await document._archive(CARD, archive_file_name(CARD), USER, "tenant")
+        other_tenant = await document._archive(CARD, archive_file_name(CARD), USER, "other")
+        return first, second, other_tenant
+
+    first, second, other_tenant = asyncio.run(run())
+    assert first == second == other_tenant
+    assert uploads == [archive_file_name(CARD)] * 2
+
+
+def test_concurrent_archives_share_one_upload(uploads):
+    async def run():
+        return await asyncio.gather(*(document._archive(CARD, archive_file_name(CARD), USER, "tenant") for _ in range(4)))
+
+    receipts = asyncio.run(run())
+    assert len(uploads) == 1
+    assert all(receipt == receipts[0] for receipt in receipts)
+
+
+def test_failed_uploads_are_not_indexed(monkeypatch):
+    attempts = 0
+
+    async def upload_archive(image, file_name, user, tenant):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("S3 unavailable")
+        return ArchiveReceipt(archive_id="spooled", url=None)
+
+    monkeypatch.setattr(document, "_upload_archive", upload_archive)
+    monkeypatch.setattr(document, "archive_index", ArchiveIndex(ArchiveSettings(dedup_enabled=True, index_redis_url="")))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(document._archive(CARD, archive_file_name(CARD), USER, "tenant"))
+    assert asyncio.run(document._archive(CARD, archive_file_name(CARD), USER, "tenant")).archive_id == "spooled"
+    assert attempts == 2
+
+
+def test_empty_receipts_are_not_indexed():
+    index = ArchiveIndex(ArchiveSettings(dedup_enabled=True, index_redis_url=""))
+    key = ArchiveIndex.make_key(CARD, USER, "tenant")
+
+    asyncio.run(index.set(key, ArchiveReceipt(archive_id=None, url=None)))
+    assert asyncio.run(index.get(key)) is None
@@ -0,0 +1,111 @@
+import asyncio
+import base64
+import os
+import time
+
+import pytest
+
+from app import archive_spool as spool_module
+from app.archive_spool import ArchiveSpool
+from app.config import ArchiveSettings
+from app.schemas import InboundDocumentType, User
+
+USER = User(mobile_no="9999999999")
+
+
+class FakeS3:
+    """S3Service stand-in recording each JSON upload, failing while ``failing`` is set."""
+
+    uploads: list[tuple[str, list[bytes]]] = []
+    failing = False
+
+    async def upload_to_s3_file_bytes(self, user, docs, tenant):
+        if FakeS3.failing:
+            raise RuntimeError("upload service unavailable")
+        FakeS3.uploads.append((tenant, [base64.b64decode(image.image_bytes) for image in docs[0].images]))
+        return {}
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch) -> ArchiveSpool:
+    FakeS3.uploads = []
+    FakeS3.failing = False
+    monkeypatch.setattr(spool_module, "S3Service", FakeS3)
+    settings = ArchiveSettings(spool_dir=str(tmp_path / "spool"), url_template="https://cdn.test/{tenant}/{file_name}", retry_base=10)
+    return ArchiveSpool(settings)
+
+
+def submit(spool: ArchiveSpool, data: bytes, tenant: str = "tenant", file_name: str = "card.png"):
+    return asyncio.run(spool.submit(data, file_name, InboundDocumentType.PNG, USER, tenant))
+
+
+def test_submit_persists_the_entry_and_returns_its_future_url(spool):
+    receipt = submit(spool, b"card")
+
+    assert receipt.url == "https://cdn.test/tenant/card.png"
+    assert (spool.directory / f"{receipt.archive_id}.bin").read_bytes() == b"card"
+    assert (spool.directory / f"{receipt.archive_id}.json").exists()
+    assert spool.depth() == 1
+
+
+def test_drain_uploads_once_per_user_and_tenant(spool):
+    submit(spool, b"a", "one")
+    submit(spool, b"b", "one")
+    submit(spool, b"c", "two")
+
+    assert asyncio.run(spool.drain_once()) == 3
+    assert sorted((tenant, sorted(images)) for tenant, images in FakeS3.uploads) == [("one", [b"a", b"b"]), ("two", [b"c"])]
+    assert spool.depth() == 0
+    assert list(spool.directory.iterdir()) == []
+    assert asyncio.run(spool.drain_once()) == 0
+
+
+def test_failed_uploads_are_retried_after_a_backoff(spool):
+    receipt = submit(spool, b"card")
+    FakeS3.failing = True
+
+    assert asyncio.run(spool.drain_once()) == 1
+    assert spool.depth() == 1
+    entry = spool_module.SpoolEntry.model_validate_json((spool.directory / f"{receipt.archive_id}.json").read_bytes())
+    assert (entry.attempts, entry.last_error) == (1, "upload service unavailable")
+    assert entry.next_attempt_at > time.time() + 5
+
+    # Not due yet
+    FakeS3.failing = False
+    assert asyncio.run(spool.drain_once()) == 0
+
+
+def test_stale_claims_are_released(spool):
+    receipt = submit(spool, b"card")
+    [entry] = spool._claim_due(10)
+    assert spool._claim_due(10) == []
+
+    claim_path = spool.directory / f"{entry.archive_id}.claimed"
+    stale = time.time() - spool.settings.lease_timeout - 1
+    os.utime(claim_path, (stale, stale))
+    assert [entry.archive_id for entry in spool._claim_due(10)] == [receipt.archive_id]
+
+
+def test_spool_is_opt_in(monkeypatch):
+    # Spooled responses carry no S3 URL unless a template is configured, so inline uploads stay the default
+    monkeypatch.delenv("ARCHIVE_SPOOL_ENABLED", raising=False)
+    assert not ArchiveSettings().spool_enabled
+
+
+def test_entries_are_dead_lettered_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool_module, "S3Service", FakeS3)
+    monkeypatch.setattr(FakeS3, "failing", True)
+    spool = ArchiveSpool(ArchiveSettings(spool_dir=str(tmp_path / "spool"), retry_base=0, max_attempts=2))
+    receipt = submit(spool, b"card")
+
+    assert asyncio.run(spool.drain_once()) == 1
+    assert spool.depth() == 1
+    assert asyncio.run(spool.drain_once()) == 1
+    assert spool.depth() == 0
+    assert asyncio.run(spool.drain_once()) == 0
+
+    dead = spool.dead_letter_directory
+    assert (dead / f"{receipt.archive_id}.bin").read_bytes() == b"card"
+    entry = spool_module.SpoolEntry.model_validate_json((dead / f"{receipt.archive_id}.json").read_bytes())
+    assert (entry.attempts, entry.last_error) == (2, "upload service unavailable")
+    assert sorted(path.name for path in spool.directory.iterdir()) == ["dead"]
@@ -0,0 +1,86 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth
+from app.auth import VerifiedTokenCache, get_current_user, token_digest
+from app.config import SETTINGS, AuthSettings
+
+# Payloads of the tokens the decoder below accepts
+TOKENS = {
+    "valid": {"sub": "ocr"},
+    "other-service": {"sub": "someone-else"},
+}
+
+
+@pytest.fixture
+def decodes(monkeypatch) -> list[str]:
+    """Verify tokens against TOKENS with a fresh cache, recording every decoded token."""
+    monkeypatch.setattr(SETTINGS, "SERVICE_ID", "ocr")
+    monkeypatch.setattr(auth, "verified_tokens", VerifiedTokenCache(AuthSettings()))
+    decodes: list[str] = []
+
+    def decode(token, key, algorithms):
+        decodes.append(token)
+        if token not in TOKENS:
+            raise ValueError("Invalid token")
+        return {**TOKENS[token], "exp": time.time() + 600}
+
+    monkeypatch.setattr(auth, "jwt", SimpleNamespace(decode=decode))
+    return decodes
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/whoami")
+    async def whoami(trace=Depends(get_current_user)):
+        return trace
+
+    return TestClient(app)
+
+
+def call(client: TestClient, token: str):
+    return client.get("/whoami", headers={"Authorization": f"Bearer {token}", "x-request-id": "r", "x-device-id": "d"})
+
+
+def test_verified_tokens_are_not_decoded_again(client, decodes):
+    assert call(client, "valid").status_code == 200
+    assert call(client, "valid").status_code == 200
+    assert decodes == ["valid"]
+
+
+@pytest.mark.parametrize("token", ["other-service", "not-a-jwt"])
+def test_invalid_tokens_are_rejected_every_time(client, decodes, token):
+    assert call(client, token).status_code == 401
+    assert call(client, token).status_code == 401
+    assert len(decodes) == 2
+
+
+def test_cache_entries_end_at_the_token_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    cache = VerifiedTokenCache(AuthSettings(token_cache_ttl=3600))
+
+    cache.set("short", exp=1010)
+    cache.set("long", exp=None)
+    now[0] += 11
+    assert not cache.get("short")
+    assert cache.get("long")
+    now[0] += 3600
+    assert not cache.get("long")
+
+
+def test_cache_is_bounded():
+    cache = VerifiedTokenCache(AuthSettings(token_cache_size=2))
+    for digest in ("a", "b", "c"):
+        cache.set(digest, exp=None)
+    assert [cache.get(digest) for digest in ("a", "b", "c")] == [False, True, True]
+
+    disabled = VerifiedTokenCache(AuthSettings(token_cache_size=0))
+    disabled.set(token_digest("token"), exp=None)
+    assert not disabled.get(token_digest("token"))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import backfill
+from app.backfill import JsonlOutput, ParquetOutput, read_manifest
+from app.schemas import AIProvider
+from tests.conftest import PAN_RESULT, make_png, stub_service
+
+
+@pytest.fixture
+def documents(tmp_path) -> list[str]:
+    paths = []
+    for color in ("white", "black", "red"):
+        path = tmp_path / f"{color}.png"
+        path.write_bytes(make_png(color=color))
+        paths.append(str(path))
+    return paths
+
+
+def run_backfill(tmp_path, sources: list[str], **options) -> list[dict]:
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("\n".join(sources) + "\n", encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    args = SimpleNamespace(
+        manifest=str(manifest), output=str(output), format="jsonl", rows_per_file=10, provider="openai",
+        preset="none", concurrency=2, rpm=0, retries=1, retry_errors=False, progress_interval=60.0
+    )
+    for name, value in options.items():
+        setattr(args, name, value)
+    asyncio.run(backfill.main(args))
+    return [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(
+        "# re-extract after the prompt change\n"
+        "cards/a.png\n"
+        "\n"
+        '{"source": "https://files.test/b.png", "id": "customer-7"}\n'
+        "archive:tenant/9999999999/c.png\n",
+        encoding="utf-8"
+    )
+    assert [(entry.id, entry.source) for entry in read_manifest(str(manifest))] == [
+        ("cards/a.png", "cards/a.png"),
+        ("customer-7", "https://files.test/b.png"),
+        ("archive:tenant/9999999999/c.png", "archive:tenant/9999999999/c.png"),
+    ]
+
+
+def test_output_survives_a_torn_last_record(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "a", "status": "er', encoding="utf-8")
+    output = JsonlOutput(str(path))
+    assert output.completed() == {"a": "ok", "b": "error"}
+
+    output.open()
+    output.write({"id": "c", "status": "ok"})
+    output.close()
+    assert output.completed() == {"a": "ok", "b": "error", "c": "ok"}
+
+
+def test_parquet_parts_resume_from_their_statuses(tmp_path):
+    pytest.importorskip("pyarrow")
+    output = ParquetOutput(str(tmp_path / "results"), rows_per_file=2)
+    output.open()
+    for id, status in (("a", "ok"), ("b", "error"), ("c", "ok")):
+        output.write({"id": id, "status": status, "result": {"doc_id": id} if status == "ok" else None})
+    output.close()
+
+    assert [part.name for part in output._parts()] == ["part-00000.parquet", "part-00001.parquet"]
+    assert output.completed() == {"a": "ok", "b": "error", "c": "ok"}
+
+
+def test_rerun_skips_finished_documents(tmp_path, documents, use_service):
+    service = stub_service()
+    use_service(AIProvider.OPENAI, service)
+
+    records = run_backfill(tmp_path, documents + [str(tmp_path / "missing.png")])
+    statuses = {record["id"]: record["status"] for record in records}
+    assert statuses == {**dict.fromkeys(documents, "ok"), str(tmp_path / "missing.png"): "error"}
+    ok = next(record for record in records if record["status"] == "ok")
+    assert ok["result"]["doc_id"] == PAN_RESULT["doc_id"]
+    assert ok["usage"] == {"prompt_tokens": 100, "completion_tokens": 10}
+    assert service.calls == 3
+
+    assert len(run_backfill(tmp_path, documents + [str(tmp_path / "missing.png")])) == 4
+    assert service.calls == 3
+    # Only the failed document runs again
+    assert len(run_backfill(tmp_path, documents + [str(tmp_path / "missing.png")], retry_errors=True)) == 5
+    assert service.calls == 3
+
+
+def test_provider_failures_are_retried(tmp_path, documents, use_service):
+    service = stub_service()
+    original = service.extract_document_info
+    failures = []
+
+    async def flaky(image_bytes):
+        if not failures:
+            failures.append(True)
+            raise HTTPException(status_code=503, detail="overloaded", headers={"Retry-After-Ms": "1"})
+        return await original(image_bytes)
+
+    service.extract_document_info = flaky
+    use_service(AIProvider.OPENAI, service)
+
+    records = run_backfill(tmp_path, documents[:1])
+    assert [record["status"] for record in records] == ["ok"]
+    assert failures == [True]
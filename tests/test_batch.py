@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from app.config import SETTINGS
+from app.schemas import AIProvider
+from tests.conftest import PAN_RESULT, make_png, stub_service
+
+FORM = {"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"}
+COLORS = ("white", "black", "red", "blue", "green", "yellow")
+
+
+def post_batch(client, files: list[tuple[str, bytes]], **data):
+    return client.post(
+        "/api/v1/documents/extract/batch",
+        files=[("files", (name, content, "image/png")) for name, content in files],
+        data={**FORM, **data},
+    )
+
+
+def test_batch_needs_documents(client):
+    assert post_batch(client, []).status_code == 400
+
+
+def test_batch_caps_the_number_of_documents(client, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "BATCH_MAX_ITEMS", 2)
+    response = post_batch(client, [(f"{n}.png", make_png()) for n in range(3)])
+
+    assert response.status_code == 400
+
+
+def test_batch_runs_items_under_the_concurrency_cap(client, use_service):
+    service = stub_service()
+    original = service.extract_document_info
+    running = peak = 0
+
+    async def extract(image_bytes):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return await original(image_bytes)
+
+    service.extract_document_info = extract
+    use_service(AIProvider.OPENAI, service)
+    # Different images, identical ones would share one extraction
+    response = post_batch(client, [(f"{color}.png", make_png(color=color)) for color in COLORS], concurrency="2")
+
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(item["index"] for item in items) == list(range(len(COLORS)))
+    assert all(item["success"] for item in items)
+    assert service.calls == len(COLORS)
+    assert peak == 2
+
+
+def test_failing_item_does_not_affect_the_others(client, use_service):
+    use_service(AIProvider.OPENAI, stub_service())
+    response = post_batch(client, [("card.png", make_png()), ("notes.txt", b"not a document")])
+
+    items = {item["source"]: item for item in map(json.loads, response.text.splitlines())}
+    assert items["card.png"]["success"]
+    assert items["card.png"]["data"]["doc_id"] == PAN_RESULT["doc_id"]
+    assert not items["notes.txt"]["success"]
+    assert items["notes.txt"]["error"]
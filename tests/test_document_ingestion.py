@@ -0,0 +1,137 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from app.config import IngestionSettings
+from app.document_ingestion import (
+    PagedDocument, ZipPages, extract_paged_document, merge_pages, open_paged_document
+)
+from app.schemas import PreprocessingInfo
+from tests.conftest import make_png
+
+PAN = {"doc_id": "ABCDE1234F", "doc_type": "PAN CARD", "full_name": "RAVI KUMAR", "dob": "1990-08-15"}
+
+
+class ListPages(PagedDocument):
+    source_format = "zip"
+
+    def __init__(self, pages: list[bytes], settings: IngestionSettings):
+        super().__init__(b"".join(pages), settings)
+        self.pages = pages
+        self.closed = False
+
+    async def open(self) -> int:
+        return len(self.pages)
+
+    async def page(self, index: int):
+        return self.pages[index]
+
+    def close(self):
+        self.closed = True
+
+
+def extractor(results: dict[bytes, dict], calls: list[bytes]):
+    async def extract(page_bytes: bytes):
+        calls.append(page_bytes)
+        result = results[page_bytes]
+        if isinstance(result, Exception):
+            raise result
+        info = PreprocessingInfo(preset="none", source_format="png", output_format="png",
+                                 original_bytes=len(page_bytes), processed_bytes=len(page_bytes))
+        return dict(result), None, info
+    return extract
+
+
+def test_paged_document_is_abstract():
+    with pytest.raises(TypeError):
+        PagedDocument(b"", IngestionSettings())
+
+
+def test_open_paged_document_sniffs_containers():
+    assert isinstance(open_paged_document(b"PK\x03\x04rest"), ZipPages)
+    assert open_paged_document(b"%PDF-1.7").source_format == "pdf"
+    assert open_paged_document(make_png()) is None
+
+
+def test_merge_pages_prefers_earlier_non_empty_fields():
+    merged = merge_pages({
+        1: {"doc_id": "", "doc_type": "NA", "full_name": "", "address": "12 MG ROAD"},
+        0: {"doc_id": "", "doc_type": "NA", "full_name": "RAVI KUMAR", "address": ""},
+    })
+    assert merged["full_name"] == "RAVI KUMAR"
+    assert merged["address"] == "12 MG ROAD"
+
+
+def test_merge_pages_takes_id_and_type_from_first_valid_page():
+    merged = merge_pages({
+        0: {"doc_id": "1234", "doc_type": "AADHAAR CARD", "full_name": "RAVI KUMAR"},
+        1: {**PAN, "routing": {"provider": "openai"}},
+    })
+    assert (merged["doc_id"], merged["doc_type"]) == ("ABCDE1234F", "PAN CARD")
+    assert "routing" not in merged
+
+
+def test_merge_pages_sums_usage_and_normalises_dob():
+    merged = merge_pages({
+        0: {**PAN, "dob": "15.08.1990", "usage": {"prompt_tokens": 10, "completion_tokens": 1}},
+        1: {**PAN, "usage": {"prompt_tokens": 5}},
+    })
+    assert merged["dob"] == "1990-08-15"
+    assert merged["usage"] == {"prompt_tokens": 15, "completion_tokens": 1}
+
+
+def test_extract_paged_document_stops_once_merged_result_validates():
+    settings = IngestionSettings(page_concurrency=1)
+    pages = [b"front", b"back", b"extra"]
+    calls: list[bytes] = []
+    results = {b"front": {**PAN, "dob": ""}, b"back": {**PAN, "dob": "15 Aug 1990"}, b"extra": PAN}
+    document = ListPages(pages, settings)
+
+    merged, cache_tier, preprocessing = asyncio.run(
+        extract_paged_document(document, extractor(results, calls), settings)
+    )
+    assert calls == [b"front", b"back"]
+    assert merged["dob"] == "1990-08-15"
+    assert merged["pages"] == {"source_format": "zip", "total_pages": 3, "pages_extracted": 2, "stopped_early": True}
+    assert preprocessing.processed_bytes == len(b"front") + len(b"back")
+    assert document.closed
+
+
+def test_extract_paged_document_skips_failed_pages():
+    settings = IngestionSettings(page_concurrency=2, stop_early=False)
+    calls: list[bytes] = []
+    results = {b"bad": RuntimeError("provider down"), b"good": PAN}
+    merged, _, _ = asyncio.run(
+        extract_paged_document(ListPages([b"bad", b"good"], settings), extractor(results, calls), settings)
+    )
+    assert merged["doc_id"] == "ABCDE1234F"
+    assert merged["pages"]["pages_extracted"] == 1
+
+
+def test_extract_paged_document_raises_when_every_page_fails():
+    settings = IngestionSettings()
+    with pytest.raises(RuntimeError):
+        asyncio.run(extract_paged_document(
+            ListPages([b"bad"], settings), extractor({b"bad": RuntimeError("down")}, []), settings
+        ))
+
+
+def test_zip_pages_reads_image_members_in_name_order():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("b.png", make_png(color="black"))
+        archive.writestr("a.png", make_png(color="white"))
+        archive.writestr("notes.txt", "not an image")
+        archive.writestr("__MACOSX/._a.png", "resource fork")
+    document = ZipPages(buffer.getvalue(), IngestionSettings())
+
+    async def read():
+        count = await document.open()
+        return count, [await document.page(index) for index in range(count)]
+
+    count, pages = asyncio.run(read())
+    document.close()
+    assert count == 3
+    assert pages == [make_png(color="white"), make_png(color="black"), None]
@@ -0,0 +1,124 @@
+from datetime import date
+
+import pytest
+
+from app.config import LocalOcrSettings
+from app.document_validators import (
+    is_valid_aadhaar,
+    is_valid_pan,
+    normalize_dob,
+    parse_date,
+    validate_document,
+    verhoeff_valid,
+)
+from app.local_ocr import LocalOcr, parse_aadhaar, parse_pan, parse_tsv
+from tests.conftest import PAN_RESULT
+
+AADHAAR = "234567890124"
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+def tsv(*lines: str, confidence: float = 95) -> str:
+    """Tesseract TSV with one word row per word of each line."""
+    rows = [TSV_HEADER]
+    for line_num, line in enumerate(lines, start=1):
+        for word_num, word in enumerate(line.split(), start=1):
+            rows.append(f"5\t1\t1\t1\t{line_num}\t{word_num}\t0\t0\t10\t10\t{confidence}\t{word}")
+    return "\n".join(rows)
+
+
+def test_verhoeff():
+    # The textbook example, 236 with its check digit 3
+    assert verhoeff_valid("2363")
+    assert not verhoeff_valid("2364")
+    assert verhoeff_valid(AADHAAR)
+    assert not verhoeff_valid(AADHAAR[:-1] + "5")
+    assert not verhoeff_valid("12a4")
+
+
+def test_aadhaar_and_pan_ids():
+    assert is_valid_aadhaar("2345 6789 0124")
+    assert not is_valid_aadhaar("134567890124")
+    assert is_valid_pan("abcde-1234f")
+    assert not is_valid_pan("ABCDE12345")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1990-08-15", date(1990, 8, 15)),
+    ("15/08/1990", date(1990, 8, 15)),
+    ("15-08-1990", date(1990, 8, 15)),
+    (" 15.08.1990 ", date(1990, 8, 15)),
+    ("15 Aug 1990", date(1990, 8, 15)),
+    ("15 August 1990", date(1990, 8, 15)),
+    (date(1990, 8, 15), date(1990, 8, 15)),
+    ("31/02/1990", None),
+    ("15/08/1850", None),
+    ("15/08/2999", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_normalize_dob():
+    assert normalize_dob({"dob": "15/08/1990"})["dob"] == "1990-08-15"
+    assert normalize_dob({"dob": "unreadable"})["dob"] == "unreadable"
+    assert normalize_dob({}) == {}
+
+
+def test_validate_document():
+    assert all(validate_document(PAN_RESULT).values())
+    result = validate_document({"doc_type": "AADHAAR CARD", "doc_id": "234567890125", "full_name": "", "dob": "15/08/1990"})
+    assert result == {"doc_type": True, "doc_id": False, "full_name": False, "dob": True}
+    # A valid PAN number is not a valid Aadhaar number
+    assert not validate_document({**PAN_RESULT, "doc_type": "AADHAAR CARD"})["doc_id"]
+
+
+def test_parse_labelled_pan():
+    lines = parse_tsv(tsv(
+        "INCOME TAX DEPARTMENT GOVT. OF INDIA",
+        "Permanent Account Number Card",
+        "ABCDE1234F",
+        "Name",
+        "RAVI KUMAR",
+        "Father's Name",
+        "SURESH KUMAR",
+        "Date of Birth",
+        "15/08/1990",
+    ))
+    fields = parse_pan(lines)
+    assert {field: value for field, (value, _) in fields.items()} == {
+        "doc_id": "ABCDE1234F",
+        "doc_type": "PAN CARD",
+        "full_name": "RAVI KUMAR",
+        "fathers_name": "SURESH KUMAR",
+        "dob": "1990-08-15",
+    }
+
+
+def test_parse_aadhaar():
+    lines = parse_tsv(tsv(
+        "Government of India",
+        "Ravi Kumar",
+        "DOB: 15/08/1990",
+        "Male",
+        "2345 6789 0124",
+    ))
+    fields = parse_aadhaar(lines)
+    assert {field: value for field, (value, _) in fields.items()} == {
+        "doc_id": AADHAAR,
+        "doc_type": "AADHAAR CARD",
+        "full_name": "Ravi Kumar",
+        "dob": "1990-08-15",
+    }
+    assert parse_pan(lines) is None
+
+
+def test_accept_needs_every_field_above_threshold():
+    local_ocr = LocalOcr(LocalOcrSettings(min_confidence=80))
+    lines = "Government of India", "Ravi Kumar", "DOB: 15/08/1990", "2345 6789 0124"
+    assert local_ocr.accept(parse_aadhaar(parse_tsv(tsv(*lines))))
+    assert not local_ocr.accept(parse_aadhaar(parse_tsv(tsv(*lines, confidence=60))))
+    assert not local_ocr.accept(parse_aadhaar(parse_tsv(tsv(*lines[:2], lines[3]))))
+    assert not local_ocr.accept(None)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from app import extraction_cache as cache_module
+from app.config import CacheSettings
+from app.extraction_cache import ExtractionCache, LRUCache, cached_extract
+from tests.conftest import PAN_RESULT, stub_service
+
+
+def test_make_key_covers_every_input():
+    key = ExtractionCache.make_key("digest", "openai", "gpt-4o-mini", "full:2")
+    assert key == ExtractionCache.make_key("digest", "openai", "gpt-4o-mini", "full:2")
+    assert len(key) == 64
+    variants = [
+        ("other", "openai", "gpt-4o-mini", "full:2"),
+        ("digest", "grok", "gpt-4o-mini", "full:2"),
+        ("digest", "openai", "gpt-4o", "full:2"),
+        ("digest", "openai", "gpt-4o-mini", "full:3"),
+    ]
+    assert len({key, *(ExtractionCache.make_key(*variant) for variant in variants)}) == 5
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, max_bytes=1024, ttl_seconds=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (b"1", None, b"3")
+
+
+def test_lru_caps_total_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+    assert cache.get("a") is None
+    assert cache.size_bytes == 8
+    cache.set("huge", b"x" * 11)
+    assert cache.get("huge") is None
+
+
+def test_lru_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=60)
+    cache.set("a", b"1")
+    now[0] += 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cached_extract_stores_result_without_per_call_keys(monkeypatch):
+    cache = ExtractionCache(CacheSettings(enabled=True))
+    monkeypatch.setattr(cache_module, "extraction_cache", cache)
+    service = stub_service()
+    original = service.extract_document_info
+
+    async def routed(image_bytes):
+        return {**await original(image_bytes), "routing": {"provider": "openai", "attempts": ["openai"]}}
+
+    service.extract_document_info = routed
+    result, tier = asyncio.run(cached_extract(service, "auto", b"card"))
+    assert tier is None
+    assert {"usage", "routing"} <= result.keys()
+
+    key = ExtractionCache.make_key(cache_module.image_digest(b"card"), "auto", "stub", service.prompt_version)
+    stored = json.loads(cache.memory.get(key))
+    assert "usage" not in stored and "routing" not in stored
+
+    result, tier = asyncio.run(cached_extract(service, "auto", b"card"))
+    assert tier == "memory"
+    assert service.calls == 1
+
+
+def test_results_failing_validation_are_not_cached(monkeypatch):
+    cache = ExtractionCache(CacheSettings(enabled=True))
+    monkeypatch.setattr(cache_module, "extraction_cache", cache)
+    service = stub_service(result={**PAN_RESULT, "full_name": ""})
+
+    asyncio.run(cached_extract(service, "openai", b"card"))
+    assert asyncio.run(cached_extract(service, "openai", b"card"))[1] is None
+    assert service.calls == 2
+    assert len(cache.memory) == 0
+
+
+def test_results_failing_validation_keep_the_short_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ExtractionCache(CacheSettings(enabled=True, invalid_ttl_seconds=60))
+
+    asyncio.run(cache.set("invalid", {**PAN_RESULT, "doc_id": "NOT-A-PAN"}))
+    asyncio.run(cache.set("valid", PAN_RESULT))
+    now[0] += 61
+    assert asyncio.run(cache.get("invalid")) == (None, None)
+    assert asyncio.run(cache.get("valid"))[1] == "memory"
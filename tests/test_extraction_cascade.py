@@ -0,0 +1,76 @@
+import asyncio
+
+from app.config import CascadeSettings, CascadeStage
+from app.extraction_cascade import ExtractionCascade, fields_to_retry
+from app.prompts import get_prompt
+from app.schemas import AIProvider, DocumentInfo
+
+SETTINGS = CascadeSettings(
+    stages=[CascadeStage(model="cheap", detail="low", max_tokens=300), CascadeStage(model="strong")]
+)
+PAN_RESULT = {
+    "doc_id": "ABCDE1234F",
+    "doc_type": "PAN CARD",
+    "full_name": "RAVI KUMAR",
+    "fathers_name": "SURESH KUMAR",
+    "address": "",
+    "dob": "15/08/1990",
+    "file_type": "png",
+}
+
+
+class StubOpenAI:
+    """Answers each stage from a list of results and records what it was asked."""
+
+    def __init__(self, *results: dict):
+        self.results = list(results)
+        self.calls: list[dict] = []
+        self.model = "stub"
+        self.prompt = get_prompt("full")
+
+    async def extract_document_info(self, image_bytes, model=None, detail="high", max_tokens=1000, fields=None):
+        self.calls.append({"model": model, "detail": detail, "fields": fields})
+        result = dict(self.results[len(self.calls) - 1])
+        result["usage"] = {"prompt_tokens": 100, "completion_tokens": 10}
+        return result
+
+    async def stream_document_info(self, image_bytes):
+        yield ""
+
+
+def test_fields_to_retry_links_id_and_type():
+    assert fields_to_retry(["doc_id"]) == ("doc_id", "doc_type")
+    assert fields_to_retry(["dob"]) == ("dob",)
+
+
+def test_valid_first_stage_stops_the_cascade():
+    service = StubOpenAI(PAN_RESULT)
+    result = asyncio.run(ExtractionCascade(service, SETTINGS).extract_document_info(b"image"))
+    assert len(service.calls) == 1
+    assert result["usage"] == {"prompt_tokens": 100, "completion_tokens": 10}
+
+
+def test_non_iso_dob_is_normalised():
+    service = StubOpenAI(PAN_RESULT)
+    result = asyncio.run(ExtractionCascade(service, SETTINGS).extract_document_info(b"image"))
+    assert result["dob"] == "1990-08-15"
+    assert str(DocumentInfo(**result).dob) == "1990-08-15"
+
+
+def test_escalation_asks_only_for_failed_fields():
+    service = StubOpenAI({**PAN_RESULT, "doc_id": "ABCDE12"}, {"doc_id": "ABCDE1234F", "doc_type": "PAN CARD"})
+    result = asyncio.run(ExtractionCascade(service, SETTINGS).extract_document_info(b"image"))
+    assert service.calls[1] == {"model": "strong", "detail": "high", "fields": ("doc_id", "doc_type")}
+    assert result["doc_id"] == "ABCDE1234F"
+    assert result["usage"] == {"prompt_tokens": 200, "completion_tokens": 20}
+
+
+def test_extract_endpoint_accepts_non_iso_dob(client, use_service, png_bytes):
+    use_service(AIProvider.OPENAI, ExtractionCascade(StubOpenAI(PAN_RESULT), SETTINGS))
+    response = client.post(
+        "/api/v1/documents/extract",
+        files={"file": ("card.png", png_bytes, "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["data"]["dob"] == "1990-08-15"
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from contextlib import contextmanager
+
+import httpx
+
+from app import grok_service
+from app.grok_service import GrokService
+from app.metrics import PROVIDER_TOKENS
+from tests.conftest import PAN_RESULT, make_png
+
+
+class RecordingSpan:
+    def __init__(self):
+        self.attributes = {}
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class RecordingTracer:
+    def __init__(self):
+        self.span = RecordingSpan()
+
+    @contextmanager
+    def start_as_current_span(self, name, **kwargs):
+        yield self.span
+
+
+def answer_with(monkeypatch, body: dict):
+    """Serve every Grok request from ``body`` on a fresh shared client."""
+    monkeypatch.setattr(grok_service, "_client", httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=body))))
+
+
+def tokens(kind: str) -> float:
+    return PROVIDER_TOKENS.labels(provider="grok", model=GrokService.model, kind=kind)._value.get()
+
+
+def test_extraction_records_cached_prompt_tokens(monkeypatch):
+    usage = {"prompt_tokens": 1200, "completion_tokens": 80, "total_tokens": 1280, "prompt_tokens_details": {"cached_tokens": 1024}}
+    body = {"choices": [{"message": {"content": json.dumps(PAN_RESULT)}}], "usage": usage}
+    answer_with(monkeypatch, body)
+    tracer = RecordingTracer()
+    monkeypatch.setattr(grok_service, "tracer", tracer)
+    cached_before, prompt_before = tokens("cached_prompt"), tokens("prompt")
+
+    result = asyncio.run(GrokService().extract_document_info(make_png()))
+
+    assert result["usage"] == {"prompt_tokens": 1200, "cached_prompt_tokens": 1024, "completion_tokens": 80}
+    assert tracer.span.attributes["usage.cached_prompt_tokens"] == 1024
+    assert tokens("cached_prompt") - cached_before == 1024
+    assert tokens("prompt") - prompt_before == 1200
+
+
+def test_wrapped_output_is_parsed_like_openai(monkeypatch):
+    content = "Here is the extracted data:\n```json\n" + json.dumps(PAN_RESULT) + "\n```"
+    answer_with(monkeypatch, {"choices": [{"message": {"content": content}}], "usage": {}})
+
+    result = asyncio.run(GrokService().extract_document_info(make_png()))
+    assert {key: result[key] for key in PAN_RESULT} == PAN_RESULT
+
+
+def test_client_is_shared_until_closed(monkeypatch):
+    monkeypatch.setattr(grok_service, "_client", None)
+    client = grok_service.get_grok_client()
+    assert grok_service.get_grok_client() is client
+
+    asyncio.run(grok_service.close_grok_client())
+    assert grok_service._client is None
@@ -0,0 +1,94 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from app.config import ImagePreset
+from app.image_preprocessing import estimate_vision_tokens, preprocess_image, shutdown_preprocessing_executor
+from tests.conftest import make_png
+
+
+@pytest.fixture(scope="module", autouse=True)
+def executor():
+    yield
+    shutdown_preprocessing_executor()
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def preprocess(image_bytes: bytes, preset: ImagePreset):
+    return asyncio.run(preprocess_image(image_bytes, preset))
+
+
+@pytest.mark.parametrize("size, tokens", [
+    ((512, 512), 255),
+    # Fit in 2048 -> 1024x2048, short side to 768 -> 768x1536, 2x3 tiles
+    ((2048, 4096), 1105),
+    ((0, 100), 0),
+])
+def test_estimate_vision_tokens(size, tokens):
+    assert estimate_vision_tokens(*size) == tokens
+
+
+def test_none_preset_passes_supported_images_through():
+    png = make_png()
+    processed, info = preprocess(png, ImagePreset.NONE)
+    assert processed is png
+    assert (info.source_format, info.output_format, info.bytes_saved) == ("png", "png", 0)
+
+
+def test_balanced_preset_downscales_and_transcodes():
+    png = make_png(3200, 1000, color="gray")
+    processed, info = preprocess(png, ImagePreset.BALANCED)
+
+    with Image.open(io.BytesIO(processed)) as image:
+        assert (image.format, image.size) == ("JPEG", (1600, 500))
+    assert info.original_dimensions == [3200, 1000]
+    assert info.processed_dimensions == [1600, 500]
+    assert info.output_format == "jpeg"
+    assert info.estimated_tokens_saved == estimate_vision_tokens(3200, 1000) - estimate_vision_tokens(1600, 500)
+
+
+def test_transparent_images_are_flattened():
+    png = encode(Image.new("RGBA", (2000, 100), (0, 0, 0, 0)), "PNG")
+    processed, _ = preprocess(png, ImagePreset.FAST)
+
+    with Image.open(io.BytesIO(processed)) as image:
+        assert image.mode == "RGB"
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_unsupported_formats_are_transcoded_even_without_a_preset():
+    tiff = encode(Image.new("RGB", (64, 64), "white"), "TIFF")
+    processed, info = preprocess(tiff, ImagePreset.NONE)
+
+    assert (info.source_format, info.output_format) == ("tiff", "jpeg")
+    assert processed[:3] == b"\xff\xd8\xff"
+
+
+@pytest.mark.parametrize("data", [b"not an image at all", b"\x89PNG\r\n\x1a\n" + b"truncated"])
+def test_undecodable_input_is_rejected(data):
+    with pytest.raises(ValueError):
+        preprocess(data, ImagePreset.BALANCED)
+
+
+def test_requests_without_a_preset_are_not_preprocessed(client, use_service):
+    from app.schemas import AIProvider
+    from tests.conftest import stub_service
+
+    use_service(AIProvider.OPENAI, stub_service())
+    card = make_png(3000, 2000, color="olive")
+    response = client.post(
+        "/api/v1/documents/extract",
+        files={"file": ("card.png", card, "image/png")},
+        data={"provider": "openai", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert response.status_code == 200
+    preprocessing = response.json()["preprocessing"]
+    assert preprocessing["preset"] == "none"
+    assert preprocessing["processed_bytes"] == len(card)
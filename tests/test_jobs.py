@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import jobs_api
+from app.config import JOB_SETTINGS, JobSettings
+from app.job_queue import SQLiteJobQueue
+from app.job_worker import JobWorker
+from app.schemas import Job, JobStatus
+from tests.conftest import make_png
+
+FORM = {"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"}
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.jobs: list[Job] = []
+
+    async def enqueue(self, job: Job, image_bytes):
+        self.jobs.append(job)
+
+
+@pytest.fixture
+def queue(monkeypatch) -> RecordingQueue:
+    queue = RecordingQueue()
+    monkeypatch.setattr(jobs_api, "get_job_queue", lambda: queue)
+    return queue
+
+
+def submit(client, webhook_url: str):
+    return client.post(
+        "/api/v1/documents/jobs",
+        files={"file": ("card.png", make_png(), "image/png")},
+        data={**FORM, "webhook_url": webhook_url}
+    )
+
+
+def make_job(**fields) -> Job:
+    now = time.time()
+    return Job(job_id=fields.pop("job_id", "job"), preset="none", created_at=now, updated_at=now, **fields)
+
+
+@pytest.mark.parametrize("webhook_url", [
+    "ftp://93.184.215.14/hook",
+    "http://127.0.0.1:8080/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "not a url",
+])
+def test_submit_refuses_webhooks_outside_public_http(client, queue, webhook_url):
+    response = submit(client, webhook_url)
+
+    assert response.status_code == 400
+    assert queue.jobs == []
+
+
+def test_submit_accepts_public_webhook(client, queue):
+    response = submit(client, "https://93.184.215.14/hook")
+
+    assert response.status_code == 202
+    assert [job.webhook_url for job in queue.jobs] == ["https://93.184.215.14/hook"]
+
+
+def test_submit_allows_private_webhook_when_configured(client, queue, monkeypatch):
+    monkeypatch.setattr(JOB_SETTINGS, "webhook_allow_private_networks", True)
+
+    assert submit(client, "http://127.0.0.1:8080/hook").status_code == 202
+
+
+def test_worker_does_not_post_to_private_webhook():
+    sent: list[httpx.Request] = []
+    worker = JobWorker(queue=None, concurrency=1)
+    worker._webhook_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: sent.append(request) or httpx.Response(200)))
+
+    asyncio.run(worker._notify(make_job(status=JobStatus.SUCCEEDED, webhook_url="http://10.0.0.5/hook")))
+    asyncio.run(worker._notify(make_job(status=JobStatus.SUCCEEDED, webhook_url="http://93.184.215.14/hook")))
+
+    assert [str(request.url) for request in sent] == ["http://93.184.215.14/hook"]
+
+
+def test_sqlite_queue_leases_retries_and_fails():
+    async def run():
+        queue = SQLiteJobQueue(JobSettings(sqlite_path=":memory:", max_attempts=2, retry_backoff=0))
+        try:
+            await queue.enqueue(make_job(job_id="a"), b"image")
+            job, image = await queue.dequeue()
+            assert (job.job_id, job.status, job.attempts, image) == ("a", JobStatus.RUNNING, 1, b"image")
+            # Leased, not handed out twice
+            assert await queue.dequeue() is None
+
+            job = await queue.fail(job, "provider down")
+            assert job.status == JobStatus.QUEUED
+            job, image = await queue.dequeue()
+            assert job.attempts == 2
+
+            job = await queue.fail(job, "provider down")
+            assert job.status == JobStatus.FAILED
+            assert await queue.dequeue() is None
+            stored = await queue.get("a")
+            assert (stored.status, stored.error) == (JobStatus.FAILED, "provider down")
+        finally:
+            await queue.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_queue_does_not_retry_client_errors():
+    async def run():
+        queue = SQLiteJobQueue(JobSettings(sqlite_path=":memory:", max_attempts=3))
+        try:
+            await queue.enqueue(make_job(job_id="a"), None)
+            job, _ = await queue.dequeue()
+            job = await queue.fail(job, "Unsupported image format", retry=False)
+            assert job.status == JobStatus.FAILED
+            assert await queue.dequeue() is None
+        finally:
+            await queue.close()
+
+    asyncio.run(run())
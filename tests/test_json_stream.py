@@ -0,0 +1,32 @@
+from app.json_stream import IncrementalObjectParser
+
+
+def feed_all(fragments: list[str]) -> list[list[tuple]]:
+    parser = IncrementalObjectParser()
+    return [list(parser.feed(fragment)) for fragment in fragments]
+
+
+def test_members_are_reported_once_complete():
+    emitted = feed_all(['{"doc_type": "PAN', ' CARD", "full_', 'name": "RAVI"', ', "dob": null}'])
+    assert emitted == [[], [("doc_type", "PAN CARD")], [], [("full_name", "RAVI"), ("dob", None)]]
+
+
+def test_text_before_the_object_is_ignored():
+    emitted = feed_all(['```json\n{"doc_id": "ABCDE1234F"}\n```'])
+    assert emitted == [[("doc_id", "ABCDE1234F")]]
+
+
+def test_braces_commas_and_quotes_inside_strings():
+    emitted = feed_all(['{"address": "12, \\"MG\\" Road {east}", "doc_id": "1"}'])
+    assert emitted == [[("address", '12, "MG" Road {east}'), ("doc_id", "1")]]
+
+
+def test_nested_values_are_reported_whole():
+    emitted = feed_all(['{"usage": {"prompt_tokens": 1, ', '"completion_tokens": 2}, "tags": [1, 2]}'])
+    assert emitted == [[], [("usage", {"prompt_tokens": 1, "completion_tokens": 2}), ("tags", [1, 2])]]
+
+
+def test_nothing_after_the_closing_brace():
+    parser = IncrementalObjectParser()
+    assert list(parser.feed('{"a": 1}')) == [("a", 1)]
+    assert list(parser.feed(', "b": 2}')) == []
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from app.metrics import error_type, record_token_usage, track_provider_call, track_request
+from app.schemas import AIProvider
+from tests.conftest import make_png, stub_service
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_provider_calls_are_counted_by_outcome():
+    labels = {"provider": "metrics-test", "model": "m"}
+    before = {outcome: sample("provider_call_duration_seconds_count", **labels, outcome=outcome) for outcome in ("ok", "error", "cancelled")}
+    errors_before = sample("provider_errors_total", provider="metrics-test", type="http_503")
+
+    with track_provider_call("metrics-test", "m"):
+        assert sample("provider_calls_in_flight", provider="metrics-test") == 1
+    with pytest.raises(HTTPException), track_provider_call("metrics-test", "m"):
+        raise HTTPException(status_code=503)
+    with pytest.raises(asyncio.CancelledError), track_provider_call("metrics-test", "m"):
+        raise asyncio.CancelledError()
+
+    for outcome in ("ok", "error", "cancelled"):
+        assert sample("provider_call_duration_seconds_count", **labels, outcome=outcome) - before[outcome] == 1
+    assert sample("provider_errors_total", provider="metrics-test", type="http_503") - errors_before == 1
+    assert sample("provider_calls_in_flight", provider="metrics-test") == 0
+
+
+def test_requests_are_counted_by_outcome():
+    before = sample("extract_request_duration_seconds_count", endpoint="metrics-test", outcome="error")
+    with pytest.raises(ValueError), track_request("metrics-test"):
+        raise ValueError("Unsupported image format")
+    assert sample("extract_request_duration_seconds_count", endpoint="metrics-test", outcome="error") - before == 1
+    assert sample("extract_requests_in_flight", endpoint="metrics-test") == 0
+
+
+def test_error_types():
+    assert error_type(HTTPException(status_code=429)) == "http_429"
+    assert error_type(TimeoutError()) == "TimeoutError"
+
+
+def test_token_usage_counts_each_kind():
+    labels = {"provider": "metrics-test", "model": "m"}
+    before = {kind: sample("provider_tokens_total", **labels, kind=kind) for kind in ("prompt", "cached_prompt", "completion")}
+    record_token_usage("metrics-test", "m", {"prompt_tokens": 1200, "cached_prompt_tokens": 1024, "completion_tokens": 80})
+    record_token_usage("metrics-test", "m", None)
+    assert {kind: sample("provider_tokens_total", **labels, kind=kind) - before[kind] for kind in before} == {
+        "prompt": 1200, "cached_prompt": 1024, "completion": 80
+    }
+
+
+def test_metrics_endpoint_reports_extractions(client, use_service):
+    use_service(AIProvider.OPENAI, stub_service())
+    response = client.post(
+        "/api/v1/documents/extract",
+        files={"file": ("card.png", make_png(), "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert response.status_code == 200
+
+    metrics = client.get("/metrics/")
+    assert metrics.status_code == 200
+    assert 'extract_request_duration_seconds_count{endpoint="extract",outcome="ok"}' in metrics.text
+    assert 'extraction_stage_duration_seconds_count{stage="preprocess"}' in metrics.text
@@ -0,0 +1,32 @@
+import json
+
+from app.document_validators import validate_document
+from app.local_ocr import OcrLine, OcrWord, parse_aadhaar, parse_pan
+from benchmarks.ocr_fixtures import aadhaar_card, pan_card, write_fixtures
+
+
+def read_perfectly(lines: list[str]) -> list[OcrLine]:
+    """The OCR lines Tesseract would return for a card read without a mistake."""
+    return [OcrLine(words=[OcrWord(text=word, confidence=95.0) for word in line.split()]) for line in lines]
+
+
+def test_fixtures_are_valid_and_reproducible(tmp_path):
+    paths = write_fixtures(str(tmp_path / "a"), count=6, degraded=0.5, seed=3)
+    again = write_fixtures(str(tmp_path / "b"), count=6, degraded=0.5, seed=3)
+
+    assert [path.name for path in paths] == [path.name for path in again]
+    assert all(path.read_bytes() == other.read_bytes() for path, other in zip(paths, again))
+    for path in paths:
+        assert path.read_bytes().startswith(b"\x89PNG")
+        expected = json.loads(path.with_suffix(".json").read_text())
+        assert all(validate_document(expected).values())
+
+
+def test_card_layouts_are_read_by_the_local_parsers():
+    import random
+
+    rng = random.Random(1)
+    for make, parse in ((pan_card, parse_pan), (aadhaar_card, parse_aadhaar)):
+        lines, expected = make(rng)
+        fields = {field: value for field, (value, _) in parse(read_perfectly(lines)).items()}
+        assert fields == expected
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+from app import openai_service
+from app.admission import AdmissionController
+from app.config import AdmissionSettings
+from app.openai_service import OpenAIService, close_openai_client, get_openai_client
+from app.request_buffer import RequestBuffer
+from tests.conftest import PAN_RESULT, make_png
+
+CARD = make_png()
+USAGE = {"prompt_tokens": 1200, "completion_tokens": 80, "total_tokens": 1280, "prompt_tokens_details": {"cached_tokens": 1024}}
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": USAGE,
+    }
+
+
+def service_for(handler) -> tuple[OpenAIService, list[dict]]:
+    """An OpenAIService whose client answers through ``handler``, recording each request body."""
+    bodies: list[dict] = []
+
+    async def record(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        return await handler(request)
+
+    service = OpenAIService()
+    service.client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://openai.test/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(record))
+    )
+    service.admission = AdmissionController("openai-test", AdmissionSettings())
+    return service, bodies
+
+
+def test_client_is_shared_until_closed(monkeypatch):
+    monkeypatch.setattr(openai_service, "_client", None)
+    client = get_openai_client()
+    assert get_openai_client() is client
+
+    asyncio.run(close_openai_client())
+    assert openai_service._client is None
+
+
+def test_extraction_sends_the_prompt_and_image_once_encoded():
+    async def answer(request):
+        return httpx.Response(200, json=completion(json.dumps(PAN_RESULT)))
+
+    service, bodies = service_for(answer)
+    image = RequestBuffer(CARD)
+    result = asyncio.run(service.extract_document_info(image, detail="low"))
+
+    assert {key: result[key] for key in PAN_RESULT} == PAN_RESULT
+    assert result["file_type"] == "png"
+    assert result["usage"] == {"prompt_tokens": 1200, "cached_prompt_tokens": 1024, "completion_tokens": 80}
+    [body] = bodies
+    text, picture = body["messages"][0]["content"]
+    assert text["text"] == service.prompt.text
+    assert picture["image_url"] == {"url": image.data_url("image/png"), "detail": "low"}
+
+
+def test_concurrent_extractions_do_not_block_each_other():
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json=completion(json.dumps(PAN_RESULT)))
+
+    service, bodies = service_for(slow)
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*(service.extract_document_info(CARD) for _ in range(5)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 0.6
+    assert len(bodies) == 5
+
+
+def test_rate_limits_become_429_with_retry_after():
+    async def limited(request):
+        return httpx.Response(429, headers={"retry-after": "7"}, json={"error": {"message": "Rate limit reached", "type": "requests"}})
+
+    service, _ = service_for(limited)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.extract_document_info(CARD))
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "7"
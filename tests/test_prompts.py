@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from app.base_service import AIServiceBase
+from app.prompts import PACKED_PROMPT, PROMPT_REGISTRY, get_field_prompt, get_prompt
+from tests.conftest import PAN_RESULT, stub_service
+
+FIELDS = ("doc_id", "doc_type", "full_name", "fathers_name", "address", "dob")
+
+
+def test_registry_prompts_ask_for_every_extracted_field():
+    for prompt in (*PROMPT_REGISTRY.values(), PACKED_PROMPT):
+        assert prompt.fields == FIELDS
+        assert all(field in prompt.text for field in FIELDS)
+        assert "file_type" not in prompt.text
+    assert len({prompt.cache_key for prompt in (*PROMPT_REGISTRY.values(), PACKED_PROMPT)}) == 3
+
+
+def test_prompts_are_rendered_once():
+    assert get_prompt("compact") is get_prompt("compact")
+    assert get_field_prompt(("dob",)) is get_field_prompt(("dob",))
+    assert get_field_prompt(("dob",)).fields == ("dob",)
+    with pytest.raises(ValueError):
+        get_prompt("verbose")
+
+
+@pytest.mark.parametrize("content", [
+    json.dumps(PAN_RESULT),
+    "```json\n" + json.dumps(PAN_RESULT) + "\n```",
+    "Here is the result: " + json.dumps(PAN_RESULT),
+])
+def test_parse_extraction_finds_the_object(content):
+    assert stub_service().parse_extraction(content) == PAN_RESULT
+
+
+def test_parse_extraction_fills_missing_fields():
+    service = stub_service()
+    assert service.parse_extraction('{"doc_id": "ABCDE1234F"}') == {**dict.fromkeys(FIELDS, ""), "doc_id": "ABCDE1234F"}
+    assert service.parse_extraction("I cannot read this document") == dict.fromkeys(FIELDS, "")
+    assert service.parse_extraction("{}", get_field_prompt(("dob",))) == {"dob": ""}
+
+
+def test_token_usage_normalises_provider_usage():
+    usage = {"prompt_tokens": 1200, "completion_tokens": 80, "total_tokens": 1280, "prompt_tokens_details": {"cached_tokens": 1024}}
+    assert AIServiceBase.token_usage(usage) == {"prompt_tokens": 1200, "cached_prompt_tokens": 1024, "completion_tokens": 80}
+    assert AIServiceBase.token_usage({"prompt_tokens": 5, "prompt_tokens_details": None}) == {"prompt_tokens": 5, "cached_prompt_tokens": 0, "completion_tokens": 0}
+    assert AIServiceBase.token_usage(None) == {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import provider_router
+from app.config import RouterSettings
+from app.provider_router import CircuitBreaker, ProviderRouter
+from app.schemas import AIProvider
+from tests.conftest import make_png, stub_service
+
+CARD = make_png()
+
+
+def provider(name: str, delay: float = 0.0, error: Exception = None):
+    """A stub provider answering after ``delay`` with its own name as full_name, or raising ``error``."""
+    service = stub_service()
+    service.cancelled = False
+
+    async def extract(image_bytes):
+        service.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            service.cancelled = True
+            raise
+        if error is not None:
+            raise error
+        return {"full_name": name}
+
+    service.extract_document_info = extract
+    return service
+
+
+def route(router: ProviderRouter) -> dict:
+    return asyncio.run(router.extract_document_info(CARD))
+
+
+@pytest.fixture
+def providers(use_service):
+    def serve(openai, grok):
+        use_service(AIProvider.OPENAI, openai)
+        use_service(AIProvider.GROK, grok)
+        return openai, grok
+
+    return serve
+
+
+def test_breaker_opens_and_probes_once(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(provider_router.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, error_rate=1.0, open_seconds=30)
+
+    breaker.record_failure(0.0)
+    assert breaker.is_available()
+    breaker.record_failure(0.0)
+    assert not breaker.try_acquire()
+
+    now[0] += 30
+    assert breaker.try_acquire()
+    # One probe at a time
+    assert not breaker.try_acquire()
+    breaker.record_failure(0.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 30
+    assert breaker.try_acquire()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_fastest_provider_is_ranked_first():
+    router = ProviderRouter(RouterSettings())
+    router.stats[AIProvider.GROK].record(0.5, failed=False)
+    router.stats[AIProvider.OPENAI].record(2.0, failed=False)
+    assert router.rank() == [AIProvider.GROK, AIProvider.OPENAI]
+
+    router.breakers[AIProvider.GROK].record_failure(1.0)
+    assert router.rank() == [AIProvider.OPENAI]
+
+
+def test_fails_over_on_provider_errors(providers):
+    providers(provider("openai", error=HTTPException(status_code=502, detail="bad gateway")), provider("grok"))
+
+    result = route(ProviderRouter(RouterSettings(hedge_enabled=False)))
+    assert result["full_name"] == "grok"
+    assert result["routing"] == {"provider": "grok", "attempts": ["openai", "grok"], "hedged": False, "failover": True}
+
+
+def test_slow_provider_is_hedged(providers):
+    openai, _ = providers(provider("openai", delay=1.0), provider("grok"))
+
+    result = route(ProviderRouter(RouterSettings(hedge_after=0.02)))
+    assert result["full_name"] == "grok"
+    assert result["routing"]["hedged"]
+    assert openai.cancelled
+
+
+def test_document_errors_are_not_failed_over(providers):
+    _, grok = providers(provider("openai", error=ValueError("Unsupported image format")), provider("grok"))
+    router = ProviderRouter(RouterSettings(hedge_enabled=False))
+
+    with pytest.raises(ValueError):
+        route(router)
+    assert grok.calls == 0
+    assert router.breakers[AIProvider.OPENAI].state == CircuitBreaker.CLOSED
+
+
+def test_rate_limits_fail_over_without_tripping_the_breaker(providers):
+    providers(provider("openai", error=HTTPException(status_code=429, detail="slow down")), provider("grok"))
+    router = ProviderRouter(RouterSettings(hedge_enabled=False, breaker_failure_threshold=1))
+
+    assert route(router)["full_name"] == "grok"
+    assert router.breakers[AIProvider.OPENAI].state == CircuitBreaker.CLOSED
+
+
+def test_all_providers_failing(providers):
+    providers(provider("openai", error=RuntimeError("down")), provider("grok", error=RuntimeError("down")))
+    router = ProviderRouter(RouterSettings(hedge_enabled=False, breaker_failure_threshold=1))
+
+    with pytest.raises(HTTPException) as error:
+        route(router)
+    assert error.value.status_code == 502
+    assert router.rank() == []
+    with pytest.raises(HTTPException) as error:
+        route(router)
+    assert error.value.status_code == 503
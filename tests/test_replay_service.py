@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import ReplayLatency, ReplayMiss, ReplaySettings
+from app.replay_service import RecordingService, ReplayCorpus, ReplayService
+from app.request_buffer import RequestBuffer
+from app.schemas import AIProvider
+from tests.conftest import PAN_RESULT, make_png, stub_service
+
+CARD = make_png()
+OTHER_CARD = make_png(color="black")
+
+
+def entry(digest: str, provider: str = "openai", **fields) -> dict:
+    return {"digest": digest, "provider": provider, "model": "gpt-4o-mini", "size": 10, "latency": 0.5, **fields}
+
+
+def write_corpus(path, *entries: dict, tail: str = "") -> ReplayCorpus:
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries) + tail, encoding="utf-8")
+    return ReplayCorpus(str(path))
+
+
+def test_load_skips_a_truncated_last_line(tmp_path):
+    corpus = write_corpus(
+        tmp_path / "corpus.jsonl",
+        entry("a", result=PAN_RESULT),
+        entry("a", latency=1.5, result=PAN_RESULT),
+        entry("b", provider="grok", result=PAN_RESULT),
+        tail='\n{"digest": "c", "provider": "openai", "res'
+    )
+
+    index, latencies = corpus.load()
+    assert {digest: len(entries) for digest, entries in index.items()} == {"a": 2, "b": 1}
+    assert latencies == [0.5, 1.5, 0.5]
+
+    index, latencies = corpus.load("grok")
+    assert list(index) == ["b"]
+
+
+def test_load_without_a_corpus(tmp_path):
+    assert ReplayCorpus(str(tmp_path / "missing.jsonl")).load() == ({}, [])
+
+
+def test_replays_the_recorded_result(tmp_path):
+    corpus = write_corpus(tmp_path / "corpus.jsonl", entry(RequestBuffer(CARD).digest, result=PAN_RESULT))
+    service = ReplayService(corpus, ReplaySettings(latency=ReplayLatency.NONE, miss=ReplayMiss.ERROR))
+
+    result = asyncio.run(service.extract_document_info(CARD))
+    assert result == PAN_RESULT
+    # A copy, the index is not changed by callers
+    result["doc_id"] = "changed"
+    assert asyncio.run(service.extract_document_info(CARD)) == PAN_RESULT
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.extract_document_info(OTHER_CARD))
+    assert error.value.status_code == 404
+
+
+def test_misses_are_served_repeatably(tmp_path):
+    corpus = write_corpus(tmp_path / "corpus.jsonl", *(entry(str(n), result={**PAN_RESULT, "doc_id": str(n)}) for n in range(10)))
+
+    def replay(seed: int) -> str:
+        service = ReplayService(corpus, ReplaySettings(latency=ReplayLatency.NONE, miss=ReplayMiss.ANY, seed=seed))
+        return asyncio.run(service.extract_document_info(CARD))["doc_id"]
+
+    assert replay(1) == replay(1)
+    assert len({replay(seed) for seed in range(10)}) > 1
+
+
+def test_replays_recorded_errors(tmp_path):
+    corpus = write_corpus(tmp_path / "corpus.jsonl", entry(RequestBuffer(CARD).digest, error="Server overloaded", error_type="HTTPException", status=503))
+    service = ReplayService(corpus, ReplaySettings(latency=ReplayLatency.NONE))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.extract_document_info(CARD))
+    assert (error.value.status_code, error.value.detail) == (503, "Server overloaded")
+
+
+def test_recording_round_trips(tmp_path):
+    corpus = ReplayCorpus(str(tmp_path / "corpus.jsonl"))
+    recorder = RecordingService(stub_service(), AIProvider.OPENAI, corpus)
+
+    recorded = asyncio.run(recorder.extract_document_info(CARD))
+    replayed = asyncio.run(ReplayService(corpus, ReplaySettings(latency=ReplayLatency.NONE, miss=ReplayMiss.ERROR)).extract_document_info(CARD))
+
+    assert replayed == recorded
+    index, _ = corpus.load()
+    [stored] = index[RequestBuffer(CARD).digest]
+    assert (stored["provider"], stored["model"], stored["size"]) == ("openai", "stub", len(CARD))
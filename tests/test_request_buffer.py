@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.config import BufferSettings
+from app.request_buffer import DeferredUpload, InFlightBudget, RequestBuffer
+from app.schemas import AIProvider
+from tests.conftest import stub_service
+
+
+def test_request_buffer_encodes_once():
+    image = RequestBuffer(b"document")
+    assert image.b64 is image.b64
+    assert image.data_url("image/png") == "data:image/png;base64," + base64.b64encode(b"document").decode()
+    assert image.data_url("image/png") is image.data_url("image/png")
+    assert image.data_url("image/jpeg").startswith("data:image/jpeg;")
+
+
+def test_budget_rejects_documents_larger_than_the_budget():
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=100, amplification=2))
+
+    async def reserve():
+        async with budget.reserve(51):
+            pass
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(reserve())
+    assert error.value.status_code == 413
+
+
+def test_budget_times_out_with_503():
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=100, amplification=1, wait_timeout=0.05))
+
+    async def reserve_twice():
+        async with budget.reserve(80):
+            async with budget.reserve(80):
+                pass
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(reserve_twice())
+    assert error.value.status_code == 503
+    assert budget.in_flight == 0
+
+
+def test_shrink_gives_room_to_waiting_requests():
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=100, amplification=1, wait_timeout=5))
+
+    async def run():
+        order = []
+
+        async def download():
+            async with budget.reserve(100) as reservation:
+                await asyncio.sleep(0.01)
+                await reservation.shrink(30)
+                order.append("shrunk")
+                await asyncio.sleep(0.05)
+            order.append("released")
+
+        async def upload():
+            await asyncio.sleep(0)
+            async with budget.reserve(60):
+                order.append("admitted")
+
+        await asyncio.gather(download(), upload())
+        return order
+
+    assert asyncio.run(run()) == ["shrunk", "admitted", "released"]
+    assert budget.in_flight == 0
+
+
+def test_uploads_of_unknown_size_reserve_the_upload_cap():
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=100, amplification=1, max_upload_bytes=80))
+
+    async def run():
+        async with budget.reserve(None) as reservation:
+            assert budget.in_flight == 80
+            await reservation.shrink(10)
+            assert budget.in_flight == 10
+        return budget.in_flight
+
+    assert asyncio.run(run()) == 0
+
+
+def test_deferred_upload_outlives_the_request_form():
+    upload = UploadFile(io.BytesIO(b"document"), size=8, filename="card.png")
+    deferred = DeferredUpload(upload)
+    asyncio.run(upload.close())
+    assert asyncio.run(deferred.read()).data == b"document"
+    assert (deferred.filename, deferred.size) == ("card.png", 8)
+    deferred.close()
+
+
+def test_batch_reads_uploads_while_streaming(client, use_service, png_bytes):
+    use_service(AIProvider.OPENAI, stub_service())
+    response = client.post(
+        "/api/v1/documents/extract/batch",
+        files=[("files", ("a.png", png_bytes, "image/png")), ("files", ("b.png", png_bytes, "image/png"))],
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert response.status_code == 200
+    items = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda item: item["index"])
+    assert [(item["source"], item["success"]) for item in items] == [("a.png", True), ("b.png", True)]
+    assert items[0]["data"]["doc_id"] == "ABCDE1234F"
+
+
+def test_batch_item_over_the_budget_fails_alone(client, use_service, monkeypatch, png_bytes):
+    from app import document
+
+    use_service(AIProvider.OPENAI, stub_service())
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=len(png_bytes) * 3 + 1, amplification=3))
+    monkeypatch.setattr(document, "inflight_budget", budget)
+    response = client.post(
+        "/api/v1/documents/extract/batch",
+        files=[("files", ("small.png", png_bytes, "image/png")), ("files", ("large.png", png_bytes * 2, "image/png"))],
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    items = {item["source"]: item for item in map(json.loads, response.text.splitlines())}
+    assert items["small.png"]["success"]
+    assert not items["large.png"]["success"]
+    assert items["large.png"]["error"] == "Document is too large to process"
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.base_service import AIServiceBase
+from app.config import PackingSettings
+from app.prompts import PACKED_PROMPT
+from app.request_packing import PackingService
+from tests.conftest import PAN_RESULT, make_png, stub_service
+
+CARDS = [make_png(color=color) for color in ("white", "black", "red", "blue", "green")]
+
+
+def answer(number: int) -> dict:
+    return {**PAN_RESULT, "image": number, "full_name": f"PERSON {number}"}
+
+
+@pytest.mark.parametrize("content", [
+    json.dumps([answer(2), answer(1)]),
+    json.dumps({"documents": [answer(2), answer(1)]}),
+    "Here you go:\n" + json.dumps([answer(2), answer(1)]) + "\n",
+])
+def test_parse_packed_matches_by_image_number(content):
+    results = stub_service().parse_packed_extraction(content, 2, PACKED_PROMPT)
+    assert [result["full_name"] for result in results] == ["PERSON 1", "PERSON 2"]
+    assert all("image" not in result for result in results)
+
+
+def test_parse_packed_falls_back_to_position_and_fills_missing_fields():
+    items = [{"doc_id": "ABCDE1234F"}, {"doc_id": "PQRST6789Z"}]
+    results = stub_service().parse_packed_extraction(json.dumps(items), 2, PACKED_PROMPT)
+    assert [result["doc_id"] for result in results] == ["ABCDE1234F", "PQRST6789Z"]
+    assert all(result[field] == "" for result in results for field in PACKED_PROMPT.fields if field != "doc_id")
+
+
+def test_parse_packed_leaves_unmappable_images_empty():
+    service = stub_service()
+    first, second = service.parse_packed_extraction(json.dumps([answer(1)]), 2, PACKED_PROMPT)
+    assert (first["full_name"], second) == ("PERSON 1", None)
+    assert service.parse_packed_extraction(json.dumps([{"doc_id": "x"}]), 2, PACKED_PROMPT) == [None, None]
+    assert service.parse_packed_extraction("not json", 3, PACKED_PROMPT) == [None, None, None]
+
+
+def test_split_usage_keeps_the_total():
+    shares = AIServiceBase.split_usage({"prompt_tokens": 1001, "completion_tokens": 10}, 3)
+    assert [share["prompt_tokens"] for share in shares] == [334, 334, 333]
+    assert sum(share["completion_tokens"] for share in shares) == 10
+
+
+class PackedOpenAI:
+    """OpenAIService stand-in recording how images were sent."""
+
+    model = "gpt-4o-mini"
+
+    def __init__(self, packed=None, error: Exception = None):
+        self.packs: list[int] = []
+        self.singles = 0
+        self.packed = packed
+        self.error = error
+
+    async def extract_documents_packed(self, images, model=None, detail="high", max_tokens=1000):
+        self.packs.append(len(images))
+        await asyncio.sleep(0.001)
+        if self.error is not None:
+            raise self.error
+        if self.packed is not None:
+            return self.packed(len(images))
+        return [{**PAN_RESULT, "full_name": f"PERSON {n}"} for n in range(1, len(images) + 1)]
+
+    async def extract_document_info(self, image_bytes, model=None, detail="high", max_tokens=1000, fields=None):
+        self.singles += 1
+        return {**PAN_RESULT, "full_name": "SINGLE"}
+
+
+def extract_all(service: PackingService, cards: list[bytes], **kwargs):
+    async def run():
+        return await asyncio.gather(*(service.extract_document_info(card, **kwargs) for card in cards), return_exceptions=True)
+
+    return asyncio.run(run())
+
+
+def test_concurrent_calls_are_packed_up_to_max_images():
+    openai = PackedOpenAI()
+    results = extract_all(PackingService(openai, PackingSettings(enabled=True, max_images=2, window_seconds=0.05)), CARDS)
+
+    # The fifth image is alone once the window closes, it goes out as a single call
+    assert openai.packs == [2, 2]
+    assert openai.singles == 1
+    assert [result["full_name"] for result in results] == ["PERSON 1", "PERSON 2", "PERSON 1", "PERSON 2", "SINGLE"]
+
+
+def test_unmapped_images_are_extracted_alone():
+    openai = PackedOpenAI(packed=lambda count: [{**PAN_RESULT, "full_name": "PACKED"}] + [None] * (count - 1))
+    results = extract_all(PackingService(openai, PackingSettings(enabled=True, max_images=3)), CARDS[:3])
+
+    assert openai.packs == [3]
+    assert [result["full_name"] for result in results] == ["PACKED", "SINGLE", "SINGLE"]
+
+
+def test_rate_limits_fail_the_pack_without_retries():
+    openai = PackedOpenAI(error=HTTPException(status_code=429, detail="AI provider rate limit reached"))
+    results = extract_all(PackingService(openai, PackingSettings(enabled=True, max_images=2)), CARDS[:2])
+
+    assert all(isinstance(result, HTTPException) and result.status_code == 429 for result in results)
+    assert openai.singles == 0
+
+
+def test_field_retries_are_never_packed():
+    openai = PackedOpenAI()
+    extract_all(PackingService(openai, PackingSettings(enabled=True, max_images=2)), CARDS[:2], fields=("dob",))
+
+    assert openai.packs == []
+    assert openai.singles == 2
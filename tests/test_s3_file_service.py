@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app import archive_spool as spool_module
+from app.archive_spool import ArchiveSpool
+from app.config import FILE_UPLOAD_SETTINGS, SETTINGS, ArchiveSettings, FileUploadTransport
+from app.s3_file_service import S3Service, UploadFileSource
+from app.schemas import InboundDocumentType, User
+
+USER = User(mobile_no="9999999999", company_name="Acme")
+# Bytes that are not valid UTF-8, so they could only arrive unencoded
+CARD = b"\x89PNG\r\n\x1a\n\xff\xfe card"
+
+
+@pytest.fixture(autouse=True)
+def upload_service(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "S3_BASE_URL", "https://upload.test")
+
+
+def service_for(handler) -> tuple[S3Service, list[httpx.Request]]:
+    requests: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        request.read()
+        requests.append(request)
+        return handler(request)
+
+    service = S3Service()
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+    return service, requests
+
+
+def test_upload_file_source_reads_memory_and_disk(tmp_path):
+    path = tmp_path / "card.png"
+    path.write_bytes(CARD)
+
+    with UploadFileSource("a.png", "image/png", data=memoryview(CARD)).open() as handle:
+        assert handle.read() == CARD
+    with UploadFileSource("b.png", "image/png", path=str(path)).open() as handle:
+        assert handle.read() == CARD
+
+
+def test_multipart_upload_sends_raw_bytes(tmp_path):
+    path = tmp_path / "back.png"
+    path.write_bytes(CARD[::-1])
+    service, requests = service_for(lambda request: httpx.Response(200, json={"s3_urls": {"documents": ["https://s3.test/front.png"]}}))
+    sources = [
+        UploadFileSource("front.png", "image/png", data=CARD),
+        UploadFileSource("back.png", "image/png", path=str(path)),
+    ]
+
+    urls = asyncio.run(service.upload_files_binary(USER, "documents", sources, "tenant"))
+
+    # The service returned one URL, the second file has none
+    assert urls == ["https://s3.test/front.png", None]
+    [request] = requests
+    assert request.url.path == FILE_UPLOAD_SETTINGS.multipart_path
+    assert request.headers["content-type"].startswith("multipart/form-data")
+    assert CARD in request.content and CARD[::-1] in request.content
+    assert b'name="mobile_no"' in request.content and b"9999999999" in request.content
+
+
+def test_multipart_upload_errors_are_http_exceptions():
+    service, _ = service_for(lambda request: httpx.Response(502))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.upload_files_binary(USER, "documents", [UploadFileSource("a.png", "image/png", data=CARD)], "tenant"))
+    assert error.value.status_code == 400
+
+
+def test_spool_streams_binary_uploads_from_its_files(tmp_path, monkeypatch):
+    uploads = []
+
+    class FakeS3:
+        async def upload_files_binary(self, user, product_code, files, tenant):
+            for source in files:
+                with source.open() as handle:
+                    uploads.append((source.file_name, source.path is not None, handle.read()))
+            return [None] * len(files)
+
+    monkeypatch.setattr(spool_module, "S3Service", FakeS3)
+    monkeypatch.setattr(FILE_UPLOAD_SETTINGS, "transport", FileUploadTransport.BINARY)
+    spool = ArchiveSpool(ArchiveSettings(spool_dir=str(tmp_path / "spool")))
+
+    asyncio.run(spool.submit(CARD, "card.png", InboundDocumentType.PNG, USER, "tenant"))
+    asyncio.run(spool.drain_once())
+
+    assert uploads == [("card.png", True, CARD)]
+    assert spool.depth() == 0
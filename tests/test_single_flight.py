@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app import extraction_cache as cache_module
+from app.extraction_cache import cached_extract
+from app.single_flight import SingleFlight
+from tests.conftest import make_png, stub_service
+
+
+def test_concurrent_calls_share_one_task():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        assert flight.in_flight() == 0
+        return results
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert [result for result, _ in results] == [1] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+
+
+def test_failures_are_shared_but_not_kept():
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("provider down")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.do("key", fail)
+
+    asyncio.run(run())
+    assert calls == 2
+
+
+def test_cancelled_waiter_leaves_the_task_running():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == ("done", True)
+        assert first.cancelled()
+
+    asyncio.run(run())
+
+
+def test_abandoned_task_is_cancelled_when_asked():
+    async def run():
+        flight = SingleFlight(cancel_abandoned=True)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.in_flight() == 0
+
+    asyncio.run(run())
+
+
+def test_cached_extract_coalesces_identical_documents():
+    service = stub_service()
+    original = service.extract_document_info
+
+    async def slow(image_bytes):
+        await asyncio.sleep(0.01)
+        return await original(image_bytes)
+
+    service.extract_document_info = slow
+    card = make_png()
+
+    async def run():
+        return await asyncio.gather(*(cached_extract(service, "openai", card) for _ in range(4)))
+
+    results = asyncio.run(run())
+    assert service.calls == 1
+    assert all(result == results[0][0] for result, _ in results)
+    # Every caller gets its own dict
+    assert len({id(result) for result, _ in results}) == 4
+    assert cache_module.extraction_flight.in_flight() == 0
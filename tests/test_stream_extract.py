@@ -0,0 +1,235 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+import pytest
+
+from app import extraction_cache as cache_module
+from app.config import CacheSettings
+from app.extraction_cache import ExtractionCache, cached_extract, stream_extract
+from app.schemas import AIProvider
+from tests.conftest import PAN_RESULT, make_png, stub_service
+
+CARD = make_png()
+DELTAS = ('{"doc_id": "ABCDE1234F", ', '"doc_type": "PAN CARD", ', '"full_name": "RAVI KUMAR", ', '"dob": "1990-08-15"}')
+
+
+@pytest.fixture
+def cache(monkeypatch) -> ExtractionCache:
+    cache = ExtractionCache(CacheSettings(enabled=True))
+    monkeypatch.setattr(cache_module, "extraction_cache", cache)
+    return cache
+
+
+async def collect(service, image: bytes):
+    deltas, result = [], None
+    async for kind, value in stream_extract(service, "openai", image):
+        if kind == "delta":
+            deltas.append(value)
+        else:
+            result = value
+    return deltas, result
+
+
+def test_concurrent_streams_share_one_provider_stream(cache):
+    service = stub_service(deltas=DELTAS)
+
+    async def run():
+        return await asyncio.gather(collect(service, CARD), collect(service, CARD))
+
+    (first_deltas, (first, first_tier)), (second_deltas, (second, _)) = asyncio.run(run())
+    assert service.streams == 1
+    assert first_deltas == second_deltas == list(DELTAS)
+    assert first["doc_id"] == second["doc_id"] == "ABCDE1234F"
+    assert first is not second
+    assert first_tier is None
+
+
+def test_streamed_result_is_cached_like_other_paths(cache):
+    service = stub_service(deltas=DELTAS)
+    asyncio.run(collect(service, CARD))
+
+    deltas, (result, tier) = asyncio.run(collect(service, CARD))
+    assert service.streams == 1
+    assert deltas == []
+    assert tier == "memory"
+    # The plain path reads the entry the stream wrote
+    assert asyncio.run(cached_extract(service, "openai", CARD)) == (result, "memory")
+    assert service.calls == 0
+
+
+def test_stream_joins_a_plain_extraction_in_flight(cache):
+    service = stub_service()
+
+    async def run():
+        extraction = asyncio.create_task(cached_extract(service, "openai", CARD))
+        await asyncio.sleep(0)
+        streamed = await collect(service, CARD)
+        return streamed, await extraction
+
+    (deltas, (result, _)), _ = asyncio.run(run())
+    assert (service.calls, service.streams) == (1, 0)
+    assert deltas == []
+    assert result["doc_id"] == PAN_RESULT["doc_id"]
+
+
+def sse_events(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_endpoint_streams_fields_then_result(client, use_service, png_bytes):
+    use_service(AIProvider.OPENAI, stub_service(deltas=DELTAS))
+    response = client.post(
+        "/api/v1/documents/extract/stream",
+        files={"file": ("card.png", png_bytes, "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["field"] * 4 + ["result"]
+    assert events[0][1] == {"field": "doc_id", "value": "ABCDE1234F"}
+    assert events[-1][1]["data"]["full_name"] == "RAVI KUMAR"
+    assert events[-1][1]["url"].startswith("https://archive.test/")
+
+
+def test_failed_stream_ends_with_an_error_event(client, use_service, png_bytes):
+    class BrokenStream:
+        def __init__(self):
+            self.service = stub_service(deltas=DELTAS)
+
+        def __getattr__(self, name):
+            return getattr(self.service, name)
+
+        async def stream_document_info(self, image_bytes):
+            yield '{"doc_id": '
+            raise RuntimeError("provider stream broke")
+
+    use_service(AIProvider.OPENAI, BrokenStream())
+    response = client.post(
+        "/api/v1/documents/extract/stream",
+        files={"file": ("card.png", png_bytes, "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert sse_events(response.text) == [("error", {"error": "provider stream broke"})]
+
+
+def test_abandoned_archive_upload_is_cancelled():
+    from app.single_flight import SingleFlight
+
+    flight = SingleFlight(cancel_abandoned=True)
+    cancelled = []
+
+    async def upload():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        first = asyncio.create_task(flight.do("key", upload))
+        second = asyncio.create_task(flight.do("key", upload))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        # One request still waits for the upload
+        assert not cancelled
+        second.cancel()
+        await asyncio.sleep(0.01)
+        return flight.in_flight()
+
+    assert asyncio.run(run()) == 0
+    assert cancelled == [True]
+
+
+def test_provider_stream_is_cancelled_when_its_last_follower_leaves(cache):
+    service = stub_service(deltas=DELTAS)
+    upstream = {"deltas": 0, "closed": False}
+
+    async def endless(image_bytes):
+        try:
+            for delta in DELTAS:
+                upstream["deltas"] += 1
+                yield delta
+                await asyncio.sleep(0.05)
+        finally:
+            upstream["closed"] = True
+
+    service.stream_document_info = endless
+
+    async def follow_first_delta():
+        async with aclosing(stream_extract(service, "openai", CARD)) as extraction:
+            async for kind, _ in extraction:
+                assert kind == "delta"
+                return
+
+    async def run():
+        first = asyncio.create_task(follow_first_delta())
+        second = asyncio.create_task(follow_first_delta())
+        await asyncio.gather(first, second)
+        await asyncio.sleep(0.01)
+        assert cache_module.extraction_flight.in_flight() == 0
+        # Long enough for the whole stream had it kept running
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert upstream == {"deltas": 1, "closed": True}
+    assert asyncio.run(cache.get(ExtractionCache.make_key(cache_module.image_digest(CARD), "openai", "stub", service.prompt_version))) == (None, None)
+
+
+def test_stream_reads_its_upload_inside_a_reservation(client, use_service, monkeypatch, png_bytes):
+    from app import document
+    from app.request_buffer import DeferredUpload
+
+    use_service(AIProvider.OPENAI, stub_service(deltas=DELTAS))
+    reserved_at_read = []
+    read = DeferredUpload.read
+
+    async def recording_read(self):
+        reserved_at_read.append(document.inflight_budget.in_flight)
+        return await read(self)
+
+    monkeypatch.setattr(DeferredUpload, "read", recording_read)
+    response = client.post(
+        "/api/v1/documents/extract/stream",
+        files={"file": ("card.png", png_bytes, "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    assert sse_events(response.text)[-1][0] == "result"
+    assert reserved_at_read and reserved_at_read[0] >= len(png_bytes)
+    assert document.inflight_budget.in_flight == 0
+
+
+@pytest.mark.parametrize("failing", [False, True])
+def test_result_is_sent_before_a_pending_archive(client, use_service, monkeypatch, failing):
+    from app import document
+    from app.archive_spool import ArchiveReceipt
+
+    use_service(AIProvider.OPENAI, stub_service(deltas=DELTAS))
+
+    async def slow_upload(image, file_name, user, tenant):
+        await asyncio.sleep(0.1)
+        if failing:
+            raise RuntimeError("S3 unavailable")
+        return ArchiveReceipt(archive_id=None, url=f"https://archive.test/{file_name}")
+
+    monkeypatch.setattr(document, "_upload_archive", slow_upload)
+    # A document of its own, the archive index would answer for one archived before
+    card = make_png(color="navy" if failing else "teal")
+    response = client.post(
+        "/api/v1/documents/extract/stream",
+        files={"file": ("card.png", card, "image/png")},
+        data={"provider": "openai", "preset": "none", "mobile": "9999999999", "tenant": "test"},
+    )
+    events = sse_events(response.text)
+    assert [event for event, _ in events][-2:] == ["result", "archive"]
+    result, archive = events[-2][1], events[-1][1]
+    assert result["success"] and result["data"]["full_name"] == "RAVI KUMAR"
+    assert result["url"] is None
+    if failing:
+        assert archive == {"error": "S3 unavailable"}
+    else:
+        assert archive["url"].startswith("https://archive.test/")
@@ -0,0 +1,70 @@
+import argparse
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from benchmarks.stubs import (
+    GROK_PATH, MULTIPART_PATH, OPENAI_PATH, LatencySpec, StubProfile, StubServices, add_stub_arguments,
+    services_from_arguments, stub_arguments
+)
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("0.5", LatencySpec("fixed", (0.5,))),
+    ("uniform:0.2:1", LatencySpec("uniform", (0.2, 1.0))),
+    ("lognormal:0.8:0.4", LatencySpec("lognormal", (0.8, 0.4))),
+    ("exp:0.5", LatencySpec("exp", (0.5,))),
+])
+def test_latency_specs(spec, expected):
+    assert LatencySpec.parse(spec) == expected
+    assert LatencySpec.parse(str(expected)) == expected
+
+
+@pytest.mark.parametrize("spec", ["uniform:0.2", "gamma:1", "fixed:fast"])
+def test_invalid_latency_specs(spec):
+    with pytest.raises(ValueError):
+        LatencySpec.parse(spec)
+
+
+def test_packed_completions_answer_every_image():
+    client = TestClient(StubServices(seed=1).app)
+    image = {"type": "image_url", "image_url": {"url": "data:image/png;base64,AA=="}}
+    response = client.post(GROK_PATH, json={"messages": [{"role": "user", "content": [{"type": "text", "text": "x"}, image, image]}]})
+
+    completion = response.json()
+    documents = json.loads(completion["choices"][0]["message"]["content"])
+    assert [document["image"] for document in documents] == [1, 2]
+    assert completion["usage"]["prompt_tokens"] == 500 + 2 * 300
+
+
+def test_rate_limits_and_counters():
+    services = StubServices(openai=StubProfile(rpm=1), seed=1)
+    client = TestClient(services.app)
+    body = {"messages": [{"role": "user", "content": "x"}]}
+
+    assert client.post(OPENAI_PATH, json=body).headers["x-ratelimit-remaining-requests"] == "0"
+    limited = client.post(OPENAI_PATH, json=body)
+    assert limited.status_code == 429
+    assert "retry-after" in limited.headers
+
+    upload = client.post(MULTIPART_PATH, files=[("files", ("a.png", b"a")), ("files", ("b.png", b"b"))], data={"product_code": "kyc"})
+    assert list(upload.json()["s3_urls"]) == ["kyc"]
+    assert len(upload.json()["s3_urls"]["kyc"]) == 2
+
+    stats = services.stats()
+    assert (stats["openai"]["requests"], stats["openai"]["throttled"]) == (2, 1)
+    assert stats["s3"]["requests"] == 1
+
+
+def test_stub_arguments_round_trip():
+    parser = argparse.ArgumentParser()
+    add_stub_arguments(parser)
+    args = parser.parse_args(["--openai-latency", "exp:0.5", "--grok-rpm", "60", "--completion-bytes", "200", "--seed", "3"])
+
+    again = parser.parse_args(stub_arguments(args))
+    assert vars(again) == vars(args)
+    services = services_from_arguments(again)
+    assert services.profiles["openai"].latency == LatencySpec("exp", (0.5,))
+    assert services.profiles["grok"].rpm == 60
+    assert services.profiles["s3"].completion_bytes == 0
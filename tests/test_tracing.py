@@ -0,0 +1,89 @@
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON
+
+from app.config import TracingLevel, TracingSettings
+from app.tracing import LeveledTracer, TailSamplingProcessor
+
+
+def leveled_tracer(level: TracingLevel) -> tuple[LeveledTracer, InMemorySpanExporter]:
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return LeveledTracer(provider.get_tracer("test"), level), exporter
+
+
+def tail_sampled(**settings) -> tuple[LeveledTracer, InMemorySpanExporter]:
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ALWAYS_ON)
+    provider.add_span_processor(TailSamplingProcessor(SimpleSpanProcessor(exporter), TracingSettings(tail_keep=True, **settings)))
+    return LeveledTracer(provider.get_tracer("test"), TracingLevel.VERBOSE), exporter
+
+
+def test_spans_above_the_level_are_skipped():
+    tracer, exporter = leveled_tracer(TracingLevel.MINIMAL)
+    with tracer.start_as_current_span("request", level=TracingLevel.MINIMAL) as request:
+        with tracer.start_as_current_span("preprocess") as preprocess:
+            preprocess.set_attribute("ignored", True)
+            with tracer.start_as_current_span("provider_call", level=TracingLevel.MINIMAL):
+                pass
+        request.add_event("dropped below verbose")
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {"request", "provider_call"}
+    # The skipped span's child attaches to the enclosing span
+    assert spans["provider_call"].parent.span_id == spans["request"].context.span_id
+    assert spans["request"].events == ()
+
+
+def test_events_are_recorded_at_verbose():
+    tracer, exporter = leveled_tracer(TracingLevel.VERBOSE)
+    with tracer.start_as_current_span("request") as span:
+        span.add_event("Cascade stage finished")
+
+    [span] = exporter.get_finished_spans()
+    assert [event.name for event in span.events] == ["Cascade stage finished"]
+
+
+def test_tail_sampling_keeps_failed_and_slow_traces():
+    tracer, exporter = tail_sampled(sample_ratio=0.0, tail_slow_seconds=3600)
+
+    with tracer.start_as_current_span("fast"):
+        with tracer.start_as_current_span("fast_child"):
+            pass
+    assert exporter.get_finished_spans() == ()
+
+    with tracer.start_as_current_span("failed"):
+        with tracer.start_as_current_span("failed_child") as child:
+            child.set_attribute("error", True)
+    assert [span.name for span in exporter.get_finished_spans()] == ["failed_child", "failed"]
+
+    slow_tracer, exporter = tail_sampled(sample_ratio=0.0, tail_slow_seconds=0)
+    with slow_tracer.start_as_current_span("slow"):
+        pass
+    assert [span.name for span in exporter.get_finished_spans()] == ["slow"]
+
+
+def test_tail_sampling_keeps_head_sampled_traces():
+    tracer, exporter = tail_sampled(sample_ratio=1.0, tail_slow_seconds=3600)
+    with tracer.start_as_current_span("request"):
+        pass
+    assert [span.name for span in exporter.get_finished_spans()] == ["request"]
+
+
+def test_tail_sampling_bounds_unfinished_traces():
+    exporter = InMemorySpanExporter()
+    processor = TailSamplingProcessor(SimpleSpanProcessor(exporter), TracingSettings(tail_keep=True, tail_max_traces=2))
+    provider = TracerProvider(sampler=ALWAYS_ON)
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer("test")
+
+    roots = [tracer.start_span(f"root-{n}") for n in range(3)]
+    for root in roots:
+        with trace.use_span(root):
+            tracer.start_span("child").end()
+    assert len(processor._pending) == 2
+    for root in roots:
+        root.end()
@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import BufferSettings, FetchSettings
+from app.request_buffer import InFlightBudget
+from app.url_fetcher import UrlFetcher, check_url
+from tests.conftest import make_png
+
+PUBLIC = "http://93.184.215.14"
+PNG = make_png()
+
+
+def fetcher_for(handler, **settings) -> tuple[UrlFetcher, list[httpx.Request]]:
+    requests: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    fetcher = UrlFetcher(FetchSettings(**settings))
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(record), follow_redirects=False)
+    return fetcher, requests
+
+
+def status_of(call) -> int:
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(call)
+    return error.value.status_code
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "ftp://93.184.215.14/card.png",
+    "http://127.0.0.1/card.png",
+    "http://10.1.2.3/card.png",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/card.png",
+    "http://[::ffff:192.168.0.1]/card.png",
+])
+def test_check_url_refuses_non_public_urls(url):
+    assert status_of(check_url(url)) == 400
+
+
+def test_check_url_allows_private_networks_when_configured():
+    asyncio.run(check_url("http://127.0.0.1:8080/card.png", allow_private_networks=True))
+    asyncio.run(check_url(f"{PUBLIC}/card.png"))
+
+
+def test_redirects_are_followed_and_cached_under_the_final_url():
+    def handler(request):
+        if request.url.path == "/start":
+            return httpx.Response(302, headers={"location": "/card.png"})
+        return httpx.Response(200, content=PNG, headers={"etag": '"v1"'})
+
+    fetcher, requests = fetcher_for(handler)
+    assert asyncio.run(fetcher.fetch(f"{PUBLIC}/start")) == PNG
+    assert asyncio.run(fetcher.fetch(f"{PUBLIC}/start")) == PNG
+    assert [request.url.path for request in requests] == ["/start", "/card.png"]
+    assert list(fetcher._cache) == [f"{PUBLIC}/card.png"]
+
+
+def test_revalidation_sends_validators_to_the_url_that_issued_them():
+    def handler(request):
+        if request.url.path == "/start":
+            return httpx.Response(302, headers={"location": "/card.png"})
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=PNG, headers={"etag": '"v1"'})
+
+    fetcher, requests = fetcher_for(handler, cache_ttl=0)
+    asyncio.run(fetcher.fetch(f"{PUBLIC}/start"))
+    assert asyncio.run(fetcher.fetch(f"{PUBLIC}/start")) == PNG
+    assert [request.headers.get("if-none-match") for request in requests] == [None, None, None, '"v1"']
+
+
+def test_redirect_to_a_private_address_is_refused():
+    fetcher, requests = fetcher_for(
+        lambda request: httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data/"})
+    )
+    assert status_of(fetcher.fetch(f"{PUBLIC}/start")) == 400
+    assert len(requests) == 1
+
+
+def test_redirect_loops_stop_at_the_limit():
+    fetcher, requests = fetcher_for(lambda request: httpx.Response(302, headers={"location": "/again"}), max_redirects=3)
+    assert status_of(fetcher.fetch(f"{PUBLIC}/start")) == 400
+    assert len(requests) == 4
+
+
+def test_non_images_and_oversized_bodies_are_refused():
+    fetcher, _ = fetcher_for(lambda request: httpx.Response(200, content=b"<html>not a document</html>"))
+    assert status_of(fetcher.fetch(f"{PUBLIC}/page")) == 400
+    fetcher, _ = fetcher_for(lambda request: httpx.Response(200, content=PNG), max_bytes=len(PNG) - 1)
+    assert status_of(fetcher.fetch(f"{PUBLIC}/card.png")) == 413
+
+
+def test_prefetch_downloads_together_within_the_budget():
+    fetcher = UrlFetcher(FetchSettings(prefetch_concurrency=2, max_bytes=1000))
+    budget = InFlightBudget(BufferSettings(max_inflight_bytes=10_000, amplification=1))
+    running, peak, reserved = 0, 0, []
+
+    async def fetch(url):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        reserved.append(budget.in_flight)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return PNG
+
+    fetcher.fetch = fetch
+
+    async def hold(url):
+        async with fetcher.prefetch(url, budget) as image:
+            await asyncio.sleep(0.05)
+            return len(image)
+
+    async def run():
+        sizes = await asyncio.gather(*(hold(f"{PUBLIC}/{n}.png") for n in range(4)))
+        return sizes, budget.in_flight
+
+    sizes, left = asyncio.run(run())
+    assert sizes == [len(PNG)] * 4
+    assert peak == 2
+    # Each download starts with the fetch cap reserved, held bodies only keep their real size
+    assert reserved[:2] == [1000, 2000]
+    assert reserved[2:] == [2 * len(PNG) + 1000, 2 * len(PNG) + 2000]
+    assert left == 0